@@ -0,0 +1,212 @@
+import asyncio
+import contextlib
+import logging
+import math
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Optional
+
+import deadline
+from metrics import stage
+
+logger = logging.getLogger(__name__)
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def is_overload(error: BaseException) -> bool:
+    """Whether a failure (e.g. an ``LLMError``) indicates the upstream is saturated"""
+    if isinstance(error, deadline.DeadlineExceeded):
+        # The client's own budget ran out; that says nothing about upstream capacity
+        return False
+    status_code = getattr(error, "status_code", None)
+    return status_code == 429 or (status_code is not None and status_code >= 500)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a call is shed instead of admitted"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class Admission:
+    """A held slot; ``release`` is idempotent so it can also back a finalizer"""
+
+    def __init__(self, controller: "AdmissionController"):
+        self.controller = controller
+        self.started = time.perf_counter()
+        self.released = False
+
+    def release(self, ok: bool = True, overloaded: bool = False):
+        if not self.released:
+            self.released = True
+            self.controller._release(self.started, ok, overloaded)
+
+
+class AdmissionController:
+    """Bounded concurrency with a short wait queue for an expensive stage.
+
+    At most ``limit`` calls run at once and at most ``queue_size`` wait for
+    a slot. A full queue rejects immediately with 429; a caller still
+    queued after ``queue_timeout`` seconds (or at its request deadline)
+    gets 503. Both carry a
+    Retry-After estimate derived from observed call latency.
+
+    When ``adaptive`` is set the limit follows the upstream: it grows by
+    about one slot per ``limit`` successful calls while the stage is
+    saturated and latency stays within ``latency_tolerance`` times the
+    no-load baseline, and shrinks multiplicatively (at most once per
+    ``cooldown`` seconds) when latency degrades or calls fail with an
+    overload error. Waiter futures are created inside the running loop.
+    """
+
+    def __init__(self, name: str = "llm", limit: Optional[int] = None, min_limit: Optional[int] = None,
+                 max_limit: Optional[int] = None, queue_size: Optional[int] = None,
+                 queue_timeout: Optional[float] = None, adaptive: Optional[bool] = None,
+                 latency_tolerance: Optional[float] = None, cooldown: float = 1.0):
+        self.name = name
+        self.min_limit = min_limit or int(os.getenv("ADMISSION_MIN_LIMIT", "2"))
+        self.max_limit = max_limit or int(os.getenv("ADMISSION_MAX_LIMIT", "64"))
+        initial = limit or int(os.getenv("ADMISSION_LIMIT", "16"))
+        self._limit = float(max(self.min_limit, min(self.max_limit, initial)))
+        self.queue_size = queue_size if queue_size is not None else int(os.getenv("ADMISSION_QUEUE_SIZE", "32"))
+        self.queue_timeout = (queue_timeout if queue_timeout is not None
+                              else float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2.0")))
+        self.adaptive = adaptive if adaptive is not None else _env_bool("ADMISSION_ADAPTIVE", True)
+        self.latency_tolerance = (latency_tolerance
+                                  or float(os.getenv("ADMISSION_LATENCY_TOLERANCE", "2.0")))
+        self.cooldown = cooldown
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.in_flight = 0
+        self.latency: Optional[float] = None    # EWMA of successful call latency
+        self.baseline: Optional[float] = None   # slowly rising minimum of that latency
+        self._last_decrease = 0.0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up for a new caller"""
+        latency = self.latency or 1.0
+        return max(1, min(60, math.ceil(latency * (self.queued + 1) / max(1, self.limit))))
+
+    async def acquire(self) -> Admission:
+        """Wait for a slot; the caller must ``release()`` the returned admission"""
+        if self.in_flight < self.limit and not self._waiters:
+            self._admit()
+            return Admission(self)
+        if len(self._waiters) >= self.queue_size:
+            self.rejected_queue_full += 1
+            raise AdmissionRejected(429, f"Too many requests waiting for the {self.name} stage",
+                                    self.retry_after())
+
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            with stage(f"{self.name}_admission_wait"):
+                await asyncio.wait_for(waiter, deadline.cap(self.queue_timeout))
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                return Admission(self)
+            self.rejected_timeout += 1
+            raise AdmissionRejected(503, f"Timed out waiting for the {self.name} stage",
+                                    self.retry_after())
+        except asyncio.CancelledError:
+            # A slot handed over as we were cancelled goes to the next waiter
+            if waiter.done() and not waiter.cancelled():
+                self.in_flight -= 1
+                self._wake()
+            raise
+        finally:
+            with contextlib.suppress(ValueError):
+                self._waiters.remove(waiter)
+        return Admission(self)
+
+    def _admit(self):
+        self.in_flight += 1
+        self.admitted += 1
+
+    def _wake(self):
+        while self._waiters and self.in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._admit()
+                waiter.set_result(None)
+
+    def _release(self, started: float, ok: bool, overloaded: bool):
+        """Free a slot; ``overloaded`` marks failures that signal upstream saturation"""
+        self.in_flight -= 1
+        if ok:
+            self._observe(time.perf_counter() - started)
+        elif overloaded and self.adaptive:
+            self._decrease(0.8)
+        self._wake()
+
+    def _observe(self, latency: float):
+        self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+        if self.baseline is None or latency < self.baseline:
+            self.baseline = latency
+        else:
+            # Let the baseline drift up so one unusually fast call does not pin it
+            self.baseline += (latency - self.baseline) * 0.01
+        if not self.adaptive:
+            return
+        if self.latency > self.baseline * self.latency_tolerance:
+            self._decrease(0.9)
+        elif self.in_flight + 1 >= self.limit:
+            self._limit = min(self.max_limit, self._limit + 1.0 / self.limit)
+
+    def _decrease(self, factor: float):
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        previous = self.limit
+        self._limit = max(self.min_limit, self._limit * factor)
+        if self.limit != previous:
+            logger.info(f"Admission limit for {self.name} lowered from {previous} to {self.limit}")
+
+    @contextlib.asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold a slot for the block"""
+        admission = await self.acquire()
+        try:
+            yield
+        except Exception as e:
+            admission.release(ok=False, overloaded=is_overload(e))
+            raise
+        except BaseException:
+            admission.release(ok=False)
+            raise
+        else:
+            admission.release()
+
+    def stats(self) -> Dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "latency_seconds": self.latency,
+            "baseline_seconds": self.baseline
+        }
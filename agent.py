@@ -1,18 +1,40 @@
+import time
+# Taken before the heavy imports so the startup breakdown includes them
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import io
 import os
-from typing import Dict, List, Optional
-import requests
+import random
+from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Query, Header, Security
+from fastapi import FastAPI, HTTPException, Query, Header, Request, Security
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security.api_key import APIKeyHeader, APIKey
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, RedirectResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
 from pydantic import BaseModel
+from admission import AdmissionController, AdmissionRejected, is_overload
+import deadline
+from deadline import DeadlineExceeded, DeadlineMiddleware
 from gcp_knowledge_base import GCPKnowledgeBase, initialize_gcp_knowledge_base
+from http_cache import BodyCache, PrecompressedStaticFiles, cached_response
+from index_sync import IndexSync
+from kb_import import KBImporter, export_to, import_from, read_records
+from llm_client import DeepSeekClient, LLMError
+from llm_gateway import LLMGateway, is_retryable, register_metrics
+import metrics
+from metrics import MetricsMiddleware, record_usage, request_timings, stage, timed_phase
+from logging_setup import RequestIdMiddleware, dropped_records, sample_payload, setup_logging, truncate
+from kb_answer import KBAnswerPolicy
+from prompt_builder import PromptBuilder
+from response_cache import ResponseCache
+from singleflight import SingleFlight
 import logging
-from google.cloud import logging as cloud_logging
 from starlette.status import HTTP_403_FORBIDDEN
 import json
+import tempfile
+import weakref
 
 # Load environment variables
 load_dotenv()
@@ -25,16 +47,92 @@ app = FastAPI(title="Help Desk Agent API",
 # Initialize GCP services
 project_id = os.getenv("GCP_PROJECT_ID")
 kb = GCPKnowledgeBase(project_id)
+index_sync = IndexSync(kb)
+
+# Shared, connection-pooled DeepSeek client
+llm_client = DeepSeekClient()
+
+# Hedging, retries, circuit breaking and the optional fallback model in front of it
+llm_gateway = LLMGateway.from_env(llm_client)
+register_metrics(llm_gateway)
+
+# Bounded, adaptive concurrency for the DeepSeek stage; excess load is shed fast
+llm_admission = AdmissionController("llm")
+
+# Prompts with a stable prefix (rebuilt when a pinned article changes) and token-budgeted context
+prompt_builder = PromptBuilder()
+kb.index.add_listener(
+    lambda upserts, deletes, reset: prompt_builder.on_index_change(upserts, deletes, reset, kb.index.all_articles)
+)
+
+# Answer unambiguous matches straight from the knowledge base, skipping DeepSeek
+kb_answer_policy = KBAnswerPolicy()
+
+# Cache of generated answers, invalidated when a referenced article changes
+response_cache = ResponseCache()
+kb.add_change_listener(response_cache.invalidate_article)
 
-# Setup Cloud Logging
-logging_client = cloud_logging.Client()
-logging_client.setup_logging()
+# Serialized /kb responses, keyed by the data's version, with ETags and compressed variants
+kb_http_cache = BodyCache()
+KB_CACHE_CONTROL = f"private, max-age={int(os.getenv('KB_HTTP_MAX_AGE', '60'))}"
+
+# Coalescing of identical in-flight chats and KB searches
+chat_flight = SingleFlight("chat")
+kb_search_flight = SingleFlight("kb_search")
+
+def prompt_prefix_hit_ratio() -> float:
+    """Share of prompt tokens DeepSeek served from its context cache"""
+    hit = metrics.LLM_TOKENS.get(kind="prompt_cache_hit")
+    miss = metrics.LLM_TOKENS.get(kind="prompt_cache_miss")
+    return hit / (hit + miss) if hit + miss else 0.0
+
+# Cache, coalescing, index and I/O pool state exported on /metrics
+metrics.gauge("helpdesk_cache_hit_ratio", "Hit ratio of in-process caches", ["cache"],
+              fn=lambda: {"response": response_cache.stats()["hit_ratio"],
+                          "translation": kb.translation_cache.stats()["hit_ratio"],
+                          "kb_http": kb_http_cache.stats()["hit_ratio"],
+                          "llm_prompt_prefix": prompt_prefix_hit_ratio()})
+metrics.counter("helpdesk_cache_lookups_total", "Cache lookups by result", ["cache", "result"],
+                fn=lambda: {("response", "hit"): response_cache.hits,
+                            ("response", "miss"): response_cache.misses,
+                            ("translation", "hit"): kb.translation_cache.hits,
+                            ("translation", "miss"): kb.translation_cache.misses})
+metrics.counter("helpdesk_coalesced_requests_total", "Calls served by an identical in-flight call", ["flight"],
+                fn=lambda: {"chat": chat_flight.collapsed, "kb_search": kb_search_flight.collapsed})
+metrics.gauge("helpdesk_coalesced_in_flight", "Distinct in-flight coalesced calls", ["flight"],
+              fn=lambda: {"chat": chat_flight.in_flight, "kb_search": kb_search_flight.in_flight})
+metrics.gauge("helpdesk_admission_limit", "Current admission concurrency limit", ["stage"],
+              fn=lambda: {"llm": llm_admission.limit})
+metrics.gauge("helpdesk_admission_in_flight", "Admitted calls in flight", ["stage"],
+              fn=lambda: {"llm": llm_admission.in_flight})
+metrics.gauge("helpdesk_admission_queued", "Calls waiting for admission", ["stage"],
+              fn=lambda: {"llm": llm_admission.queued})
+metrics.counter("helpdesk_admission_rejected_total", "Calls shed by admission control", ["stage", "reason"],
+                fn=lambda: {("llm", "queue_full"): llm_admission.rejected_queue_full,
+                            ("llm", "queue_timeout"): llm_admission.rejected_timeout})
+metrics.gauge("helpdesk_search_index_generation", "Search index generation", fn=lambda: kb.index.generation)
+metrics.gauge("helpdesk_search_index_lag_seconds", "Lag of the last applied index change",
+              fn=lambda: index_sync.last_lag_seconds)
+metrics.gauge("helpdesk_gcp_io_in_flight", "GCP SDK calls in flight", ["pool"],
+              fn=lambda: {"blocking": kb.io.blocking_in_flight, "firestore": kb.io.firestore_in_flight})
+
+# Setup Cloud Logging (queued and batched off the request path)
+setup_logging()
 logger = logging.getLogger(__name__)
+metrics.counter("helpdesk_log_records_dropped_total", "Log records dropped because the log queue was full",
+                fn=dropped_records)
 
 # API Key security
 API_KEY = os.getenv("API_KEY", "sk-7c38538a7465446ba6a0bfe9da9d3565")
 api_key_header = APIKeyHeader(name="Authorization", auto_error=False)
 
+# Per-request latency metrics and Server-Timing header
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestIdMiddleware)
+# Per-request deadline (X-Request-Timeout, capped by REQUEST_TIMEOUT_MAX) shared by every stage;
+# bulk endpoints are capped by BULK_REQUEST_TIMEOUT_MAX and batch items get their own deadlines
+app.add_middleware(DeadlineMiddleware, bulk_paths=("/chat/batch", "/kb/import", "/kb/export"))
+
 # Configure CORS with specific origins
 app.add_middleware(
     CORSMiddleware,
@@ -58,15 +156,17 @@ async def get_api_key(api_key_header: str = Security(api_key_header)):
     return token
 
 # Mount static files
-app.mount("/static", StaticFiles(directory="frontend", html=True), name="static")
+# Pre-compressed (.br/.gz) variants are served when present, see http_cache.py
+static_files = PrecompressedStaticFiles(directory="frontend", html=True)
+app.mount("/static", static_files, name="static")
 
 @app.get("/")
-async def root():
-    return FileResponse("frontend/index.html")
+async def root(request: Request):
+    return await static_files.get_response("index.html", request.scope)
 
 @app.get("/chat")
-async def chat():
-    return FileResponse("frontend/chat.html")
+async def chat(request: Request):
+    return await static_files.get_response("chat.html", request.scope)
 
 class ChatMessage(BaseModel):
     message: str
@@ -75,6 +175,120 @@ class ChatMessage(BaseModel):
 class ChatResponse(BaseModel):
     response: str
     knowledge_base_articles: List[Dict] = []
+    kb_answer: bool = False  # True when answered from the knowledge base without the LLM
+
+def build_chat_messages(message: str, kb_results: List[Dict]) -> List[Dict]:
+    """Build the DeepSeek message list with knowledge base context"""
+    # Stable, cacheable system prefix first; passages of the top 2 articles go with the question,
+    # or only the top one when the deadline leaves no time for a longer prompt
+    return prompt_builder.build_messages(message, kb_results[:2] if deadline.allow_optional() else kb_results[:1])
+
+def sse_event(event: str, data) -> str:
+    """Format a server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+def log_chat(message: str, language: str, kb_results: List[Dict], source: str,
+             usage: Optional[Dict], response: Optional[str], streamed: bool = False):
+    """Count and log one structured summary per answered chat; message text only when sampled"""
+    metrics.CHAT_ANSWERS.inc(source=source)
+    fields = {
+        "language": language,
+        "message_chars": len(message),
+        "articles": [article.get("id") for article in kb_results[:2]],
+        "source": source,
+        "streamed": streamed,
+        "stage_ms": request_timings()
+    }
+    if usage:
+        fields["tokens"] = {key: value for key, value in usage.items() if key.endswith("_tokens")}
+    if response is not None:
+        fields["response_chars"] = len(response)
+    if sample_payload():
+        fields["message"] = truncate(message)
+        fields["response"] = truncate(response)
+    logger.info("Chat answered", extra={"json_fields": fields})
+
+def rejection_response(e: AdmissionRejected) -> HTTPException:
+    """429/503 with Retry-After for a request shed by admission control"""
+    logger.warning(f"Shedding chat request: {e.detail}")
+    return HTTPException(status_code=e.status_code, detail=e.detail,
+                         headers={"Retry-After": str(e.retry_after)})
+
+def flight_key(message: str, language: str) -> Tuple[str, str]:
+    """Key under which in-flight work is shared: only the same question, up to surrounding whitespace"""
+    return (message.strip(), language)
+
+async def search_knowledge_base(message: str, language: str) -> List[Tuple[Dict, float]]:
+    """Search the knowledge base for (article, score) pairs, sharing identical in-flight searches"""
+    with stage("kb_search"):
+        return await kb_search_flight.do(
+            flight_key(message, language),
+            lambda: kb.search_articles_scored(message, language, limit=2)  # Only the top 2 are used as context
+        )
+
+def kb_answer(message: str, article: Dict) -> str:
+    """Templated answer from the most relevant passages of one article"""
+    with stage("kb_answer"):
+        return f"{article['title']}\n\n{prompt_builder.excerpt(message, article, kb_answer_policy.max_tokens)}"
+
+def kb_fallback(message: str, language: str, kb_results: List[Dict], scored: List[Tuple[Dict, float]],
+                error: Exception, streamed: bool = False) -> Optional[str]:
+    """Knowledge base answer when DeepSeek is unavailable or too slow, or None if there is nothing to answer with"""
+    article = kb_answer_policy.fallback_article(scored)
+    if article is None or not (isinstance(error, DeadlineExceeded) or is_retryable(error)):
+        return None
+    logger.warning(f"Answering from the knowledge base, DeepSeek unavailable: {error.detail}")
+    response = kb_answer(message, article)
+    log_chat(message, language, kb_results, "knowledge_base_fallback", None, response, streamed=streamed)
+    return response
+
+async def answer_chat(message: str, language: str) -> Dict:
+    """Answer a chat message from the knowledge base and DeepSeek"""
+    # First, search the knowledge base
+    scored = await search_knowledge_base(message, language)
+    return await answer_from_search(message, language, scored)
+
+async def answer_from_search(message: str, language: str, scored: List[Tuple[Dict, float]]) -> Dict:
+    """Answer a chat message given its knowledge base search results"""
+    kb_results = [article for article, _ in scored]
+    logger.debug(f"Found {len(kb_results)} relevant articles")
+
+    # A clear, unambiguous match is answered without DeepSeek
+    article = kb_answer_policy.choose(message, scored)
+    if article is not None:
+        response = kb_answer(message, article)
+        log_chat(message, language, kb_results, "knowledge_base", None, response)
+        return {"response": response, "knowledge_base_articles": kb_results[:2], "kb_answer": True}
+
+    with stage("cache_lookup"):
+        cached = response_cache.get(message, language, kb_results[:2])
+    if cached is not None:
+        log_chat(message, language, kb_results, "cache", None, cached["response"])
+        return cached
+
+    with stage("prompt_build"):
+        messages = build_chat_messages(message, kb_results)
+
+    try:
+        async with llm_admission.slot():
+            with stage("llm"):
+                response_data = await llm_gateway.chat_completion(messages, temperature=0.7, max_tokens=1000)
+    except (LLMError, DeadlineExceeded) as e:
+        response = kb_fallback(message, language, kb_results, scored, e)
+        if response is None:
+            raise
+        return {"response": response, "knowledge_base_articles": kb_results[:2], "kb_answer": True}
+    record_usage(response_data.get("usage"))
+
+    assistant_response = response_data["choices"][0]["message"]["content"]
+    log_chat(message, language, kb_results, "llm", response_data.get("usage"), assistant_response)
+
+    result = {
+        "response": assistant_response,
+        "knowledge_base_articles": kb_results[:2]  # Return top 2 relevant articles
+    }
+    response_cache.put(message, language, kb_results[:2], result)
+    return result
 
 @app.post("/chat", response_model=ChatResponse)
 async def chat_with_agent(
@@ -85,119 +299,426 @@ async def chat_with_agent(
     Chat endpoint for direct communication with the AI agent
     """
     try:
-        # Log incoming message
-        logger.info(f"Received chat message: {chat_message.message}")
-        
-        # First, search the knowledge base
-        kb_results = await kb.search_articles(chat_message.message, chat_message.language)
-        logger.info(f"Found {len(kb_results)} relevant articles")
-        
-        # Prepare system message with knowledge base context
-        system_message = "You are an expert IT support engineer. "
-        if kb_results:
-            system_message += "Here are some relevant articles from our knowledge base:\n\n"
-            for article in kb_results[:2]:  # Include top 2 most relevant articles
-                system_message += f"Article: {article['title']}\n"
-                system_message += f"Content: {article['content']}\n\n"
+        # Identical concurrent questions share one search and one completion
+        return await chat_flight.do(
+            flight_key(chat_message.message, chat_message.language),
+            lambda: answer_chat(chat_message.message, chat_message.language)
+        )
         
-        system_message += "Please provide a helpful response based on this information and your expertise."
+    except HTTPException:
+        raise
+    except AdmissionRejected as e:
+        raise rejection_response(e)
+    except (LLMError, DeadlineExceeded) as e:
+        logger.error(e.detail)
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except Exception as e:
+        error_msg = f"Unexpected error: {str(e)}"
+        logger.error(error_msg)
+        raise HTTPException(status_code=500, detail=error_msg)
 
-        api_key = os.getenv("DEEPSEEK_API_KEY")
-        if not api_key:
-            logger.error("DeepSeek API key not found")
-            raise HTTPException(status_code=500, detail="DeepSeek API key not found")
+@app.post("/chat/stream")
+async def chat_with_agent_stream(
+    chat_message: ChatMessage,
+    api_key: APIKey = Security(get_api_key)
+):
+    """
+    Streaming chat endpoint: relays the answer as server-sent events.
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}"
-        }
+    Emits one ``articles`` event with the knowledge base context, then a
+    ``delta`` event per generated chunk and finally ``done`` (or ``error``).
+    Knowledge base answers (the fast path, or the fallback when DeepSeek is
+    unavailable) arrive as a single delta and ``done`` carries
+    ``{"kb_answer": true}``.
+    """
+    try:
+        scored = await search_knowledge_base(chat_message.message, chat_message.language)
+        kb_results = [article for article, _ in scored]
+        logger.debug(f"Found {len(kb_results)} relevant articles")
+    except DeadlineExceeded as e:
+        logger.error(e.detail)
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except Exception as e:
+        error_msg = f"Unexpected error: {str(e)}"
+        logger.error(error_msg)
+        raise HTTPException(status_code=500, detail=error_msg)
 
-        data = {
-            "model": "deepseek-chat",
-            "messages": [
-                {
-                    "role": "system",
-                    "content": system_message
-                },
-                {
-                    "role": "user",
-                    "content": chat_message.message
-                }
-            ],
-            "temperature": 0.7,
-            "max_tokens": 1000
-        }
+    article = kb_answer_policy.choose(chat_message.message, scored)
+    if article is not None:
+        response = kb_answer(chat_message.message, article)
+        log_chat(chat_message.message, chat_message.language, kb_results, "knowledge_base", None,
+                 response, streamed=True)
+
+        async def kb_answer_stream():
+            yield sse_event("articles", kb_results[:2])
+            yield sse_event("delta", {"content": response})
+            yield sse_event("done", {"kb_answer": True})
 
+        return StreamingResponse(
+            kb_answer_stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    with stage("cache_lookup"):
+        cached = response_cache.get(chat_message.message, chat_message.language, kb_results[:2])
+    with stage("prompt_build"):
+        messages = build_chat_messages(chat_message.message, kb_results)
+
+    # Admit before the 200 goes out so overload is still a fast 429/503
+    admission = None
+    if cached is None:
         try:
-            logger.info("Sending request to DeepSeek API...")
-            response = requests.post(
-                "https://api.deepseek.com/v1/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=60
-            )
-        except requests.exceptions.RequestException as e:
-            error_msg = "DeepSeek API is currently unavailable. Our service is experiencing temporary issues. Please try again later."
-            logger.error(f"DeepSeek API connection error: {str(e)}")
-            raise HTTPException(status_code=503, detail=error_msg)
-            
-        logger.info(f"Response status: {response.status_code}")
-        if response.status_code != 200:
-            error_detail = f"DeepSeek API error: {response.text}"
-            logger.error(error_detail)
-            raise HTTPException(status_code=response.status_code, detail=error_detail)
-            
-        response_data = response.json()
-        logger.info(f"DeepSeek API response: {json.dumps(response_data)}")
-        
-        if "choices" not in response_data or not response_data["choices"]:
-            logger.error("Invalid response format from DeepSeek API")
-            raise HTTPException(status_code=500, detail="Invalid response format from DeepSeek API")
-            
-        assistant_response = response_data["choices"][0]["message"]["content"]
-        logger.info(f"Generated response: {assistant_response}")
-        
-        return {
-            "response": assistant_response,
-            "knowledge_base_articles": kb_results[:2]  # Return top 2 relevant articles
-        }
-        
-    except requests.exceptions.RequestException as e:
-        error_msg = f"Request error: {str(e)}"
-        logger.error(error_msg)
-        raise HTTPException(status_code=500, detail=error_msg)
-    except json.JSONDecodeError as e:
-        error_msg = f"Failed to parse API response: {str(e)}"
-        logger.error(error_msg)
-        raise HTTPException(status_code=500, detail=error_msg)
+            admission = await llm_admission.acquire()
+        except AdmissionRejected as e:
+            raise rejection_response(e)
+
+    async def event_stream():
+        yield sse_event("articles", kb_results[:2])
+        if cached is not None:
+            log_chat(chat_message.message, chat_message.language, kb_results, "cache", None,
+                     cached["response"], streamed=True)
+            yield sse_event("delta", {"content": cached["response"]})
+            yield sse_event("done", {})
+            return
+        ok, overloaded = False, False
+        try:
+            parts = []
+            usage = None
+            async for chunk in llm_gateway.stream_chat_completion(
+                    messages, temperature=0.7, max_tokens=1000, stream_options={"include_usage": True}):
+                record_usage(chunk.get("usage"))
+                usage = chunk.get("usage") or usage
+                choices = chunk.get("choices") or []
+                if not choices:
+                    continue
+                content = (choices[0].get("delta") or {}).get("content")
+                if content:
+                    parts.append(content)
+                    yield sse_event("delta", {"content": content})
+            response_cache.put(chat_message.message, chat_message.language, kb_results[:2], {
+                "response": "".join(parts),
+                "knowledge_base_articles": kb_results[:2]
+            })
+            log_chat(chat_message.message, chat_message.language, kb_results, "llm", usage,
+                     "".join(parts), streamed=True)
+            ok = True
+            yield sse_event("done", {})
+        except (LLMError, DeadlineExceeded) as e:
+            overloaded = is_overload(e)
+            response = None
+            if not parts:
+                response = kb_fallback(chat_message.message, chat_message.language, kb_results, scored, e,
+                                       streamed=True)
+            if response is not None:
+                yield sse_event("delta", {"content": response})
+                yield sse_event("done", {"kb_answer": True})
+            else:
+                logger.error(e.detail)
+                yield sse_event("error", {"status": e.status_code, "detail": e.detail})
+        except Exception as e:
+            error_msg = f"Unexpected error: {str(e)}"
+            logger.error(error_msg)
+            yield sse_event("error", {"status": 500, "detail": error_msg})
+        finally:
+            admission.release(ok=ok, overloaded=overloaded)
+
+    stream = event_stream()
+    if admission is not None:
+        # Release the slot even if the client goes away before streaming starts
+        weakref.finalize(stream, admission.release, ok=False)
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+class BatchChatItem(BaseModel):
+    id: Optional[str] = None  # Caller's reference (e.g. ticket id), echoed in the result
+    message: str
+    language: str = "en"
+
+class BatchChatRequest(BaseModel):
+    messages: List[BatchChatItem]
+
+CHAT_BATCH_MAX_ITEMS = int(os.getenv("CHAT_BATCH_MAX_ITEMS", "500"))
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "8"))
+# How long a batch item keeps retrying while admission control sheds it
+CHAT_BATCH_ADMISSION_WAIT = float(os.getenv("CHAT_BATCH_ADMISSION_WAIT", "300"))
+CHAT_BATCH_ITEMS = metrics.counter("helpdesk_chat_batch_items_total", "Batch chat items answered, by status",
+                                   ["status"])
+CHAT_BATCH_RETRIES = metrics.counter("helpdesk_chat_batch_admission_retries_total",
+                                     "Batch chat items retried after being shed by admission control")
+
+def batch_result(task) -> Dict:
+    """Status and answer (or error detail) of one distinct batch question"""
+    try:
+        result = task.result()
+    except (AdmissionRejected, LLMError, DeadlineExceeded) as e:
+        return {"status": e.status_code, "detail": e.detail}
     except Exception as e:
         error_msg = f"Unexpected error: {str(e)}"
         logger.error(error_msg)
-        raise HTTPException(status_code=500, detail=error_msg)
+        return {"status": 500, "detail": error_msg}
+    return {"status": 200, "kb_answer": False, **result}
+
+async def answer_chat_batch(items: List[BatchChatItem], item_timeout: float):
+    """Answer a batch of chat messages, yielding one result per item in completion order.
+
+    Identical questions (up to surrounding whitespace) are answered once. Knowledge base retrieval runs for
+    the whole batch up front (concurrent searches share translation API
+    calls), then at most ``CHAT_BATCH_CONCURRENCY`` questions are answered
+    at a time. Each search and each answer gets its own ``item_timeout``
+    deadline. An item shed by admission control is retried after its
+    Retry-After (jittered) for up to ``CHAT_BATCH_ADMISSION_WAIT`` seconds
+    instead of failing while the service is busy.
+    """
+    groups: Dict[Tuple[str, str], List[int]] = {}
+    for index, item in enumerate(items):
+        groups.setdefault(flight_key(item.message, item.language), []).append(index)
+    keys = list(groups)
+
+    async def search(key: Tuple[str, str]) -> List[Tuple[Dict, float]]:
+        deadline.set_deadline(item_timeout)
+        return await search_knowledge_base(items[groups[key][0]].message, key[1])
+
+    searches = await asyncio.gather(*[search(key) for key in keys], return_exceptions=True)
+    slots = asyncio.Semaphore(CHAT_BATCH_CONCURRENCY)
+
+    async def answer(key: Tuple[str, str], scored) -> Dict:
+        if isinstance(scored, BaseException):
+            raise scored
+        item = items[groups[key][0]]
+        async with slots:
+            give_up_at = time.monotonic() + CHAT_BATCH_ADMISSION_WAIT
+            while True:
+                deadline.set_deadline(item_timeout)
+                try:
+                    # Shares the answer with identical /chat requests in flight
+                    return await chat_flight.do(key, lambda: answer_from_search(item.message, item.language,
+                                                                                scored))
+                except AdmissionRejected as e:
+                    delay = e.retry_after * random.uniform(0.5, 1.5)
+                    if time.monotonic() + delay > give_up_at:
+                        raise
+                    CHAT_BATCH_RETRIES.inc()
+                    await asyncio.sleep(delay)
+
+    tasks = {asyncio.ensure_future(answer(key, scored)): key for key, scored in zip(keys, searches)}
+    try:
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = batch_result(task)
+                for index in groups[tasks[task]]:
+                    CHAT_BATCH_ITEMS.inc(status=result["status"])
+                    yield {"index": index, "id": items[index].id, **result}
+    finally:
+        # The client went away: stop answering the rest
+        for task in tasks:
+            task.cancel()
+
+def check_batch(batch: BatchChatRequest):
+    if not batch.messages:
+        raise HTTPException(status_code=400, detail="No messages in batch")
+    if len(batch.messages) > CHAT_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {CHAT_BATCH_MAX_ITEMS} messages per batch")
+
+@app.post("/chat/batch")
+async def chat_batch(
+    batch: BatchChatRequest,
+    request: Request,
+    api_key: APIKey = Security(get_api_key)
+):
+    """
+    Answer many chat messages in one request.
+
+    Returns ``{"results": [...]}`` in completion order; each result carries
+    the item's ``index`` and ``id`` and its own ``status`` with either the
+    chat response fields or an error ``detail``.
+    """
+    check_batch(batch)
+    item_timeout = deadline.request_timeout(request.headers)
+    return {"results": [result async for result in answer_chat_batch(batch.messages, item_timeout)]}
+
+@app.post("/chat/batch/stream")
+async def chat_batch_stream(
+    batch: BatchChatRequest,
+    request: Request,
+    api_key: APIKey = Security(get_api_key)
+):
+    """
+    Streaming batch endpoint: one NDJSON line per item, as soon as it is answered.
+    """
+    check_batch(batch)
+    item_timeout = deadline.request_timeout(request.headers)
+
+    async def ndjson_stream():
+        async for result in answer_chat_batch(batch.messages, item_timeout):
+            yield json.dumps(jsonable_encoder(result)) + "\n"
+
+    return StreamingResponse(
+        ndjson_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+ARTICLE_FIELDS = ("id", "title", "content", "category", "tags", "created_at", "updated_at")
+KB_PAGE_SIZE = int(os.getenv("KB_PAGE_SIZE", "50"))
+KB_PAGE_MAX_SIZE = int(os.getenv("KB_PAGE_MAX_SIZE", "200"))
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Validated field projection from a comma separated list"""
+    if not fields:
+        return None
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in selected if field not in ARTICLE_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown article fields: {', '.join(unknown)}")
+    return ["id"] + [field for field in selected if field != "id"]
 
 @app.get("/kb/articles")
 async def get_kb_articles(
+    request: Request,
     language: str = Query("en", description="Language code (e.g., en, es, fr)"),
+    limit: int = Query(KB_PAGE_SIZE, ge=1, le=KB_PAGE_MAX_SIZE, description="Articles per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    fields: Optional[str] = Query(None, description="Comma separated fields to return, e.g. title,category"),
+    output_format: str = Query("json", alias="format", pattern="^(json|ndjson)$",
+                               description="json (one page) or ndjson (every article from the cursor on)"),
     api_key: APIKey = Security(get_api_key)
 ):
-    """Get all knowledge base articles"""
+    """
+    List knowledge base articles a page at a time.
+
+    ``format=json`` returns ``{"articles": [...], "next_cursor": ...}``;
+    ``next_cursor`` is null on the last page. ``format=ndjson`` streams one
+    article per line, fetching and translating ``limit`` articles at a time.
+    """
+    projection = parse_fields(fields)
+    # A loaded index that index sync keeps current is the source, so its generation versions the pages;
+    # otherwise pages come from Firestore and cached bodies are at most KB_HTTP_CACHE_TTL seconds stale
+    indexed = kb.index_loaded and index_sync.following
+    if output_format == "ndjson":
+        async def ndjson_stream():
+            after = cursor
+            while True:
+                try:
+                    articles, after = await kb.list_articles(language, limit, after, projection, indexed)
+                except Exception as e:
+                    logger.error(f"Error getting articles: {str(e)}")
+                    yield json.dumps({"error": str(e)}) + "\n"
+                    return
+                for article in articles:
+                    yield json.dumps(jsonable_encoder(article)) + "\n"
+                if after is None:
+                    return
+
+        return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
+
+    async def build_page() -> Dict:
+        articles, next_cursor = await kb.list_articles(language, limit, cursor, projection, indexed)
+        return {"articles": articles, "next_cursor": next_cursor}
+
     try:
-        articles = await kb.search_articles("", language)
-        return {"articles": articles}
+        version = kb.index.generation if indexed else "firestore"
+        key = ("kb_articles", version, language, limit, cursor, tuple(projection or ()))
+        return cached_response(request, await kb_http_cache.get_or_build(key, build_page), KB_CACHE_CONTROL)
     except Exception as e:
         logger.error(f"Error getting articles: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/kb/categories")
-async def get_kb_categories(api_key: APIKey = Security(get_api_key)):
+async def get_kb_categories(request: Request, api_key: APIKey = Security(get_api_key)):
     """Get all knowledge base categories"""
+    async def build_categories() -> Dict:
+        return {"categories": await kb.get_categories()}
+
     try:
-        categories = await kb.get_categories()
-        return {"categories": categories}
+        # Own changes show at once; changes made by other instances within KB_HTTP_CACHE_TTL seconds
+        entry = await kb_http_cache.get_or_build(("kb_categories", kb.categories_version), build_categories)
+        return cached_response(request, entry, KB_CACHE_CONTROL)
     except Exception as e:
         logger.error(f"Error getting categories: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/kb/import")
+async def import_kb_articles(
+    request: Request,
+    source: Optional[str] = Query(None, description="gs://bucket/object to import instead of the request body"),
+    input_format: Optional[str] = Query(None, alias="format", pattern="^(json|ndjson)$",
+                                        description="json (array or knowledge_base.json layout) or ndjson"),
+    api_key: APIKey = Security(get_api_key)
+):
+    """Bulk import articles from the request body or a GCS object; unchanged articles are skipped"""
+    try:
+        if source is not None:
+            if not source.startswith("gs://"):
+                raise HTTPException(status_code=400, detail="source must be a gs:// URI")
+            return await import_from(kb, source, input_format)
+
+        fmt = input_format or ("ndjson" if "ndjson" in request.headers.get("content-type", "") else "json")
+        # Uploads are spooled to disk; unlike SpooledTemporaryFile (before Python 3.11) this is a full
+        # io object that TextIOWrapper can read from
+        with tempfile.TemporaryFile(mode="w+b") as body:
+            async for chunk in request.stream():
+                body.write(chunk)
+            body.seek(0)
+            text = io.TextIOWrapper(body, encoding="utf-8")
+            try:
+                return await KBImporter(kb).run(read_records(text, fmt))
+            finally:
+                text.detach()
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error importing articles: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/kb/export")
+async def export_kb_articles(
+    destination: str = Query(..., description="gs://bucket/object to write the articles to as NDJSON"),
+    api_key: APIKey = Security(get_api_key)
+):
+    """Export every article to a GCS object as NDJSON"""
+    if not destination.startswith("gs://"):
+        raise HTTPException(status_code=400, detail="destination must be a gs:// URI")
+    try:
+        return await export_to(kb, destination)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error exporting articles: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/stats")
+async def get_stats(api_key: APIKey = Security(get_api_key)):
+    """Cache, request coalescing and search index counters"""
+    return {
+        "search_index": index_sync.stats(),
+        "vector_index": kb.vectors.stats() if kb.vectors is not None else None,
+        "response_cache": response_cache.stats(),
+        "translation_cache": kb.translation_cache.stats(),
+        "kb_http_cache": kb_http_cache.stats(),
+        "translation_batches": kb.translation_batcher.stats(),
+        "gcp_io": kb.io.stats(),
+        "admission": {"llm": llm_admission.stats()},
+        "startup_ms": startup_phases,
+        "llm_gateway": llm_gateway.stats(),
+        "coalescing": {
+            "chat": chat_flight.stats(),
+            "kb_search": kb_search_flight.stats()
+        }
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics"""
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -212,16 +733,53 @@ async def health_check():
         logger.error(f"Health check failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Cold start breakdown in milliseconds, exported on /stats and /metrics
+startup_phases: Dict[str, float] = {}
+metrics.gauge("helpdesk_startup_seconds", "Duration of each startup phase", ["phase"],
+              fn=lambda: {phase: ms / 1000 for phase, ms in startup_phases.items()})
+
+async def warm_index():
+    """Load the search index (which also pins prompt articles) and start following changes"""
+    with timed_phase(startup_phases, "index_load"):
+        await kb.load_index()
+    with timed_phase(startup_phases, "index_sync_start"):
+        await index_sync.start()
+    logger.info("Search index ready", extra={"json_fields": {"startup_ms": startup_phases}})
+
+def log_warmup_failure(task: asyncio.Future):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Error warming the search index: {str(task.exception())}")
+
 @app.on_event("startup")
 async def startup_event():
-    """Initialize the knowledge base on startup"""
+    """Seed an empty knowledge base and warm what the first request needs.
+
+    GCP clients are created on first use. With ``INDEX_WARMUP=background``
+    the instance starts serving before the search index is loaded, and
+    searches use Firestore directly until it is.
+    """
+    startup_phases["import"] = round((time.perf_counter() - IMPORT_STARTED) * 1000, 1)
     try:
-        await initialize_gcp_knowledge_base(kb)
-        logger.info("Knowledge base initialized successfully")
+        with timed_phase(startup_phases, "kb_bootstrap"):
+            await initialize_gcp_knowledge_base(kb)
+        if os.getenv("INDEX_WARMUP", "startup") == "background":
+            asyncio.ensure_future(warm_index()).add_done_callback(log_warmup_failure)
+        else:
+            await warm_index()
+        logger.info("Knowledge base initialized successfully", extra={"json_fields": {"startup_ms": startup_phases}})
     except Exception as e:
         logger.error(f"Error initializing knowledge base: {str(e)}")
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop index sync and release pooled upstream connections"""
+    await index_sync.stop()
+    await llm_gateway.aclose()
+    if kb.vectors is not None:
+        kb.vectors.shutdown()
+    kb.io.shutdown()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8080)
@@ -0,0 +1 @@
+"""Offline benchmarks and load tests with local stand-ins for GCP and DeepSeek."""
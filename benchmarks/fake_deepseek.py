@@ -0,0 +1,203 @@
+"""Local stand-in for the DeepSeek chat completions API.
+
+Serves ``POST /chat/completions`` (and ``/v1/chat/completions``) with a
+configurable time to first token, token generation rate, error rate and
+injected faults, in both streaming (SSE) and non-streaming modes::
+
+    python -m benchmarks.fake_deepseek --port 9100 --latency 0.3 --token-rate 50
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+from aiohttp import web
+
+_WORDS = ("check restart the network settings then verify your credentials and "
+          "contact support if the issue persists after clearing the cache").split()
+
+
+class FakeDeepSeekConfig:
+    def __init__(self, latency: float = 0.2, jitter: float = 0.0, token_rate: float = 100.0,
+                 completion_tokens: int = 60, error_rate: float = 0.0, error_status: int = 500,
+                 slow_rate: float = 0.0, slow_latency: float = 5.0, seed: Optional[int] = None):
+        self.latency = latency                  # time to first token, seconds
+        self.jitter = jitter                    # uniform +/- jitter on latency
+        self.token_rate = token_rate            # generated tokens per second
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate            # fraction answered with error_status
+        self.error_status = error_status
+        self.slow_rate = slow_rate              # fraction delayed by slow_latency (tail faults)
+        self.slow_latency = slow_latency
+        self.random = random.Random(seed)
+
+
+class FakeDeepSeek:
+    """aiohttp application emulating DeepSeek; counts requests it served"""
+
+    def __init__(self, config: Optional[FakeDeepSeekConfig] = None):
+        self.config = config or FakeDeepSeekConfig()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._prefixes = set()
+        self.app = web.Application()
+        for path in ("/chat/completions", "/v1/chat/completions"):
+            self.app.router.add_post(path, self.handle)
+        self._runner: Optional[web.AppRunner] = None
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _first_token_delay(self) -> float:
+        config = self.config
+        delay = config.latency + config.random.uniform(-config.jitter, config.jitter)
+        if config.slow_rate and config.random.random() < config.slow_rate:
+            delay += config.slow_latency
+        return max(0.0, delay)
+
+    def _usage(self, body: Dict, completion_tokens: int) -> Dict:
+        messages = body.get("messages", [])
+        prompt_tokens = max(1, sum(len(message.get("content") or "") for message in messages) // 4)
+        # Context caching stand-in: a first message seen before counts as a cached prefix
+        first = (messages[0].get("content") or "") if messages else ""
+        hit_tokens = min(prompt_tokens, len(first) // 4) if first in self._prefixes else 0
+        self._prefixes.add(first)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_cache_hit_tokens": hit_tokens,
+            "prompt_cache_miss_tokens": prompt_tokens - hit_tokens
+        }
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        config = self.config
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            body = await request.json()
+            await asyncio.sleep(self._first_token_delay())
+            if config.error_rate and config.random.random() < config.error_rate:
+                self.errors += 1
+                return web.json_response({"error": {"message": "injected failure"}},
+                                         status=config.error_status)
+
+            max_tokens = body.get("max_tokens") or config.completion_tokens
+            n_tokens = min(config.completion_tokens, max_tokens)
+            tokens = [config.random.choice(_WORDS) + " " for _ in range(n_tokens)]
+            per_token = 1.0 / config.token_rate if config.token_rate else 0.0
+            created = int(time.time())
+
+            if not body.get("stream"):
+                await asyncio.sleep(per_token * n_tokens)
+                return web.json_response({
+                    "id": f"fake-{self.requests}",
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": body.get("model"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "".join(tokens)},
+                        "finish_reason": "stop"
+                    }],
+                    "usage": self._usage(body, n_tokens)
+                })
+
+            response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+            await response.prepare(request)
+            for token in tokens:
+                chunk = {"id": f"fake-{self.requests}", "object": "chat.completion.chunk",
+                         "created": created, "choices": [{"index": 0, "delta": {"content": token}}]}
+                await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                if per_token:
+                    await asyncio.sleep(per_token)
+            if (body.get("stream_options") or {}).get("include_usage"):
+                chunk = {"choices": [], "usage": self._usage(body, n_tokens)}
+                await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await response.write(b"data: [DONE]\n\n")
+            await response.write_eof()
+            return response
+        finally:
+            self.in_flight -= 1
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """Start serving on the current loop; returns the bound port"""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        return site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def start_in_thread(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """Serve from a dedicated thread and event loop; returns the bound port"""
+        started = threading.Event()
+        result = {}
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            result["port"] = self._loop.run_until_complete(self.start(host, port))
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.stop())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="fake-deepseek", daemon=True)
+        self._thread.start()
+        started.wait()
+        return result["port"]
+
+    def stop_thread(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+
+    def stats(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "max_in_flight": self.max_in_flight
+        }
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Time to first token (s)")
+    parser.add_argument("--llm-jitter", type=float, default=0.05, help="Uniform latency jitter (s)")
+    parser.add_argument("--token-rate", type=float, default=100.0, help="Generated tokens per second")
+    parser.add_argument("--completion-tokens", type=int, default=60, help="Tokens per completion")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Fraction of upstream errors")
+    parser.add_argument("--llm-error-status", type=int, default=500, help="HTTP status of injected errors")
+    parser.add_argument("--llm-slow-rate", type=float, default=0.0, help="Fraction of slow upstream answers")
+    parser.add_argument("--llm-slow-latency", type=float, default=5.0, help="Extra delay of slow answers (s)")
+
+
+def config_from_args(args: argparse.Namespace) -> FakeDeepSeekConfig:
+    return FakeDeepSeekConfig(latency=args.llm_latency, jitter=args.llm_jitter,
+                              token_rate=args.token_rate, completion_tokens=args.completion_tokens,
+                              error_rate=args.llm_error_rate, error_status=args.llm_error_status,
+                              slow_rate=args.llm_slow_rate, slow_latency=args.llm_slow_latency)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake DeepSeek chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeDeepSeek(config_from_args(args))
+    web.run_app(server.app, host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
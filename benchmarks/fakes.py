@@ -0,0 +1,489 @@
+"""In-memory stand-ins for the Google Cloud clients used by the service.
+
+``install()`` swaps the Firestore, Storage, Translate and Cloud Logging
+client classes in the ``google.cloud`` packages for these fakes, so
+``agent`` and ``gcp_knowledge_base`` can be imported and exercised without
+credentials or network access. Only the API surface the service uses is
+implemented.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+# Shared document store: collection name -> document id -> data
+_STORE: Dict[str, Dict[str, Dict]] = {}
+_STORE_LOCK = threading.RLock()
+
+# Simulated latencies in seconds, tweakable by benchmarks
+LATENCY = {"firestore": 0.0, "translate": 0.0, "storage": 0.0}
+
+# Billed Firestore operations: documents returned by queries, gets and listeners
+COUNTERS = {"reads": 0}
+
+
+def reset_store():
+    with _STORE_LOCK:
+        _STORE.clear()
+        COUNTERS["reads"] = 0
+
+
+def _count_reads(count: int):
+    with _STORE_LOCK:
+        COUNTERS["reads"] += count
+
+
+def seed_articles(articles: List[Dict]):
+    """Put articles straight into the fake ``articles`` collection"""
+    with _STORE_LOCK:
+        collection = _STORE.setdefault("articles", {})
+        for article in articles:
+            collection[str(article["id"])] = dict(article)
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, doc_id: str, data: Optional[Dict]):
+        self.id = doc_id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self) -> Optional[Dict]:
+        return dict(self._data) if self._data is not None else None
+
+
+def _comparable(value):
+    # Firestore stores naive datetimes as UTC and returns aware ones
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _compare(value, op: str, operand) -> bool:
+    value, operand = _comparable(value), _comparable(operand)
+    try:
+        if op == "==":
+            return value == operand
+        if op == ">":
+            return value is not None and value > operand
+        if op == ">=":
+            return value is not None and value >= operand
+        if op == "<":
+            return value is not None and value < operand
+        if op == "<=":
+            return value is not None and value <= operand
+        if op == "array_contains":
+            return operand in (value or [])
+    except TypeError:
+        return False
+    raise ValueError(f"Unsupported operator: {op}")
+
+
+class _BaseQuery:
+    def __init__(self, collection: str, filters=(), order: Optional[str] = None,
+                 limit: Optional[int] = None, after=None, fields: Optional[List[str]] = None):
+        self._collection = collection
+        self._filters = list(filters)
+        self._order = order
+        self._limit = limit
+        self._after = after
+        self._fields = fields
+
+    def _copy(self, **changes):
+        state = dict(filters=self._filters, order=self._order, limit=self._limit,
+                     after=self._after, fields=self._fields)
+        state.update(changes)
+        return type(self)(self._collection, **state)
+
+    def where(self, field: str, op: str, value):
+        return self._copy(filters=self._filters + [(field, op, value)])
+
+    def order_by(self, field, direction=None):
+        return self._copy(order=str(field))
+
+    def limit(self, count: int):
+        return self._copy(limit=count)
+
+    def start_after(self, values):
+        return self._copy(after=values)
+
+    def select(self, fields):
+        return self._copy(fields=list(fields))
+
+    def _sort_key(self, doc_id: str, data: Dict):
+        if self._order in (None, "__name__"):
+            return doc_id
+        return _comparable(data.get(self._order))
+
+    def _matches(self, data: Dict) -> bool:
+        return all(_compare(data.get(field), op, value) for field, op, value in self._filters)
+
+    def _run(self) -> List[FakeDocumentSnapshot]:
+        with _STORE_LOCK:
+            rows = list(_STORE.get(self._collection, {}).items())
+        rows = [(doc_id, data) for doc_id, data in rows if self._matches(data)]
+        if self._order is not None:
+            rows.sort(key=lambda row: self._sort_key(*row))
+            if self._after is not None:
+                after = self._after
+                if isinstance(after, dict):
+                    after = _comparable(after.get(self._order))
+                elif isinstance(after, FakeDocumentSnapshot):
+                    after = self._sort_key(after.id, after.to_dict())
+                rows = [row for row in rows if self._sort_key(*row) > after]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        _count_reads(len(rows))
+        snapshots = []
+        for doc_id, data in rows:
+            if self._fields is not None:
+                data = {key: value for key, value in data.items() if key in self._fields}
+            snapshots.append(FakeDocumentSnapshot(doc_id, dict(data)))
+        return snapshots
+
+
+class _BaseDocument:
+    def __init__(self, collection: str, doc_id: Optional[str] = None):
+        self._collection = collection
+        self.id = doc_id or uuid.uuid4().hex[:20]
+
+    def _set(self, data: Dict, merge: bool = False):
+        with _STORE_LOCK:
+            documents = _STORE.setdefault(self._collection, {})
+            if merge and self.id in documents:
+                documents[self.id].update(data)
+            else:
+                documents[self.id] = dict(data)
+        _notify(self._collection, self.id)
+
+    def _get(self) -> FakeDocumentSnapshot:
+        _count_reads(1)
+        with _STORE_LOCK:
+            data = _STORE.get(self._collection, {}).get(self.id)
+            return FakeDocumentSnapshot(self.id, dict(data) if data is not None else None)
+
+    def _update(self, data: Dict):
+        with _STORE_LOCK:
+            documents = _STORE.get(self._collection, {})
+            if self.id not in documents:
+                raise KeyError(f"No document to update: {self.id}")
+            documents[self.id].update(data)
+        _notify(self._collection, self.id)
+
+    def _delete(self):
+        with _STORE_LOCK:
+            _STORE.get(self._collection, {}).pop(self.id, None)
+        _notify(self._collection, self.id, removed=True)
+
+
+# --- async client -----------------------------------------------------------
+
+async def _firestore_latency():
+    if LATENCY["firestore"]:
+        await asyncio.sleep(LATENCY["firestore"])
+
+
+class FakeAggregationResult:
+    def __init__(self, alias: str, value: int):
+        self.alias = alias
+        self.value = value
+
+
+class FakeAsyncAggregationQuery:
+    def __init__(self, query: _BaseQuery, alias: str):
+        self._query = query
+        self._alias = alias
+
+    async def get(self) -> List[List[FakeAggregationResult]]:
+        await _firestore_latency()
+        with _STORE_LOCK:
+            count = sum(1 for data in _STORE.get(self._query._collection, {}).values() if self._query._matches(data))
+        # Billed as one read per (up to) 1000 matching index entries
+        _count_reads(max(1, -(-count // 1000)))
+        return [[FakeAggregationResult(self._alias, count)]]
+
+
+class FakeAsyncQuery(_BaseQuery):
+    async def stream(self):
+        await _firestore_latency()
+        for snapshot in self._run():
+            yield snapshot
+
+    async def get(self) -> List[FakeDocumentSnapshot]:
+        await _firestore_latency()
+        return self._run()
+
+    def count(self, alias: Optional[str] = None) -> FakeAsyncAggregationQuery:
+        return FakeAsyncAggregationQuery(self, alias or "count")
+
+
+class FakeAsyncDocument(_BaseDocument):
+    async def set(self, data: Dict, merge: bool = False):
+        await _firestore_latency()
+        self._set(data, merge)
+
+    async def get(self) -> FakeDocumentSnapshot:
+        await _firestore_latency()
+        return self._get()
+
+    async def update(self, data: Dict):
+        await _firestore_latency()
+        self._update(data)
+
+    async def delete(self):
+        await _firestore_latency()
+        self._delete()
+
+
+class FakeAsyncCollection(FakeAsyncQuery):
+    def __init__(self, collection: str, **state):
+        super().__init__(collection, **state)
+
+    def document(self, doc_id: Optional[str] = None) -> FakeAsyncDocument:
+        return FakeAsyncDocument(self._collection, doc_id)
+
+
+class FakeAsyncWriteBatch:
+    def __init__(self):
+        self._ops: List[Callable[[], None]] = []
+
+    def set(self, reference, data: Dict, merge: bool = False):
+        self._ops.append(lambda: reference._set(data, merge))
+
+    def update(self, reference, data: Dict):
+        self._ops.append(lambda: reference._update(data))
+
+    def delete(self, reference):
+        self._ops.append(reference._delete)
+
+    async def commit(self):
+        await _firestore_latency()
+        for op in self._ops:
+            op()
+        self._ops = []
+
+
+class FakeAsyncClient:
+    def __init__(self, project: Optional[str] = None, **kwargs):
+        self.project = project
+
+    def collection(self, name: str) -> FakeAsyncCollection:
+        return FakeAsyncCollection(name)
+
+    def batch(self) -> FakeAsyncWriteBatch:
+        return FakeAsyncWriteBatch()
+
+
+# --- sync client (snapshot listeners) ---------------------------------------
+
+_LISTENERS: List["_Listener"] = []
+
+
+class _ChangeType:
+    def __init__(self, name: str):
+        self.name = name
+
+
+class _Change:
+    def __init__(self, kind: str, snapshot: FakeDocumentSnapshot):
+        self.type = _ChangeType(kind)
+        self.document = snapshot
+
+
+class _Listener:
+    """A watched query and the ids currently in its result set"""
+
+    def __init__(self, query: _BaseQuery, callback: Callable):
+        self.query = query
+        self.callback = callback
+        self.ids = set()
+
+
+class FakeWatch:
+    def __init__(self, listener: _Listener):
+        self._listener = listener
+
+    def unsubscribe(self):
+        if self._listener in _LISTENERS:
+            _LISTENERS.remove(self._listener)
+
+
+def _notify(collection: str, doc_id: str, removed: bool = False):
+    listeners = [listener for listener in _LISTENERS if listener.query._collection == collection]
+    if not listeners:
+        return
+    with _STORE_LOCK:
+        data = _STORE.get(collection, {}).get(doc_id)
+    for listener in listeners:
+        # Like Firestore, a query listener only hears about documents entering, changing in or leaving its results
+        if not removed and data is not None and listener.query._matches(data):
+            kind = "MODIFIED" if doc_id in listener.ids else "ADDED"
+            listener.ids.add(doc_id)
+        elif doc_id in listener.ids:
+            kind = "REMOVED"
+            listener.ids.discard(doc_id)
+        else:
+            continue
+        _count_reads(1)
+        listener.callback([], [_Change(kind, FakeDocumentSnapshot(doc_id, data))], time.time())
+
+
+class FakeQuery(_BaseQuery):
+    def stream(self):
+        return iter(self._run())
+
+    def get(self) -> List[FakeDocumentSnapshot]:
+        return self._run()
+
+    def on_snapshot(self, callback: Callable) -> FakeWatch:
+        """Deliver the current results as ADDED changes, then every change to them"""
+        listener = _Listener(self, callback)
+        snapshots = self._run()
+        listener.ids = {snapshot.id for snapshot in snapshots}
+        _LISTENERS.append(listener)
+        callback(snapshots, [_Change("ADDED", snapshot) for snapshot in snapshots], time.time())
+        return FakeWatch(listener)
+
+
+class FakeDocument(_BaseDocument):
+    def set(self, data: Dict, merge: bool = False):
+        self._set(data, merge)
+
+    def get(self) -> FakeDocumentSnapshot:
+        return self._get()
+
+    def update(self, data: Dict):
+        self._update(data)
+
+    def delete(self):
+        self._delete()
+
+
+class FakeCollection(FakeQuery):
+    def document(self, doc_id: Optional[str] = None) -> FakeDocument:
+        return FakeDocument(self._collection, doc_id)
+
+
+class FakeClient:
+    def __init__(self, project: Optional[str] = None, **kwargs):
+        self.project = project
+
+    def collection(self, name: str) -> FakeCollection:
+        return FakeCollection(name)
+
+
+# --- translate, storage, logging --------------------------------------------
+
+class FakeTranslateClient:
+    """Marks text as translated; blocks for LATENCY["translate"] per call"""
+
+    def __init__(self, *args, **kwargs):
+        self.calls = 0
+
+    def translate(self, values, target_language: str = None, source_language: str = None, **kwargs):
+        self.calls += 1
+        if LATENCY["translate"]:
+            time.sleep(LATENCY["translate"])
+        if isinstance(values, list):
+            return [{"translatedText": f"[{target_language}] {value}"} for value in values]
+        return {"translatedText": f"[{target_language}] {values}"}
+
+
+class _FakeBlob:
+    def __init__(self, objects: Dict[str, str], name: str):
+        self._objects = objects
+        self.name = name
+
+    def exists(self) -> bool:
+        return self.name in self._objects
+
+    def download_as_text(self) -> str:
+        return self._objects[self.name]
+
+    def upload_from_string(self, data, content_type: str = None):
+        if LATENCY["storage"]:
+            time.sleep(LATENCY["storage"])
+        self._objects[self.name] = data if isinstance(data, str) else data.decode("utf-8")
+
+    def upload_from_filename(self, filename: str, content_type: str = None):
+        with open(filename, "r", encoding="utf-8") as f:
+            self.upload_from_string(f.read(), content_type)
+
+    def download_to_filename(self, filename: str):
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write(self._objects[self.name])
+
+
+class _FakeBucket:
+    def __init__(self):
+        self._objects: Dict[str, str] = {}
+
+    def blob(self, name: str) -> _FakeBlob:
+        return _FakeBlob(self._objects, name)
+
+
+class FakeStorageClient:
+    def __init__(self, *args, **kwargs):
+        self._buckets: Dict[str, _FakeBucket] = {}
+
+    def bucket(self, name: str) -> _FakeBucket:
+        return self._buckets.setdefault(name, _FakeBucket())
+
+    get_bucket = bucket
+    create_bucket = bucket
+
+
+class FakeLoggingClient:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def setup_logging(self, *args, **kwargs):
+        pass
+
+    def get_default_handler(self, **kwargs):
+        return logging.StreamHandler()
+
+
+def install():
+    """Replace the Google Cloud client classes with the in-memory fakes"""
+    from google.cloud import firestore, storage, translate_v2
+    import google.cloud.logging as cloud_logging
+
+    firestore.AsyncClient = FakeAsyncClient
+    firestore.Client = FakeClient
+    storage.Client = FakeStorageClient
+    translate_v2.Client = FakeTranslateClient
+    cloud_logging.Client = FakeLoggingClient
+
+
+def load_seed_articles(path: str = "knowledge_base.json") -> List[Dict]:
+    """Seed articles from knowledge_base.json: its articles plus solutions as articles, hashed as stored"""
+    from search_index import content_hash
+
+    with open(path, "r") as f:
+        data = json.load(f)
+
+    def timestamp(value: Optional[str]) -> datetime:
+        return datetime.fromisoformat(value) if value else datetime.now()
+
+    articles = []
+    for article in data.get("articles", []):
+        articles.append(dict(article, id=f"article-{article['id']}",
+                             created_at=timestamp(article.get("created_at")),
+                             updated_at=timestamp(article.get("updated_at"))))
+    for solution in data.get("solutions", []):
+        articles.append({
+            "id": f"solution-{solution['id']}",
+            "title": solution["problem"],
+            "content": solution["solution"],
+            "category": solution.get("category", "General"),
+            "tags": solution.get("tags", []),
+            "created_at": timestamp(solution.get("created_at")),
+            "updated_at": timestamp(solution.get("updated_at", solution.get("created_at")))
+        })
+    for article in articles:
+        article["content_hash"] = content_hash(article)
+    return articles
@@ -0,0 +1,306 @@
+"""Open-loop load test of ``agent:app`` against local stand-ins.
+
+Boots the app with uvicorn in a background thread, with the Google Cloud
+clients replaced by the in-memory fakes and DeepSeek replaced by
+``benchmarks.fake_deepseek``, then fires requests at a fixed arrival rate
+regardless of how fast earlier ones complete (so queueing shows up in the
+latency numbers instead of throttling the generator). Latency is measured
+from each request's scheduled send time. Results are printed as JSON; the
+``--max-*`` options turn the run into a regression gate that exits 1 when
+a threshold is exceeded::
+
+    python -m benchmarks.load_test --rps 50 --duration 30 --stream --max-p99-ms 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks import fakes
+from benchmarks.fake_deepseek import FakeDeepSeek, FakeDeepSeekConfig, add_arguments, config_from_args
+
+QUESTIONS = [
+    "How do I reset my password?",
+    "My VPN connection keeps dropping",
+    "My computer is very slow",
+    "I can't access my email",
+    "The printer is not printing",
+    "How do I connect to the office wifi?",
+    "Outlook keeps asking for my password",
+    "My laptop overheats and shuts down",
+]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of ``values`` (0 when empty)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(q / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarize(values: List[float]) -> Dict:
+    return {
+        "p50": round(percentile(values, 50) * 1000, 2),
+        "p95": round(percentile(values, 95) * 1000, 2),
+        "p99": round(percentile(values, 99) * 1000, 2),
+        "max": round(max(values) * 1000, 2) if values else 0.0,
+        "mean": round(sum(values) / len(values) * 1000, 2) if values else 0.0
+    }
+
+
+class AppServer:
+    """Run ``agent:app`` under uvicorn on its own thread and event loop"""
+
+    def __init__(self, app, port: int, lag_interval: float = 0.01):
+        import uvicorn
+
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port,
+                                                    log_level="warning", lifespan="on"))
+        self.lag_interval = lag_interval
+        self.loop_lag: List[float] = []
+        self._probe: Optional[asyncio.Task] = None
+        self._thread = threading.Thread(target=self._run, name="agent-app", daemon=True)
+
+    async def _probe_lag(self):
+        # The delay beyond the requested sleep is time the loop spent busy elsewhere
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.lag_interval)
+            self.loop_lag.append(max(0.0, time.perf_counter() - start - self.lag_interval))
+
+    async def _serve(self):
+        self._probe = asyncio.ensure_future(self._probe_lag())
+        try:
+            await self.server.serve()
+        finally:
+            self._probe.cancel()
+
+    def _run(self):
+        asyncio.run(self._serve())
+
+    def start(self, timeout: float = 30.0):
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if not self._thread.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError("agent app failed to start")
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self._thread.join(timeout=10)
+
+
+class LoadGenerator:
+    """Open-loop request generator for /chat and /chat/stream"""
+
+    def __init__(self, base_url: str, rps: float, duration: float, stream: bool = False,
+                 repeat_ratio: float = 0.5, languages: Optional[List[str]] = None,
+                 poisson: bool = False, timeout: float = 60.0, seed: Optional[int] = None,
+                 api_key: Optional[str] = None):
+        self.base_url = base_url
+        self.headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.rps = rps
+        self.duration = duration
+        self.stream = stream
+        self.repeat_ratio = repeat_ratio
+        self.languages = languages or ["en"]
+        self.poisson = poisson
+        self.timeout = timeout
+        self.random = random.Random(seed)
+        self.latencies: List[float] = []
+        self.ttfb: List[float] = []
+        self.statuses: Dict[str, int] = {}
+        self.sent = 0
+        self.late_sends = 0
+
+    def _payload(self, n: int) -> Dict:
+        question = self.random.choice(QUESTIONS)
+        if self.random.random() >= self.repeat_ratio:
+            # A distinct question per request defeats the response cache
+            question = f"{question} (ticket {n})"
+        return {"message": question, "language": self.random.choice(self.languages)}
+
+    def _record(self, status: str):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    async def _request(self, client: httpx.AsyncClient, scheduled: float, payload: Dict):
+        try:
+            if self.stream:
+                async with client.stream("POST", "/chat/stream", json=payload) as response:
+                    status = str(response.status_code)
+                    first_delta = True
+                    async for line in response.aiter_lines():
+                        if line == "event: delta" and first_delta:
+                            self.ttfb.append(time.perf_counter() - scheduled)
+                            first_delta = False
+                        elif line == "event: error":
+                            status = "stream_error"
+            else:
+                response = await client.post("/chat", json=payload)
+                status = str(response.status_code)
+        except httpx.TimeoutException:
+            status = "timeout"
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        self._record(status)
+        if status == "200":
+            self.latencies.append(time.perf_counter() - scheduled)
+
+    async def run(self) -> Dict:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        async with httpx.AsyncClient(base_url=self.base_url, headers=self.headers,
+                                     timeout=self.timeout, limits=limits) as client:
+            tasks = []
+            start = time.perf_counter()
+            next_send = start
+            while next_send - start < self.duration:
+                delay = next_send - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                elif delay < -0.01:
+                    self.late_sends += 1
+                tasks.append(asyncio.ensure_future(self._request(client, next_send, self._payload(self.sent))))
+                self.sent += 1
+                interval = 1.0 / self.rps
+                next_send += self.random.expovariate(self.rps) if self.poisson else interval
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - start
+
+        ok = len(self.latencies)
+        report = {
+            "requests": self.sent,
+            "succeeded": ok,
+            "error_rate": round((self.sent - ok) / self.sent, 4) if self.sent else 0.0,
+            "statuses": self.statuses,
+            "throughput_rps": round(ok / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": summarize(self.latencies),
+            "late_sends": self.late_sends
+        }
+        if self.stream:
+            report["ttfb_ms"] = summarize(self.ttfb)
+        return report
+
+
+def check_thresholds(report: Dict, args: argparse.Namespace) -> List[str]:
+    """Return a description of every exceeded gate"""
+    violations = []
+    if args.max_p99_ms is not None and report["latency_ms"]["p99"] > args.max_p99_ms:
+        violations.append(f"p99 latency {report['latency_ms']['p99']}ms > {args.max_p99_ms}ms")
+    if args.max_error_rate is not None and report["error_rate"] > args.max_error_rate:
+        violations.append(f"error rate {report['error_rate']} > {args.max_error_rate}")
+    if args.max_loop_lag_ms is not None and report["loop_lag_ms"]["p99"] > args.max_loop_lag_ms:
+        violations.append(f"p99 loop lag {report['loop_lag_ms']['p99']}ms > {args.max_loop_lag_ms}ms")
+    if args.min_throughput is not None and report["throughput_rps"] < args.min_throughput:
+        violations.append(f"throughput {report['throughput_rps']}rps < {args.min_throughput}rps")
+    return violations
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Open-loop load test of the helpdesk agent")
+    parser.add_argument("--rps", type=float, default=20.0, help="Target request rate")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of load")
+    parser.add_argument("--stream", action="store_true", help="Use /chat/stream and report TTFB")
+    parser.add_argument("--poisson", action="store_true", help="Exponential inter-arrival times")
+    parser.add_argument("--repeat-ratio", type=float, default=0.5,
+                        help="Fraction of requests reusing a common question")
+    parser.add_argument("--languages", default="en", help="Comma separated request languages")
+    parser.add_argument("--seed-kb", default="knowledge_base.json",
+                        help="Seed the fake Firestore from this file ('' for the built-in sample articles)")
+    parser.add_argument("--firestore-latency", type=float, default=0.005, help="Fake Firestore call latency (s)")
+    parser.add_argument("--translate-latency", type=float, default=0.05, help="Fake Translate call latency (s)")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the app under test")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Client request timeout (s)")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    parser.add_argument("--max-p99-ms", type=float, help="Fail if p99 latency exceeds this")
+    parser.add_argument("--max-error-rate", type=float, help="Fail if the error rate exceeds this")
+    parser.add_argument("--max-loop-lag-ms", type=float, help="Fail if p99 event loop lag exceeds this")
+    parser.add_argument("--min-throughput", type=float, help="Fail if throughput falls below this")
+    parser.add_argument("--fallback-llm", action="store_true",
+                        help="Serve a healthy fake DeepSeek as the gateway's fallback endpoint")
+    add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+
+    fake_llm = FakeDeepSeek(config_from_args(args))
+    llm_port = fake_llm.start_in_thread()
+    fallback_llm = None
+    if args.fallback_llm:
+        fallback_llm = FakeDeepSeek(FakeDeepSeekConfig(latency=args.llm_latency, token_rate=args.token_rate,
+                                                       completion_tokens=args.completion_tokens))
+        os.environ["LLM_FALLBACK_BASE_URL"] = f"http://127.0.0.1:{fallback_llm.start_in_thread()}"
+
+    # The app reads its configuration at import time
+    os.environ["DEEPSEEK_BASE_URL"] = f"http://127.0.0.1:{llm_port}"
+    os.environ.setdefault("DEEPSEEK_API_KEY", "benchmark")
+    os.environ.setdefault("API_KEY", "benchmark")
+    os.environ.setdefault("GCP_PROJECT_ID", "benchmark")
+    os.environ["TRANSLATION_CACHE_BACKEND"] = "memory"
+    os.environ.setdefault("INDEX_SYNC_MODE", "off")
+
+    fakes.install()
+    fakes.reset_store()
+    fakes.LATENCY["firestore"] = args.firestore_latency
+    fakes.LATENCY["translate"] = args.translate_latency
+    if args.seed_kb:
+        fakes.seed_articles(fakes.load_seed_articles(args.seed_kb))
+
+    import agent
+
+    server = AppServer(agent.app, args.port)
+    server.start()
+    try:
+        generator = LoadGenerator(f"http://127.0.0.1:{args.port}", args.rps, args.duration,
+                                  stream=args.stream, repeat_ratio=args.repeat_ratio,
+                                  languages=[lang.strip() for lang in args.languages.split(",") if lang.strip()],
+                                  poisson=args.poisson, timeout=args.timeout, seed=args.seed,
+                                  api_key=os.environ["API_KEY"])
+        report = asyncio.run(generator.run())
+        with httpx.Client(base_url=f"http://127.0.0.1:{args.port}") as client:
+            report["server_stats"] = client.get("/stats", headers={"Authorization": os.environ["API_KEY"]}).json()
+    finally:
+        server.stop()
+        fake_llm.stop_thread()
+        if fallback_llm is not None:
+            fallback_llm.stop_thread()
+
+    report["loop_lag_ms"] = summarize(server.loop_lag)
+    report["upstream"] = fake_llm.stats()
+    if fallback_llm is not None:
+        report["fallback_upstream"] = fallback_llm.stats()
+    report["config"] = {
+        "rps": args.rps,
+        "duration": args.duration,
+        "stream": args.stream,
+        "repeat_ratio": args.repeat_ratio,
+        "languages": args.languages,
+        "llm_latency": args.llm_latency,
+        "token_rate": args.token_rate,
+        "llm_error_rate": args.llm_error_rate
+    }
+    violations = check_thresholds(report, args)
+    report["violations"] = violations
+
+    output = json.dumps(report, indent=2, default=str)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+"""Knowledge base search micro-benchmark over synthetic corpora.
+
+Generates IT support articles derived from the ``articles`` and
+``solutions`` in knowledge_base.json and, for each corpus size, measures:
+
+* ``KnowledgeBase.search_articles`` (the JSON-file substring scan)
+* ``GCPKnowledgeBase.search_articles`` over the in-memory BM25 index
+  (fused with article vectors with ``--search-mode hybrid``), including
+  the time to build it from a local Firestore stand-in
+* the ``GCPKnowledgeBase`` Firestore fallback used before the index is
+  loaded (skipped above ``--fallback-max-size``)
+
+Each size runs in a fresh interpreter by default so resident memory is not
+inflated by earlier sizes. Results are printed as JSON::
+
+    python -m benchmarks.search_bench --sizes 1000,10000,100000,1000000 --queries 100
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import re
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from benchmarks import fakes
+from benchmarks.load_test import QUESTIONS, summarize
+
+PRODUCTS = ["Windows 11", "macOS", "Ubuntu", "Outlook", "Teams", "Zoom", "Chrome", "Office 365",
+            "Cisco AnyConnect", "GlobalProtect", "Jira", "Slack", "SAP", "Salesforce", "Okta",
+            "Active Directory", "SharePoint", "OneDrive", "Docker", "Kubernetes", "PostgreSQL"]
+SYMPTOMS = ["crashes on startup", "is very slow", "cannot connect", "shows an error", "will not install",
+            "keeps asking for a password", "loses its settings", "freezes", "cannot sync", "times out"]
+
+
+def rss_bytes() -> int:
+    """Current resident set size (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class CorpusGenerator:
+    """Synthetic articles built from seed article sentences and IT vocabulary"""
+
+    def __init__(self, seed_path: str = "knowledge_base.json", content_chars: int = 600,
+                 seed: int = 0):
+        self.seeds = fakes.load_seed_articles(seed_path)
+        self.content_chars = content_chars
+        self.random = random.Random(seed)
+        self.sentences = [sentence.strip() for article in self.seeds
+                          for sentence in re.split(r"(?<=[.!?])\s+|\n+", article["content"])
+                          if len(sentence.strip()) > 20]
+        self.vocabulary = sorted({word for article in self.seeds
+                                  for word in re.findall(r"[a-z]{4,}", article["content"].lower())})
+
+    def article(self, n: int) -> Dict:
+        rng = self.random
+        seed = self.seeds[n % len(self.seeds)]
+        product = rng.choice(PRODUCTS)
+        symptom = rng.choice(SYMPTOMS)
+        sentences = [f"{product} {symptom} with error code E{n:07d}."]
+        length = len(sentences[0])
+        while length < self.content_chars:
+            sentence = rng.choice(self.sentences)
+            sentences.append(sentence)
+            length += len(sentence) + 1
+        sentences.append(" ".join(rng.sample(self.vocabulary, 8)))
+        created = datetime(2024, 1, 1) + timedelta(minutes=n)
+        return {
+            "id": f"synthetic-{n}",
+            "title": f"{seed['title']} - {product} {symptom}",
+            "content": " ".join(sentences),
+            "category": seed.get("category", "General"),
+            "tags": list(seed.get("tags", []))[:3] + [product.lower().replace(" ", "-")],
+            "created_at": created,
+            "updated_at": created
+        }
+
+    def corpus(self, size: int) -> List[Dict]:
+        return [self.article(n) for n in range(size)]
+
+    def queries(self, count: int) -> List[str]:
+        rng = random.Random(1)
+        queries = []
+        for n in range(count):
+            kind = n % 3
+            if kind == 0:
+                queries.append(rng.choice(QUESTIONS))
+            elif kind == 1:
+                queries.append(f"{rng.choice(PRODUCTS)} {rng.choice(SYMPTOMS)}")
+            else:
+                queries.append(rng.choice(self.vocabulary))
+        return queries
+
+
+def time_queries(search, queries: List[str]) -> Dict:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies)
+
+
+def bench_legacy(corpus: List[Dict], queries: List[str]) -> Dict:
+    """``KnowledgeBase.search_articles``: case-insensitive substring scan"""
+    from knowledge_base import KnowledgeBase
+
+    # Point at a path that does not exist so nothing is read or written
+    kb = KnowledgeBase(file_path=os.path.join(os.devnull, "knowledge_base.json"))
+    rss_before = rss_bytes()
+    start = time.perf_counter()
+    kb.kb["articles"] = [dict(article, created_at=article["created_at"].isoformat(),
+                              updated_at=article["updated_at"].isoformat()) for article in corpus]
+    build = time.perf_counter() - start
+    result = {
+        "build_seconds": round(build, 4),
+        "rss_delta_mb": round((rss_bytes() - rss_before) / 2 ** 20, 1),
+        "latency_ms": time_queries(kb.search_articles, queries)
+    }
+    del kb
+    gc.collect()
+    return result
+
+
+async def bench_gcp(corpus: List[Dict], queries: List[str], language: str,
+                    fallback: bool) -> Dict:
+    """``GCPKnowledgeBase.search_articles`` over the BM25 index and the Firestore fallback"""
+    from gcp_knowledge_base import GCPKnowledgeBase
+
+    fakes.reset_store()
+    fakes.seed_articles(corpus)
+    kb = GCPKnowledgeBase("benchmark")
+    result = {}
+
+    async def timed(queries_to_run: List[str]) -> Dict:
+        latencies = []
+        for query in queries_to_run:
+            start = time.perf_counter()
+            await kb.search_articles(query, language, limit=5)
+            latencies.append(time.perf_counter() - start)
+        return summarize(latencies)
+
+    if fallback:
+        result["firestore_fallback_latency_ms"] = await timed(queries)
+
+    gc.collect()
+    rss_before = rss_bytes()
+    start = time.perf_counter()
+    await kb.load_index()
+    result["index_build_seconds"] = round(time.perf_counter() - start, 4)
+    if kb.vectors is not None:
+        # Article vectors are built in the background; measure the hybrid search once they are ready
+        kb.vectors.wait()
+        result["vector_build_seconds"] = round(time.perf_counter() - start, 4)
+    result["index_rss_delta_mb"] = round((rss_bytes() - rss_before) / 2 ** 20, 1)
+    result["index_latency_ms"] = await timed(queries)
+    if kb.vectors is not None:
+        result["vector_index"] = kb.vectors.stats()
+    if language != "en":
+        result["translation_cache"] = kb.translation_cache.stats()
+    kb.io.shutdown()
+    fakes.reset_store()
+    return result
+
+
+def run_size(size: int, args: argparse.Namespace) -> Dict:
+    generator = CorpusGenerator(args.seed_kb, content_chars=args.content_chars, seed=args.seed)
+    queries = generator.queries(args.queries)
+
+    gc.collect()
+    rss_start = rss_bytes()
+    start = time.perf_counter()
+    corpus = generator.corpus(size)
+    result = {
+        "size": size,
+        "queries": len(queries),
+        "generate_seconds": round(time.perf_counter() - start, 2),
+        "corpus_rss_mb": round((rss_bytes() - rss_start) / 2 ** 20, 1)
+    }
+    if size <= args.legacy_max_size:
+        result["knowledge_base"] = bench_legacy(corpus, queries)
+    result["gcp_knowledge_base"] = asyncio.run(
+        bench_gcp(corpus, queries, args.language, fallback=size <= args.fallback_max_size))
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return result
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Knowledge base search benchmark")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma separated corpus sizes")
+    parser.add_argument("--queries", type=int, default=100, help="Queries timed per size and path")
+    parser.add_argument("--language", default="en", help="Query language (non-English exercises translation)")
+    parser.add_argument("--content-chars", type=int, default=600, help="Approximate article body length")
+    parser.add_argument("--seed-kb", default="knowledge_base.json", help="Seed articles for the generator")
+    parser.add_argument("--legacy-max-size", type=int, default=1000000,
+                        help="Largest corpus to run the KnowledgeBase scan on")
+    parser.add_argument("--fallback-max-size", type=int, default=100000,
+                        help="Largest corpus to run the Firestore fallback on")
+    parser.add_argument("--search-mode", choices=["keyword", "hybrid"], default="hybrid",
+                        help="keyword (BM25 only) or hybrid (BM25 fused with article vectors)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--in-process", action="store_true",
+                        help="Run every size in this interpreter instead of a fresh one")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+
+    os.environ["TRANSLATION_CACHE_BACKEND"] = "memory"
+    os.environ["SEARCH_MODE"] = args.search_mode
+    fakes.install()
+
+    results = []
+    for size in sizes:
+        if args.in_process or len(sizes) == 1:
+            results.append(run_size(size, args))
+            continue
+        command = [sys.executable, "-m", "benchmarks.search_bench", "--in-process",
+                   "--sizes", str(size), "--queries", str(args.queries), "--language", args.language,
+                   "--content-chars", str(args.content_chars), "--seed-kb", args.seed_kb,
+                   "--legacy-max-size", str(args.legacy_max_size),
+                   "--fallback-max-size", str(args.fallback_max_size), "--seed", str(args.seed),
+                   "--search-mode", args.search_mode]
+        completed = subprocess.run(command, stdout=subprocess.PIPE, check=True)
+        results.extend(json.loads(completed.stdout))
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
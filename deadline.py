@@ -0,0 +1,126 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from typing import Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+# Seconds the client is willing to wait, e.g. "X-Request-Timeout: 8.5"
+DEADLINE_HEADER = "x-request-timeout"
+
+# Absolute time.monotonic() by which the current request must be answered
+_deadline: contextvars.ContextVar = contextvars.ContextVar("deadline", default=None)
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed (or is too close) before a stage could finish"""
+
+    status_code = 504
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.detail = f"Request deadline exceeded during {stage}"
+        super().__init__(self.detail)
+
+
+def set_deadline(timeout: Optional[float]) -> contextvars.Token:
+    """Bind a deadline ``timeout`` seconds from now (or none) to the current context"""
+    return _deadline.set(time.monotonic() + timeout if timeout is not None else None)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None when there is none"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def cap(timeout: float, keep: float = 0.0) -> float:
+    """``timeout`` shortened so that ``keep`` seconds of the deadline are left over (never negative)"""
+    left = remaining()
+    if left is None:
+        return timeout
+    return max(0.0, min(timeout, left - keep))
+
+
+def reserve() -> float:
+    """Seconds of the deadline kept for required stages when deciding on optional work"""
+    return _env_float("DEADLINE_RESERVE", 5.0)
+
+
+def allow_optional() -> bool:
+    """Whether there is time for optional work (result translation, extra context)"""
+    left = remaining()
+    return left is None or left > reserve()
+
+
+async def within(awaitable: Awaitable[T], stage: str, keep: float = 0.0) -> T:
+    """Await ``awaitable`` within the deadline minus ``keep``, raising ``DeadlineExceeded`` otherwise"""
+    left = remaining()
+    if left is None:
+        return await awaitable
+    timeout = left - keep
+    if timeout <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded(stage)
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(stage)
+
+
+def request_timeout(headers: dict) -> float:
+    """The client's requested timeout, clamped to REQUEST_TIMEOUT_MAX (which is also the default)"""
+    maximum = _env_float("REQUEST_TIMEOUT_MAX", 60.0)
+    value = headers.get(DEADLINE_HEADER)
+    if not value:
+        return maximum
+    try:
+        requested = float(value)
+    except ValueError:
+        logger.warning(f"Ignoring invalid {DEADLINE_HEADER} header: {value[:32]}")
+        return maximum
+    return max(0.0, min(maximum, requested))
+
+
+def bulk_request_timeout() -> float:
+    """Deadline of a whole bulk request (batch chat, import, export), BULK_REQUEST_TIMEOUT_MAX"""
+    return _env_float("BULK_REQUEST_TIMEOUT_MAX", 3600.0)
+
+
+class DeadlineMiddleware:
+    """ASGI middleware binding each request's deadline to the context its stages run in.
+
+    Requests under one of ``bulk_paths`` get ``bulk_request_timeout()``
+    instead; their handlers bind per-item deadlines themselves.
+    """
+
+    def __init__(self, app, bulk_paths=()):
+        self.app = app
+        self.bulk_paths = tuple(bulk_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if scope.get("path", "").startswith(self.bulk_paths):
+            timeout = bulk_request_timeout()
+        else:
+            headers = {key.decode("latin-1").lower(): value.decode("latin-1")
+                       for key, value in scope.get("headers", [])}
+            timeout = request_timeout(headers)
+        token = set_deadline(timeout)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _deadline.reset(token)
@@ -0,0 +1,75 @@
+import asyncio
+import contextlib
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class GCPIO:
+    """Concurrency limits for Google Cloud SDK calls.
+
+    Sync-only clients (Translate, Storage, the Firestore listener) run on a
+    dedicated, bounded thread pool instead of the event loop or the default
+    executor; ``max_in_flight`` caps how many such calls may be queued or
+    running at once. ``firestore_call()`` bounds concurrent Firestore
+    AsyncClient operations the same way.
+
+    Semaphores are created lazily so they bind to the running event loop.
+    """
+
+    def __init__(self, threads: Optional[int] = None, max_in_flight: Optional[int] = None,
+                 firestore_max_in_flight: Optional[int] = None):
+        self.threads = threads or int(os.getenv("GCP_IO_THREADS", "16"))
+        self.max_in_flight = max_in_flight or int(os.getenv("GCP_IO_MAX_IN_FLIGHT", "64"))
+        self.firestore_max_in_flight = (firestore_max_in_flight
+                                        or int(os.getenv("FIRESTORE_MAX_IN_FLIGHT", "64")))
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._blocking_slots: Optional[asyncio.Semaphore] = None
+        self._firestore_slots: Optional[asyncio.Semaphore] = None
+        self.blocking_in_flight = 0
+        self.firestore_in_flight = 0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="gcp-io")
+        return self._executor
+
+    @contextlib.asynccontextmanager
+    async def firestore_call(self) -> AsyncIterator[None]:
+        """Hold a Firestore concurrency slot for the duration of the block"""
+        if self._firestore_slots is None:
+            self._firestore_slots = asyncio.Semaphore(self.firestore_max_in_flight)
+        async with self._firestore_slots:
+            self.firestore_in_flight += 1
+            try:
+                yield
+            finally:
+                self.firestore_in_flight -= 1
+
+    async def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Run a blocking SDK call on the I/O pool"""
+        if self._blocking_slots is None:
+            self._blocking_slots = asyncio.Semaphore(self.max_in_flight)
+        loop = asyncio.get_event_loop()
+        async with self._blocking_slots:
+            self.blocking_in_flight += 1
+            try:
+                return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+            finally:
+                self.blocking_in_flight -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self) -> Dict:
+        return {
+            "threads": self.threads,
+            "blocking_in_flight": self.blocking_in_flight,
+            "firestore_in_flight": self.firestore_in_flight
+        }
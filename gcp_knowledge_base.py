@@ -1,22 +1,96 @@
-from typing import List, Dict, Optional
+import asyncio
+import os
+import threading
+import time
+from typing import Callable, List, Dict, Optional, Tuple
 from datetime import datetime
 from google.cloud import firestore, storage, translate_v2 as translate
 import json
 import logging
-from google.cloud import logging as cloud_logging
+import deadline
+from deadline import DeadlineExceeded
+from gcp_io import GCPIO
+from logging_setup import setup_logging
+from metrics import stage, timed_kb_operation
+from search_index import SearchIndex, content_hash
+from translation_batcher import TranslationBatcher
+from translation_cache import TranslationCache
+from vector_index import VectorIndex, reciprocal_rank_fusion
 
 class GCPKnowledgeBase:
     def __init__(self, project_id: str):
         self.project_id = project_id
-        self.db = firestore.Client(project=project_id)
-        self.storage_client = storage.Client(project=project_id)
-        self.translate_client = translate.Client()
+        # Firestore is used through its native asyncio client; the sync-only
+        # Storage and Translate clients run on the bounded GCP I/O pool.
+        # All clients are created on first use, keeping them off the cold start path.
+        self.io = GCPIO()
+        self._clients: Dict[str, object] = {}
+        self._clients_lock = threading.Lock()
+        self.translation_cache = TranslationCache(storage_client=lambda: self.storage_client, io=self.io)
+        self.translation_batcher = TranslationBatcher(lambda: self.translate_client, io=self.io)
         
-        # Setup Cloud Logging
-        logging_client = cloud_logging.Client()
-        logging_client.setup_logging()
+        # Shared Cloud Logging setup (a no-op when agent.py already ran it)
+        setup_logging()
         self.logger = logging.getLogger(__name__)
 
+        # In-process BM25 index, filled by load_index()
+        self.index = SearchIndex()
+        self.index_loaded = False
+
+        # "hybrid" fuses BM25 with locally computed article vectors that follow the index
+        self.search_mode = os.getenv("SEARCH_MODE", "hybrid")
+        self.vectors: Optional[VectorIndex] = None
+        self.vector_candidates = int(os.getenv("VECTOR_CANDIDATES", "20"))
+        if self.search_mode == "hybrid":
+            self.vectors = VectorIndex(terms=self.index.terms, articles=self.index.all_articles)
+            self.index.add_listener(self.vectors.on_index_change)
+
+        # Bumped when this instance changes the category list (HTTP cache key)
+        self.categories_version = 0
+
+        # Callbacks notified with an article id whenever it changes
+        self._change_listeners: List[Callable[[str], None]] = []
+
+    def _client(self, name: str, factory: Callable[[], object]):
+        """Create a client on first use; also called from I/O pool threads"""
+        client = self._clients.get(name)
+        if client is None:
+            with self._clients_lock:
+                client = self._clients.get(name)
+                if client is None:
+                    start = time.perf_counter()
+                    client = self._clients[name] = factory()
+                    self.logger.info(f"Created {name} client in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return client
+
+    @property
+    def db(self) -> firestore.AsyncClient:
+        return self._client("firestore", lambda: firestore.AsyncClient(project=self.project_id))
+
+    @property
+    def sync_db(self) -> firestore.Client:
+        """Synchronous Firestore client, only needed for snapshot listeners"""
+        return self._client("firestore_sync", lambda: firestore.Client(project=self.project_id))
+
+    @property
+    def storage_client(self) -> storage.Client:
+        return self._client("storage", lambda: storage.Client(project=self.project_id))
+
+    @property
+    def translate_client(self) -> translate.Client:
+        return self._client("translate", translate.Client)
+
+    def add_change_listener(self, listener: Callable[[str], None]):
+        """Register a callback invoked with the id of every updated or deleted article"""
+        self._change_listeners.append(listener)
+
+    def notify_change(self, article_id: str):
+        for listener in self._change_listeners:
+            try:
+                listener(article_id)
+            except Exception as e:
+                self.logger.error(f"Error in article change listener: {str(e)}")
+
     def _create_bucket_if_not_exists(self, bucket_name: str):
         """Create a new bucket if it doesn't exist"""
         try:
@@ -25,10 +99,44 @@ class GCPKnowledgeBase:
             bucket = self.storage_client.create_bucket(bucket_name)
         return bucket
 
-    async def add_article(self, title: str, content: str, category: str, tags: List[str]) -> Dict:
-        """Add a new article to Firestore"""
+    async def _translate_many(self, texts: List[str], target_language: str, source_language: str) -> List[str]:
+        """Translate strings through the translation cache, batching the misses"""
+        results = await asyncio.gather(*[
+            self._cached_translation(text, target_language, source_language) for text in texts
+        ])
+        missing = list({text for text, result in zip(texts, results) if result is None})
+        if missing:
+            translated = dict(zip(missing, await self.translation_batcher.translate_many(
+                missing, target_language, source_language)))
+            for text, result in translated.items():
+                await self.translation_cache.put(text, source_language, target_language, result)
+            results = [translated[text] if result is None else result for text, result in zip(texts, results)]
+        return list(results)
+
+    async def _cached_translation(self, text: str, target_language: str, source_language: str) -> Optional[str]:
+        if not text:
+            return text
+        return await self.translation_cache.get(text, source_language, target_language)
+
+    async def _translate(self, text: str, target_language: str, source_language: str) -> str:
+        """Translate text through the translation cache"""
+        return (await self._translate_many([text], target_language, source_language))[0]
+
+    async def _translate_articles(self, articles: List[Dict], language: str) -> List[Dict]:
+        """Translate the titles and contents of articles from English in place (fields projected away are skipped)"""
+        fields = [(article, key) for article in articles for key in ('title', 'content') if key in article]
+        translated = await self._translate_many([article[key] for article, key in fields],
+                                                target_language=language, source_language='en')
+        for (article, key), text in zip(fields, translated):
+            article[key] = text
+        return articles
+
+    @timed_kb_operation("add_article")
+    async def add_article(self, title: str, content: str, category: str, tags: List[str],
+                          article_id: Optional[str] = None) -> Dict:
+        """Add a new article to Firestore, under ``article_id`` or a generated id"""
         try:
-            doc_ref = self.db.collection('articles').document()
+            doc_ref = self.db.collection('articles').document(article_id)
             article = {
                 "id": doc_ref.id,
                 "title": title,
@@ -38,71 +146,184 @@ class GCPKnowledgeBase:
                 "created_at": datetime.now(),
                 "updated_at": datetime.now()
             }
-            doc_ref.set(article)
+            article["content_hash"] = content_hash(article)
+            async with self.io.firestore_call():
+                await doc_ref.set(article)
+            self.index.add(article)
             self.logger.info(f"Added new article: {title}")
             return article
         except Exception as e:
             self.logger.error(f"Error adding article: {str(e)}")
             raise
 
-    async def search_articles(self, query: str, language: str = 'en') -> List[Dict]:
+    @timed_kb_operation("load_index")
+    async def load_index(self):
+        """Load every article from Firestore into the in-memory search index"""
+        try:
+            async with self.io.firestore_call():
+                articles = [doc.to_dict() async for doc in self.db.collection('articles').stream()]
+            self.index.load(articles)
+            self.index_loaded = True
+            self.logger.info(f"Loaded {len(articles)} articles into the search index")
+        except Exception as e:
+            self.logger.error(f"Error loading search index: {str(e)}")
+            raise
+
+    async def search_articles(self, query: str, language: str = 'en',
+                              limit: Optional[int] = None) -> List[Dict]:
         """Search articles with language support"""
+        results = await self.search_articles_scored(query, language, limit)
+        return [article for article, _ in results]
+
+    @timed_kb_operation("has_articles")
+    async def has_articles(self) -> bool:
+        """Whether any article exists, reading at most one document"""
+        if self.index_loaded:
+            return len(self.index) > 0
+        async with self.io.firestore_call():
+            docs = [doc async for doc in self.db.collection('articles').limit(1).stream()]
+        return bool(docs)
+
+    @timed_kb_operation("search_articles_scored")
+    async def search_articles_scored(self, query: str, language: str = 'en', limit: Optional[int] = None,
+                                     category: Optional[str] = None) -> List[Tuple[Dict, float]]:
+        """Search articles, returning (article, relevance score) pairs best first.
+
+        In hybrid mode the ranking fuses BM25 with vector similarity, while the
+        score stays the BM25 score (0 for articles only the vectors found).
+        """
         try:
             # Translate query if not in English
             if language != 'en':
-                translation = self.translate_client.translate(
-                    query,
-                    target_language='en',
-                    source_language=language
-                )
-                query = translation['translatedText']
-
-            results = []
+                with stage("translate_query"):
+                    query = await deadline.within(
+                        self._translate(query, target_language='en', source_language=language), "translate_query")
+
+            with stage("index_search"):
+                if self.index_loaded and self.vectors is not None:
+                    results = self._hybrid_search(query, limit, category)
+                elif self.index_loaded:
+                    results = self.index.search(query, None if category else limit)
+                else:
+                    results = [(article, 0.0) for article in
+                               await deadline.within(self._search_firestore(query), "firestore_search")]
+                if category:
+                    results = [(article, score) for article, score in results if article.get('category') == category]
+                if limit is not None:
+                    results = results[:limit]
+
+            # Translate content if needed; optional, so English results are returned when time is short
+            if language != 'en' and results:
+                if not deadline.allow_optional():
+                    self.logger.info("Skipping result translation, request deadline is close")
+                else:
+                    with stage("translate_results"):
+                        try:
+                            await deadline.within(
+                                self._translate_articles([article for article, _ in results], language),
+                                "translate_results", keep=deadline.reserve())
+                        except DeadlineExceeded:
+                            self.logger.info("Result translation cut short by the request deadline")
+
+            self.logger.debug(f"Search query: {query}, Results: {len(results)}")
+            return results
+        except Exception as e:
+            self.logger.error(f"Error searching articles: {str(e)}")
+            raise
+
+    def _hybrid_search(self, query: str, limit: Optional[int], category: Optional[str]) -> List[Tuple[Dict, float]]:
+        """BM25 and vector candidates merged with reciprocal rank fusion"""
+        pool = max(limit or 0, self.vector_candidates)
+        keyword = self.index.search(query, None if category or limit is None else pool)
+        if category:
+            keyword = [(article, score) for article, score in keyword if article.get('category') == category]
+        with stage("vector_search"):
+            semantic = self.vectors.search(query, pool, category)
+        if not semantic:
+            return keyword
+
+        by_id = {str(article['id']): (article, score) for article, score in keyword[:pool]}
+        results = []
+        for article_id, _ in reciprocal_rank_fusion([list(by_id), [article_id for article_id, _ in semantic]]):
+            if article_id in by_id:
+                results.append(by_id[article_id])
+            else:
+                article = self.index.get(article_id)
+                if article is not None:
+                    results.append((article, 0.0))
+        # Keyword matches beyond the fused pool keep their BM25 order
+        return results + keyword[pool:]
+
+    @timed_kb_operation("list_articles")
+    async def list_articles(self, language: str = 'en', limit: int = 50, after: Optional[str] = None,
+                            fields: Optional[List[str]] = None,
+                            indexed: bool = False) -> Tuple[List[Dict], Optional[str]]:
+        """One page of articles in document id order, and the id to continue after (None on the last page).
+
+        ``fields`` projects the documents in Firestore (``id`` is always
+        included); only the returned page is translated. With ``indexed``
+        the page is read from the loaded search index instead, in the same
+        order and with the same cursors.
+        """
+        try:
+            if indexed:
+                articles, has_more = self.index.page(limit, after)
+            else:
+                query = self.db.collection('articles').order_by('__name__')
+                if fields is not None:
+                    query = query.select([field for field in fields if field != 'id'])
+                if after:
+                    query = query.start_after({'__name__': after})
+                # One extra document tells whether another page follows
+                async with self.io.firestore_call():
+                    docs = [doc async for doc in query.limit(limit + 1).stream()]
+                has_more = len(docs) > limit
+                articles = [dict(doc.to_dict(), id=doc.id) for doc in docs[:limit]]
+
+            next_cursor = str(articles[-1]['id']) if has_more else None
+            if fields is not None:
+                articles = [{field: article[field] for field in fields if field in article} for article in articles]
+            if language != 'en' and articles:
+                with stage("translate_results"):
+                    await self._translate_articles(articles, language)
+            return articles, next_cursor
+        except Exception as e:
+            self.logger.error(f"Error listing articles: {str(e)}")
+            raise
+
+    async def _search_firestore(self, query: str) -> List[Dict]:
+        """Prefix search directly against Firestore, used until the index is loaded"""
+        articles = self.db.collection('articles')
+        queries = [
             # Search in title
-            title_docs = self.db.collection('articles').where('title', '>=', query).where(
-                'title', '<=', query + '\uf8ff').stream()
-            
+            articles.where('title', '>=', query).where('title', '<=', query + '\uf8ff'),
             # Search in content
-            content_docs = self.db.collection('articles').where('content', '>=', query).where(
-                'content', '<=', query + '\uf8ff').stream()
-            
+            articles.where('content', '>=', query).where('content', '<=', query + '\uf8ff'),
             # Search in tags
-            tag_docs = self.db.collection('articles').where('tags', 'array_contains', query).stream()
-            
-            # Combine results
-            seen_ids = set()
-            for doc in [*title_docs, *content_docs, *tag_docs]:
+            articles.where('tags', 'array_contains', query)
+        ]
+
+        async def fetch(q):
+            async with self.io.firestore_call():
+                return [doc async for doc in q.stream()]
+
+        # Run the three queries concurrently and combine results
+        results = []
+        seen_ids = set()
+        for docs in await asyncio.gather(*[fetch(q) for q in queries]):
+            for doc in docs:
                 if doc.id not in seen_ids:
-                    article = doc.to_dict()
-                    
-                    # Translate content if needed
-                    if language != 'en':
-                        article['title'] = self.translate_client.translate(
-                            article['title'],
-                            target_language=language,
-                            source_language='en'
-                        )['translatedText']
-                        
-                        article['content'] = self.translate_client.translate(
-                            article['content'],
-                            target_language=language,
-                            source_language='en'
-                        )['translatedText']
-                    
-                    results.append(article)
+                    results.append(doc.to_dict())
                     seen_ids.add(doc.id)
-            
-            self.logger.info(f"Search query: {query}, Results: {len(results)}")
-            return results
-        except Exception as e:
-            self.logger.error(f"Error searching articles: {str(e)}")
-            raise
+        return results
 
+    @timed_kb_operation("get_article_by_id")
     async def get_article_by_id(self, article_id: str, language: str = 'en') -> Optional[Dict]:
         """Get an article by ID with language support"""
         try:
             doc_ref = self.db.collection('articles').document(article_id)
-            doc = doc_ref.get()
+            async with self.io.firestore_call():
+                doc = await doc_ref.get()
             
             if not doc.exists:
                 return None
@@ -111,29 +332,21 @@ class GCPKnowledgeBase:
             
             # Translate if needed
             if language != 'en':
-                article['title'] = self.translate_client.translate(
-                    article['title'],
-                    target_language=language,
-                    source_language='en'
-                )['translatedText']
-                
-                article['content'] = self.translate_client.translate(
-                    article['content'],
-                    target_language=language,
-                    source_language='en'
-                )['translatedText']
+                await self._translate_articles([article], language)
             
             return article
         except Exception as e:
             self.logger.error(f"Error getting article: {str(e)}")
             raise
 
+    @timed_kb_operation("update_article")
     async def update_article(self, article_id: str, title: str = None, content: str = None,
                            category: str = None, tags: List[str] = None) -> Optional[Dict]:
         """Update an existing article"""
         try:
             doc_ref = self.db.collection('articles').document(article_id)
-            doc = doc_ref.get()
+            async with self.io.firestore_call():
+                doc = await doc_ref.get()
             
             if not doc.exists:
                 return None
@@ -149,36 +362,48 @@ class GCPKnowledgeBase:
                 update_data['tags'] = tags
             
             update_data['updated_at'] = datetime.now()
+            update_data['content_hash'] = content_hash(dict(doc.to_dict(), **update_data))
             
-            doc_ref.update(update_data)
+            async with self.io.firestore_call():
+                await doc_ref.update(update_data)
+                article = (await doc_ref.get()).to_dict()
             self.logger.info(f"Updated article: {article_id}")
-            
-            return doc_ref.get().to_dict()
+
+            self.index.add(article)
+            self.notify_change(article_id)
+            return article
         except Exception as e:
             self.logger.error(f"Error updating article: {str(e)}")
             raise
 
+    @timed_kb_operation("delete_article")
     async def delete_article(self, article_id: str) -> bool:
         """Delete an article"""
         try:
             doc_ref = self.db.collection('articles').document(article_id)
-            doc = doc_ref.get()
+            async with self.io.firestore_call():
+                doc = await doc_ref.get()
             
             if not doc.exists:
                 return False
             
-            doc_ref.delete()
+            async with self.io.firestore_call():
+                await doc_ref.delete()
+            self.index.remove(article_id)
             self.logger.info(f"Deleted article: {article_id}")
+            self.notify_change(article_id)
             return True
         except Exception as e:
             self.logger.error(f"Error deleting article: {str(e)}")
             raise
 
+    @timed_kb_operation("get_categories")
     async def get_categories(self) -> List[str]:
         """Get all categories"""
         try:
             categories_ref = self.db.collection('categories').document('list')
-            doc = categories_ref.get()
+            async with self.io.firestore_call():
+                doc = await categories_ref.get()
             
             if not doc.exists:
                 return []
@@ -188,35 +413,57 @@ class GCPKnowledgeBase:
             self.logger.error(f"Error getting categories: {str(e)}")
             raise
 
+    @timed_kb_operation("add_category")
     async def add_category(self, category: str) -> bool:
         """Add a new category"""
         try:
             categories_ref = self.db.collection('categories').document('list')
-            doc = categories_ref.get()
+            async with self.io.firestore_call():
+                doc = await categories_ref.get()
             
-            if not doc.exists:
-                categories_ref.set({'categories': [category]})
-            else:
-                current_categories = doc.to_dict().get('categories', [])
-                if category not in current_categories:
-                    current_categories.append(category)
-                    categories_ref.update({'categories': current_categories})
+                if not doc.exists:
+                    await categories_ref.set({'categories': [category]})
                 else:
-                    return False
+                    current_categories = doc.to_dict().get('categories', [])
+                    if category not in current_categories:
+                        current_categories.append(category)
+                        await categories_ref.update({'categories': current_categories})
+                    else:
+                        return False
             
+            self.categories_version += 1
             self.logger.info(f"Added new category: {category}")
             return True
         except Exception as e:
             self.logger.error(f"Error adding category: {str(e)}")
             raise
 
+    @timed_kb_operation("add_categories")
+    async def add_categories(self, categories: List[str]) -> List[str]:
+        """Add several categories with one write; returns the ones that were new"""
+        try:
+            categories_ref = self.db.collection('categories').document('list')
+            async with self.io.firestore_call():
+                doc = await categories_ref.get()
+                current_categories = doc.to_dict().get('categories', []) if doc.exists else []
+                added = [category for category in dict.fromkeys(categories) if category not in current_categories]
+                if not added:
+                    return []
+                await categories_ref.set({'categories': current_categories + added})
+
+            self.categories_version += 1
+            self.logger.info(f"Added {len(added)} new categories")
+            return added
+        except Exception as e:
+            self.logger.error(f"Error adding categories: {str(e)}")
+            raise
+
 # Initialize with common IT support solutions
 async def initialize_gcp_knowledge_base(kb: GCPKnowledgeBase):
-    """Initialize the knowledge base with sample articles"""
+    """Initialize the knowledge base with sample articles if it is empty"""
     try:
-        # Check if articles exist
-        articles = await kb.search_articles("")
-        if not articles:
+        # A single-document existence check; the search index is loaded separately
+        if not await kb.has_articles():
             # Add initial categories
             categories = [
                 "Password", "Network", "Hardware", "Software",
@@ -225,7 +472,7 @@ async def initialize_gcp_knowledge_base(kb: GCPKnowledgeBase):
             for category in categories:
                 await kb.add_category(category)
 
-            # Add sample articles
+            # Add sample articles, under their knowledge_base.json ids so importing it updates them
             await kb.add_article(
                 "Password Reset Guide",
                 """1. Visit the password reset portal at https://reset.company.com
@@ -235,7 +482,8 @@ async def initialize_gcp_knowledge_base(kb: GCPKnowledgeBase):
 5. Follow the link and create a new password
 6. Make sure to use a strong password with at least 8 characters""",
                 "Password",
-                ["password", "reset", "security"]
+                ["password", "reset", "security"],
+                article_id="article-1"
             )
 
             await kb.add_article(
@@ -248,7 +496,8 @@ async def initialize_gcp_knowledge_base(kb: GCPKnowledgeBase):
 6. Click 'Connect'
 7. Wait for the connection to be established""",
                 "VPN",
-                ["vpn", "network", "remote", "connection"]
+                ["vpn", "network", "remote", "connection"],
+                article_id="article-2"
             )
 
             await kb.add_article(
@@ -261,7 +510,8 @@ async def initialize_gcp_knowledge_base(kb: GCPKnowledgeBase):
 6. Disable startup programs you don't need
 7. Consider upgrading RAM or switching to SSD""",
                 "Hardware",
-                ["performance", "slow", "computer", "troubleshooting"]
+                ["performance", "slow", "computer", "troubleshooting"],
+                article_id="article-3"
             )
 
             await kb.add_article(
@@ -274,7 +524,8 @@ async def initialize_gcp_knowledge_base(kb: GCPKnowledgeBase):
 6. Verify your password is correct
 7. Contact IT support if issues persist""",
                 "Email",
-                ["email", "outlook", "access", "login"]
+                ["email", "outlook", "access", "login"],
+                article_id="article-4"
             )
             
             kb.logger.info("Initialized knowledge base with sample articles")
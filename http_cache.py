@@ -0,0 +1,243 @@
+"""HTTP caching and compression helpers for the knowledge base endpoints and static pages.
+
+Run as a script to write pre-compressed ``.gz`` (and ``.br`` when brotli is
+installed) siblings of the static assets, e.g. at image build time::
+
+    python -m http_cache frontend
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.responses import Response
+
+from singleflight import SingleFlight
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+# Preferred first; brotli only when the module is available
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+EXTENSIONS = {"br": ".br", "gzip": ".gz"}
+COMPRESS_MIN_BYTES = 500
+
+
+def accepted_encoding(accept_encoding: Optional[str], available=ENCODINGS) -> Optional[str]:
+    """The best of ``available`` allowed by an Accept-Encoding header, or None for identity"""
+    if not accept_encoding:
+        return None
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in available:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str, best: bool = False) -> bytes:
+    """Compress with settings cheap enough per response, or the smallest output when ``best``"""
+    if encoding == "br":
+        return brotli.compress(body, quality=11 if best else 5)
+    return gzip.compress(body, compresslevel=9 if best else 6)
+
+
+def coded_etag(etag: str, encoding: Optional[str]) -> str:
+    """The ETag of the ``encoding`` variant of a body: strong validators differ per content coding"""
+    return etag if encoding is None else f'{etag[:-1]}-{encoding}"'
+
+
+def _uncoded_etag(tag: str) -> str:
+    for encoding in EXTENSIONS:
+        if tag.endswith(f'-{encoding}"'):
+            return tag[:-len(encoding) - 2] + '"'
+    return tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches ``etag`` in any content coding (weak comparison,
+    as RFC 9110 requires)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return _uncoded_etag(etag) in [_uncoded_etag(tag[2:] if tag.startswith("W/") else tag) for tag in candidates]
+
+
+class CachedBody:
+    """A serialized response body with its strong ETag (of the identity coding) and compressed variants"""
+
+    def __init__(self, body: bytes, media_type: str):
+        self.body = body
+        self.media_type = media_type
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.created = time.monotonic()
+        self._encoded: Dict[str, bytes] = {}
+
+    def encoded(self, encoding: Optional[str]) -> bytes:
+        if encoding is None:
+            return self.body
+        data = self._encoded.get(encoding)
+        if data is None:
+            data = self._encoded[encoding] = compress(self.body, encoding)
+        return data
+
+
+class BodyCache:
+    """Short-lived LRU of serialized JSON responses.
+
+    Keys should include whatever version the data has (e.g. the search index
+    generation) so a change is a new key; ``ttl`` bounds staleness for data
+    without one. Identical concurrent misses share one build. ETags hash the
+    body, so they agree across instances serving the same data.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        self.ttl = ttl if ttl is not None else float(os.getenv("KB_HTTP_CACHE_TTL", "30"))
+        self.max_entries = max_entries or int(os.getenv("KB_HTTP_CACHE_ENTRIES", "256"))
+        self._entries: "OrderedDict[Hashable, CachedBody]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight("http_cache")
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[CachedBody]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry.created > self.ttl:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Hashable, entry: CachedBody):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def get_or_build(self, key: Hashable, build: Callable[[], Awaitable[Any]]) -> CachedBody:
+        """Cached body for ``key``, or JSON-serialize the result of ``build()``"""
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+
+        async def serialize() -> CachedBody:
+            content = await build()
+            built = CachedBody(json.dumps(jsonable_encoder(content), separators=(",", ":")).encode("utf-8"),
+                               "application/json")
+            self.put(key, built)
+            return built
+
+        return await self._flight.do(key, serialize)
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0
+        }
+
+
+def cached_response(request: Request, entry: CachedBody, cache_control: str) -> Response:
+    """200 with the body (compressed when accepted and worthwhile), or 304 when the ETag matches.
+
+    Each content coding has its own ETag, and the 304 carries the one of
+    the variant this request would get.
+    """
+    encoding = None
+    if len(entry.body) >= COMPRESS_MIN_BYTES:
+        encoding = accepted_encoding(request.headers.get("accept-encoding"))
+    headers = {"ETag": coded_etag(entry.etag, encoding), "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(entry.encoded(encoding), media_type=entry.media_type, headers=headers)
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves ``name.br`` / ``name.gz`` siblings to clients accepting them.
+
+    Siblings older than the original are ignored, so an edited asset is
+    never shadowed by a stale compressed copy. Each variant gets its own
+    ETag from its file's stat, and ``If-None-Match`` works as for any file.
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        accept_encoding = Headers(scope=scope).get("accept-encoding")
+        # Serving a pre-compressed file needs no compression library, so brotli is always offered
+        for encoding in ("br", "gzip"):
+            if accepted_encoding(accept_encoding, (encoding,)) is None:
+                continue
+            candidate = f"{full_path}{EXTENSIONS[encoding]}"
+            try:
+                candidate_stat = os.stat(candidate)
+            except OSError:
+                continue
+            if candidate_stat.st_mtime < stat_result.st_mtime:
+                continue
+            response = super().file_response(candidate, candidate_stat, scope, status_code)
+            if response.status_code != 304:
+                media_type = mimetypes.guess_type(str(full_path))[0] or "text/plain"
+                if media_type.startswith("text/"):
+                    media_type += "; charset=utf-8"
+                response.headers["content-type"] = media_type
+                response.headers["content-encoding"] = encoding
+            response.headers["vary"] = "Accept-Encoding"
+            return response
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        response.headers["vary"] = "Accept-Encoding"
+        return response
+
+
+def precompress(directory: str, extensions=(".html", ".css", ".js", ".json", ".svg", ".txt")) -> List[str]:
+    """Write compressed siblings for every compressible asset under ``directory``"""
+    written = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if not name.endswith(extensions):
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                body = f.read()
+            for encoding in ENCODINGS:
+                target = path + EXTENSIONS[encoding]
+                with open(target, "wb") as f:
+                    f.write(compress(body, encoding, best=True))
+                written.append(target)
+    return written
+
+
+if __name__ == "__main__":
+    for directory in sys.argv[1:] or ["frontend"]:
+        for path in precompress(directory):
+            print(path)
@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from gcp_knowledge_base import GCPKnowledgeBase
+
+logger = logging.getLogger(__name__)
+
+
+def _as_utc(value) -> Optional[datetime]:
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class IndexSync:
+    """Keep ``kb.index`` in step with the Firestore ``articles`` collection.
+
+    After one full load the index only receives changed documents, either
+    pushed by a Firestore ``on_snapshot`` listener (``mode="listener"``) or
+    pulled by polling on the ``updated_at`` watermark (``mode="poll"``).
+    ``updated_at`` is stamped by the writer before its commit, so writes can
+    land out of order; both therefore look back ``overlap`` seconds before
+    the watermark, and revisions already indexed are skipped. The listener
+    watches that window rather than the whole collection, so its initial
+    snapshot does not read every document a second time. Neither can observe deletes of documents loaded before the
+    watermark, so every ``reconcile_every`` poll intervals a count of the
+    collection is compared with the index, and only when they differ are
+    the indexed ids compared with a projection of the collection's ids.
+    Each batch of changes is applied atomically and bumps the index
+    generation; updated and deleted ids are forwarded to the KB change
+    listeners so caches on this instance are invalidated too.
+    """
+
+    def __init__(self, kb: GCPKnowledgeBase, mode: Optional[str] = None,
+                 poll_interval: Optional[float] = None, reconcile_every: Optional[int] = None,
+                 overlap: Optional[float] = None):
+        self.kb = kb
+        self.mode = mode or os.getenv("INDEX_SYNC_MODE", "listener")
+        self.poll_interval = poll_interval or float(os.getenv("INDEX_SYNC_INTERVAL", "30"))
+        self.reconcile_every = reconcile_every or int(os.getenv("INDEX_SYNC_RECONCILE_EVERY", "10"))
+        self.overlap = overlap if overlap is not None else float(os.getenv("INDEX_SYNC_OVERLAP", "120"))
+        self.watermark: Optional[datetime] = None
+        self.last_sync_at: Optional[float] = None
+        self.last_lag_seconds = 0.0
+        self.changes_applied = 0
+        self._lock = threading.Lock()
+        self._watch = None
+        self._poll_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Load the index if needed, then start following changes"""
+        if not self.kb.index_loaded:
+            await self.kb.load_index()
+        self._advance_watermark(self.kb.index.all_articles())
+        self.last_sync_at = time.time()
+
+        if self.mode == "listener":
+            try:
+                articles = self.kb.sync_db.collection('articles')
+                # The loaded documents are already indexed; only later changes need to be delivered
+                if self.watermark is not None:
+                    articles = articles.where('updated_at', '>=', self._since())
+                self._watch = articles.on_snapshot(self._on_snapshot)
+                self._poll_task = asyncio.ensure_future(self._reconcile_loop())
+                logger.info("Index sync: following Firestore snapshot listener")
+                return
+            except Exception as e:
+                logger.warning(f"Snapshot listener unavailable, falling back to polling: {str(e)}")
+                self.mode = "poll"
+
+        if self.mode == "poll":
+            self._poll_task = asyncio.ensure_future(self._poll_loop())
+            logger.info(f"Index sync: polling every {self.poll_interval}s")
+        else:
+            logger.info("Index sync disabled")
+
+    @property
+    def following(self) -> bool:
+        """Whether changes made outside this instance reach the index"""
+        return self._watch is not None or (self.mode == "poll" and self._poll_task is not None)
+
+    async def stop(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            try:
+                await self._poll_task
+            except asyncio.CancelledError:
+                pass
+            self._poll_task = None
+
+    def _since(self) -> datetime:
+        """Start of the ``updated_at`` window to read: the watermark minus the overlap"""
+        return self.watermark - timedelta(seconds=self.overlap)
+
+    def _advance_watermark(self, articles: Iterable[Dict]):
+        for article in articles:
+            updated_at = _as_utc(article.get('updated_at'))
+            if updated_at is not None and (self.watermark is None or updated_at > self.watermark):
+                self.watermark = updated_at
+
+    def _is_current(self, article: Dict) -> bool:
+        """True if the index already holds this revision of the article"""
+        indexed = self.kb.index.get(article.get('id'))
+        return indexed is not None and indexed.get('updated_at') == article.get('updated_at')
+
+    def apply_changes(self, upserts: List[Dict], deletes: List[str]):
+        """Apply one batch of changed documents to the index"""
+        with self._lock:
+            upserts = [article for article in upserts if not self._is_current(article)]
+            deletes = [article_id for article_id in deletes if article_id in self.kb.index]
+            now = datetime.now(timezone.utc)
+            self.last_sync_at = now.timestamp()
+            if not upserts and not deletes:
+                return
+
+            generation = self.kb.index.apply(upserts, deletes)
+            self._advance_watermark(upserts)
+            lags = [(now - updated_at).total_seconds()
+                    for updated_at in (_as_utc(article.get('updated_at')) for article in upserts)
+                    if updated_at is not None]
+            self.last_lag_seconds = max(0.0, max(lags)) if lags else 0.0
+            self.changes_applied += len(upserts) + len(deletes)
+        logger.info(f"Index sync: applied {len(upserts)} upserts, {len(deletes)} deletes "
+                    f"(generation {generation}, lag {self.last_lag_seconds:.1f}s)")
+        for article_id in [article['id'] for article in upserts] + deletes:
+            self.kb.notify_change(article_id)
+
+    def _on_snapshot(self, col_snapshot, changes, read_time):
+        """Firestore listener callback (runs on the listener's thread)"""
+        try:
+            upserts, deletes = [], []
+            for change in changes:
+                if change.type.name == 'REMOVED':
+                    deletes.append(change.document.id)
+                else:
+                    upserts.append(change.document.to_dict())
+            self.apply_changes(upserts, deletes)
+        except Exception as e:
+            logger.error(f"Error applying index snapshot: {str(e)}")
+
+    async def _poll_once(self, reconcile: bool):
+        articles = self.kb.db.collection('articles')
+        query = articles.order_by('updated_at')
+        if self.watermark is not None:
+            query = articles.where('updated_at', '>=', self._since()).order_by('updated_at')
+        async with self.kb.io.firestore_call():
+            upserts = [doc.to_dict() async for doc in query.stream()]
+
+        self.apply_changes(upserts, [])
+        # After the upserts, so the count comparison sees the same documents Firestore does
+        if reconcile:
+            self.apply_changes([], await self._deleted_ids())
+
+    async def _deleted_ids(self) -> List[str]:
+        """Indexed ids no longer in Firestore; the ids are only read when the document count disagrees"""
+        articles = self.kb.db.collection('articles')
+        async with self.kb.io.firestore_call():
+            count = (await articles.count().get())[0][0].value
+        if count == len(self.kb.index):
+            return []
+        async with self.kb.io.firestore_call():
+            live_ids = {doc.id async for doc in articles.select(['id']).stream()}
+        return [article_id for article_id in self.kb.index.ids() if article_id not in live_ids]
+
+    async def _poll_loop(self):
+        polls = 0
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            polls += 1
+            try:
+                await self._poll_once(polls % self.reconcile_every == 0)
+            except Exception as e:
+                logger.error(f"Error polling for index changes: {str(e)}")
+
+    async def _reconcile_loop(self):
+        """Remove deleted articles the listener's query cannot report"""
+        while True:
+            await asyncio.sleep(self.poll_interval * self.reconcile_every)
+            try:
+                self.apply_changes([], await self._deleted_ids())
+            except Exception as e:
+                logger.error(f"Error reconciling index deletes: {str(e)}")
+
+    def stats(self) -> Dict:
+        return {
+            "mode": self.mode,
+            "generation": self.kb.index.generation,
+            "articles": len(self.kb.index),
+            "changes_applied": self.changes_applied,
+            "lag_seconds": self.last_lag_seconds,
+            "seconds_since_sync": time.time() - self.last_sync_at if self.last_sync_at else None,
+            "watermark": self.watermark.isoformat() if self.watermark else None
+        }
@@ -0,0 +1,61 @@
+import os
+from typing import Dict, List, Optional, Tuple
+
+from search_index import tokenize
+
+
+class KBAnswerPolicy:
+    """Decide when a knowledge base article can answer a chat without the LLM.
+
+    The top search hit is returned directly when its score is at least
+    ``min_score``, it beats the runner-up by a relative ``min_margin``
+    (``(top - second) / top``) and the article contains at least
+    ``min_coverage`` of the query's terms. ``mode="off"`` disables the
+    fast path. ``min_score`` must be positive; a top hit scored 0 never
+    answers.
+
+    With ``fallback`` set, the top hit also answers (regardless of score)
+    when DeepSeek is unavailable, instead of the chat failing.
+    """
+
+    def __init__(self, mode: Optional[str] = None, min_score: Optional[float] = None,
+                 min_margin: Optional[float] = None, min_coverage: Optional[float] = None,
+                 max_tokens: Optional[int] = None, fallback: Optional[bool] = None):
+        self.mode = mode or os.getenv("KB_ANSWER_MODE", "auto")
+        self.min_score = min_score if min_score is not None else float(os.getenv("KB_ANSWER_MIN_SCORE", "4.0"))
+        if self.min_score <= 0:
+            # Unscored hits (e.g. vector-only matches in hybrid search) must never answer on their own
+            raise ValueError(f"KB_ANSWER_MIN_SCORE must be positive, got {self.min_score}")
+        self.min_margin = min_margin if min_margin is not None else float(os.getenv("KB_ANSWER_MIN_MARGIN", "0.3"))
+        self.min_coverage = (min_coverage if min_coverage is not None
+                             else float(os.getenv("KB_ANSWER_MIN_COVERAGE", "1.0")))
+        self.max_tokens = max_tokens or int(os.getenv("KB_ANSWER_MAX_TOKENS", "400"))
+        self.fallback = (fallback if fallback is not None
+                         else os.getenv("KB_ANSWER_FALLBACK", "true").lower() in ("1", "true", "yes", "on"))
+
+    @staticmethod
+    def coverage(query: str, article: Dict) -> float:
+        """Fraction of the query's terms that occur in the article"""
+        query_terms = set(tokenize(query))
+        if not query_terms:
+            return 0.0
+        text = " ".join([article.get("title", ""), " ".join(article.get("tags", [])), article.get("content", "")])
+        return len(query_terms & set(tokenize(text))) / len(query_terms)
+
+    def choose(self, query: str, scored: List[Tuple[Dict, float]]) -> Optional[Dict]:
+        """The article to answer with, or None when the LLM should answer"""
+        if self.mode == "off" or not scored:
+            return None
+        article, top = scored[0]
+        second = scored[1][1] if len(scored) > 1 else 0.0
+        if top <= 0 or top < self.min_score or (top - second) / top < self.min_margin:
+            return None
+        if self.coverage(query, article) < self.min_coverage:
+            return None
+        return article
+
+    def fallback_article(self, scored: List[Tuple[Dict, float]]) -> Optional[Dict]:
+        """The article to answer with when the LLM failed, or None to surface the error"""
+        if not self.fallback or not scored:
+            return None
+        return scored[0][0]
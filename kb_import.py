@@ -0,0 +1,440 @@
+"""Bulk import and export of knowledge base articles.
+
+Imports accept a JSON array of articles, NDJSON (one article per line, the
+export format) or the ``knowledge_base.json`` layout, whose ``articles`` and
+``solutions`` lists are both loaded. Solutions (``problem`` / ``solution``)
+become articles. Exports write the ``articles`` collection as NDJSON to a
+local file or a ``gs://bucket/object`` URI::
+
+    python -m kb_import import knowledge_base.json
+    python -m kb_import import gs://my-bucket/articles.ndjson
+    python -m kb_import export articles.ndjson
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from google.api_core import exceptions as gcp_exceptions
+
+from gcp_knowledge_base import GCPKnowledgeBase, content_hash
+
+logger = logging.getLogger(__name__)
+
+# Firestore accepts at most 500 writes per batch
+MAX_BATCH_SIZE = 500
+CHUNK_SIZE = 64 * 1024
+MAX_REPORTED_ERRORS = 20
+
+# Sections of a knowledge_base.json style object that hold records
+RECORD_SECTIONS = ("articles", "solutions")
+
+RETRYABLE_ERRORS = (gcp_exceptions.Aborted, gcp_exceptions.DeadlineExceeded, gcp_exceptions.InternalServerError,
+                    gcp_exceptions.ResourceExhausted, gcp_exceptions.ServiceUnavailable)
+
+
+def detect_format(name: str) -> str:
+    """``ndjson`` for .ndjson/.jsonl names, ``json`` otherwise"""
+    return "ndjson" if name.lower().endswith((".ndjson", ".jsonl")) else "json"
+
+
+class _JSONStream:
+    """Incremental JSON reader yielding the items of arrays without loading the whole document"""
+
+    def __init__(self, f: IO[str], chunk_size: int = CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """The next non-whitespace character ("" at the end of input)"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"Invalid JSON: expected one of {chars!r}, found {char or 'end of input'!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError as e:
+                if self.eof:
+                    raise ValueError(f"Invalid JSON: {e.msg}")
+            self._fill()
+
+    def array(self) -> Iterator:
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(",]") == "]":
+                return
+
+
+def iter_json_records(f: IO[str]) -> Iterator[Dict]:
+    """Records of a JSON array, or of the ``articles``/``solutions`` arrays of an object"""
+    stream = _JSONStream(f)
+    if stream.peek() == "[":
+        yield from stream.array()
+        return
+    stream.expect("{")
+    if stream.peek() == "}":
+        return
+    while True:
+        key = stream.value()
+        stream.expect(":")
+        if key in RECORD_SECTIONS and stream.peek() == "[":
+            yield from stream.array()
+        else:
+            stream.value()
+        if stream.expect(",}") == "}":
+            return
+
+
+def iter_ndjson_records(f: IO[str]) -> Iterator[Dict]:
+    """One record per non-empty line; a malformed line yields its error instead of a record"""
+    for number, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            yield ValueError(f"line {number}: {e.msg}")
+
+
+def read_records(f: IO[str], fmt: str = "json") -> Iterator:
+    if fmt == "ndjson":
+        return iter_ndjson_records(f)
+    return iter_json_records(f)
+
+
+def _timestamp(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+
+
+def normalize(record) -> Dict:
+    """An article document from an import record, raising ValueError when it is unusable"""
+    if isinstance(record, Exception):
+        raise ValueError(str(record))
+    if not isinstance(record, dict):
+        raise ValueError(f"expected an object, got {type(record).__name__}")
+
+    kind = "solution" if "problem" in record else "article"
+    title = record.get("problem") if kind == "solution" else record.get("title")
+    content = record.get("solution") if kind == "solution" else record.get("content")
+    if not title or not content:
+        raise ValueError(f"{kind} {record.get('id', '?')} has no title/content")
+
+    raw_id = record.get("id")
+    # Numeric ids (knowledge_base.json) are only unique within their section
+    article_id = f"{kind}-{raw_id}" if isinstance(raw_id, int) else raw_id
+    tags = record.get("tags") or []
+    article = {
+        "title": str(title),
+        "content": str(content),
+        "category": str(record.get("category") or "General"),
+        "tags": [str(tag) for tag in tags] if isinstance(tags, list) else [str(tags)]
+    }
+    article["content_hash"] = content_hash(article)
+    # Without an id, identical content maps to the same document
+    article["id"] = str(article_id) if article_id not in (None, "") else article["content_hash"]
+    if "/" in article["id"]:
+        raise ValueError(f"invalid document id: {article['id']}")
+    try:
+        if record.get("created_at"):
+            article["created_at"] = _timestamp(record["created_at"])
+    except ValueError:
+        raise ValueError(f"{kind} {article['id']} has an invalid created_at")
+    return article
+
+
+def _parse(records: Iterator, count: int) -> List:
+    """Up to ``count`` further records normalized, with the ValueError in place of unusable ones"""
+    parsed = []
+    for record in itertools.islice(records, count):
+        try:
+            parsed.append(normalize(record))
+        except ValueError as e:
+            parsed.append(e)
+    return parsed
+
+
+class KBImporter:
+    """Load articles into Firestore with batched writes.
+
+    Records are streamed from the input and written in batches of
+    ``batch_size`` with up to ``concurrency`` batches in flight, each
+    retried with jittered exponential backoff on transient errors.
+    Documents whose stored ``content_hash`` matches the record are skipped,
+    so re-running an import only writes what changed, and so are new ids
+    whose content is already stored under another id. Reading and
+    normalizing records runs on the I/O pool a batch at a time, off the
+    event loop. Written articles are applied to the search index and their
+    categories added to the list.
+    """
+
+    def __init__(self, kb: GCPKnowledgeBase, batch_size: Optional[int] = None,
+                 concurrency: Optional[int] = None, retries: Optional[int] = None):
+        self.kb = kb
+        self.batch_size = min(MAX_BATCH_SIZE, batch_size or int(os.getenv("KB_IMPORT_BATCH_SIZE", "400")))
+        self.concurrency = concurrency or int(os.getenv("KB_IMPORT_CONCURRENCY", "8"))
+        self.retries = retries if retries is not None else int(os.getenv("KB_IMPORT_RETRIES", "5"))
+
+    async def _existing_hashes(self) -> Dict[str, str]:
+        """Document id -> content hash, read through a projection.
+
+        Documents written before articles stored their hash are read in full
+        and hashed here, so they are recognized as unchanged or duplicate too.
+        """
+        collection = self.kb.db.collection("articles")
+        async with self.kb.io.firestore_call():
+            existing = {doc.id: doc.to_dict().get("content_hash") async for doc in
+                        collection.select(["content_hash"]).stream()}
+        unhashed = [doc_id for doc_id, stored in existing.items() if not stored]
+        if unhashed:
+            async def read(doc_id: str):
+                async with self.kb.io.firestore_call():
+                    return await collection.document(doc_id).get()
+
+            for doc in await asyncio.gather(*[read(doc_id) for doc_id in unhashed]):
+                if doc.exists:
+                    existing[doc.id] = content_hash(doc.to_dict())
+                else:
+                    del existing[doc.id]
+            logger.info(f"Hashed {len(unhashed)} stored articles without a content hash")
+        return existing
+
+    async def _commit(self, batch: List[Tuple[Dict, bool]], stats: Dict):
+        collection = self.kb.db.collection("articles")
+        now = datetime.now()
+        documents = []
+        for article, exists in batch:
+            document = dict(article, updated_at=now)
+            if not exists:
+                document.setdefault("created_at", now)
+            documents.append((document, exists))
+
+        for attempt in range(self.retries + 1):
+            write = self.kb.db.batch()
+            for document, exists in documents:
+                # Merging keeps created_at (and any other fields) of existing documents
+                write.set(collection.document(document["id"]), document, merge=exists)
+            try:
+                async with self.kb.io.firestore_call():
+                    await write.commit()
+                break
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.retries:
+                    self._fail(stats, batch, e)
+                    return
+                stats["retries"] += 1
+                delay = min(10.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0)
+                logger.warning(f"Retrying import batch in {delay:.1f}s: {str(e)}")
+                await asyncio.sleep(delay)
+            except Exception as e:
+                self._fail(stats, batch, e)
+                return
+
+        stats["written"] += len(documents)
+        stats["batches"] += 1
+        if self.kb.index_loaded:
+            self.kb.index.apply([document for document, _ in documents])
+        for document, _ in documents:
+            self.kb.notify_change(document["id"])
+
+    @staticmethod
+    def _fail(stats: Dict, batch: List[Tuple[Dict, bool]], error: Exception):
+        logger.error(f"Error writing import batch of {len(batch)} articles: {str(error)}")
+        stats["failed"] += len(batch)
+        if len(stats["errors"]) < MAX_REPORTED_ERRORS:
+            stats["errors"].append(f"batch starting at {batch[0][0]['id']}: {str(error)}")
+
+    async def run(self, records: Iterable) -> Dict:
+        """Import ``records`` (dicts, or exceptions for unreadable ones) and return counters"""
+        start = time.perf_counter()
+        stats = {"read": 0, "written": 0, "unchanged": 0, "duplicate": 0, "invalid": 0, "failed": 0,
+                 "batches": 0, "retries": 0, "errors": []}
+        existing = await self._existing_hashes()
+        stored_hashes = set(existing.values())
+        categories: Set[str] = set()
+        pending: Set[asyncio.Future] = set()
+        batch: List[Tuple[Dict, bool]] = []
+
+        async def submit(batch: List[Tuple[Dict, bool]]):
+            nonlocal pending
+            pending.add(asyncio.ensure_future(self._commit(batch, stats)))
+            if len(pending) >= self.concurrency:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+
+        records = iter(records)
+        while True:
+            parsed = await self.kb.io.run(_parse, records, self.batch_size)
+            if not parsed:
+                break
+            for article in parsed:
+                stats["read"] += 1
+                if isinstance(article, ValueError):
+                    stats["invalid"] += 1
+                    if len(stats["errors"]) < MAX_REPORTED_ERRORS:
+                        stats["errors"].append(f"record {stats['read']}: {str(article)}")
+                    continue
+                article_id = article["id"]
+                if existing.get(article_id) == article["content_hash"]:
+                    stats["unchanged"] += 1
+                    continue
+                # The same content under a new id (e.g. the bootstrap seed under generated ids)
+                if article_id not in existing and article["content_hash"] in stored_hashes:
+                    stats["duplicate"] += 1
+                    continue
+                batch.append((article, article_id in existing))
+                existing[article_id] = article["content_hash"]
+                stored_hashes.add(article["content_hash"])
+                categories.add(article["category"])
+                if len(batch) >= self.batch_size:
+                    await submit(batch)
+                    batch = []
+        if batch:
+            await submit(batch)
+        if pending:
+            for task in (await asyncio.wait(pending))[0]:
+                task.result()
+
+        if categories:
+            await self.kb.add_categories(sorted(categories))
+        stats["seconds"] = round(time.perf_counter() - start, 3)
+        logger.info(f"Imported {stats['written']} articles ({stats['unchanged']} unchanged, "
+                    f"{stats['duplicate']} duplicate, {stats['invalid']} invalid, {stats['failed']} failed) "
+                    f"in {stats['seconds']}s")
+        return stats
+
+
+def _split_gcs_uri(uri: str) -> Tuple[str, str]:
+    bucket, _, name = uri[len("gs://"):].partition("/")
+    if not bucket or not name:
+        raise ValueError(f"Expected gs://bucket/object, got {uri}")
+    return bucket, name
+
+
+async def import_from(kb: GCPKnowledgeBase, source: str, fmt: Optional[str] = None) -> Dict:
+    """Import from a local path or a gs:// URI (downloaded to a temporary file first)"""
+    fmt = fmt or detect_format(source)
+    if not source.startswith("gs://"):
+        with open(source, "r", encoding="utf-8") as f:
+            return await KBImporter(kb).run(read_records(f, fmt))
+
+    bucket, name = _split_gcs_uri(source)
+    with tempfile.NamedTemporaryFile(suffix=".import") as tmp:
+        blob = kb.storage_client.bucket(bucket).blob(name)
+        await kb.io.run(blob.download_to_filename, tmp.name)
+        with open(tmp.name, "r", encoding="utf-8") as f:
+            return await KBImporter(kb).run(read_records(f, fmt))
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    # Firestore timestamps are datetimes; anything else is written as text
+    return str(value)
+
+
+async def export_articles(kb: GCPKnowledgeBase, out: IO[str], page_size: Optional[int] = None) -> int:
+    """Write every article as NDJSON in document id order, a page at a time; returns the count"""
+    page_size = page_size or int(os.getenv("KB_EXPORT_PAGE_SIZE", "500"))
+    query = kb.db.collection("articles").order_by("__name__").limit(page_size)
+    after = None
+    count = 0
+    while True:
+        page = query.start_after({"__name__": after}) if after else query
+        async with kb.io.firestore_call():
+            docs = [doc async for doc in page.stream()]
+        for doc in docs:
+            out.write(json.dumps(dict(doc.to_dict(), id=doc.id), default=_json_default, ensure_ascii=False) + "\n")
+        count += len(docs)
+        if len(docs) < page_size:
+            return count
+        after = docs[-1].id
+
+
+async def export_to(kb: GCPKnowledgeBase, destination: str) -> Dict:
+    """Export to a local path or a gs:// URI (uploaded from a temporary file)"""
+    start = time.perf_counter()
+    if destination.startswith("gs://"):
+        bucket, name = _split_gcs_uri(destination)
+        with tempfile.NamedTemporaryFile("w+", encoding="utf-8", suffix=".ndjson") as tmp:
+            count = await export_articles(kb, tmp)
+            tmp.flush()
+            blob = kb.storage_client.bucket(bucket).blob(name)
+            await kb.io.run(blob.upload_from_filename, tmp.name, content_type="application/x-ndjson")
+    else:
+        with open(destination, "w", encoding="utf-8") as f:
+            count = await export_articles(kb, f)
+    seconds = round(time.perf_counter() - start, 3)
+    logger.info(f"Exported {count} articles to {destination} in {seconds}s")
+    return {"articles": count, "destination": destination, "seconds": seconds}
+
+
+async def _main(argv: List[str]) -> int:
+    if len(argv) != 2 or argv[0] not in ("import", "export"):
+        print(__doc__.strip(), file=sys.stderr)
+        return 2
+    project_id = os.getenv("GCP_PROJECT_ID")
+    if not project_id:
+        print("GCP_PROJECT_ID not set", file=sys.stderr)
+        return 2
+    kb = GCPKnowledgeBase(project_id)
+    try:
+        if argv[0] == "import":
+            result = await import_from(kb, argv[1])
+        else:
+            result = await export_to(kb, argv[1])
+    finally:
+        kb.io.shutdown()
+    print(json.dumps(result, indent=2))
+    return 1 if result.get("failed") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
@@ -0,0 +1,217 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from metrics import UPSTREAM_IN_FLIGHT, UPSTREAM_REQUESTS, UPSTREAM_SECONDS
+
+DEFAULT_BASE_URL = "https://api.deepseek.com/v1"
+DEFAULT_MODEL = "deepseek-chat"
+
+logger = logging.getLogger(__name__)
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+def _error_kind(error: Exception) -> str:
+    if isinstance(error, (asyncio.TimeoutError, httpx.TimeoutException)):
+        return "timeout"
+    return "connection_error"
+
+
+class LLMError(Exception):
+    """Error returned by (or while talking to) the upstream LLM"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class LLMUnavailableError(LLMError):
+    """The upstream LLM could not be reached or did not answer in time"""
+
+    def __init__(self, detail: str):
+        super().__init__(503, detail)
+
+
+class DeepSeekClient:
+    """Non-blocking DeepSeek chat completion client.
+
+    A single ``httpx.AsyncClient`` is shared by every request so connections
+    (HTTP/2 when ``h2`` is installed) are kept alive and pooled instead of
+    being re-established per chat.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 model: Optional[str] = None, pool_size: Optional[int] = None,
+                 keepalive: Optional[int] = None, connect_timeout: Optional[float] = None,
+                 read_timeout: Optional[float] = None, total_timeout: Optional[float] = None,
+                 http2: Optional[bool] = None, name: str = "deepseek"):
+        self.name = name
+        self.api_key = api_key if api_key is not None else os.getenv("DEEPSEEK_API_KEY")
+        self.base_url = (base_url or os.getenv("DEEPSEEK_BASE_URL", DEFAULT_BASE_URL)).rstrip("/")
+        self.model = model or os.getenv("DEEPSEEK_MODEL", DEFAULT_MODEL)
+        self.pool_size = pool_size or _env_int("DEEPSEEK_POOL_SIZE", 100)
+        self.keepalive = keepalive or _env_int("DEEPSEEK_KEEPALIVE", 20)
+        self.connect_timeout = connect_timeout or _env_float("DEEPSEEK_CONNECT_TIMEOUT", 5.0)
+        self.read_timeout = read_timeout or _env_float("DEEPSEEK_READ_TIMEOUT", 60.0)
+        self.total_timeout = total_timeout or _env_float("DEEPSEEK_TOTAL_TIMEOUT", 60.0)
+        self.http2 = http2 if http2 is not None else _env_bool("DEEPSEEK_HTTP2", True)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Create the pooled HTTP client on first use"""
+        if self._client is None:
+            http2 = self.http2
+            if http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    logger.warning("h2 is not installed, falling back to HTTP/1.1 for DeepSeek")
+                    http2 = False
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.keepalive,
+                    keepalive_expiry=30.0
+                ),
+                timeout=httpx.Timeout(
+                    connect=self.connect_timeout,
+                    read=self.read_timeout,
+                    write=self.connect_timeout,
+                    pool=self.connect_timeout
+                )
+            )
+        return self._client
+
+    def _headers(self) -> Dict[str, str]:
+        if not self.api_key:
+            raise LLMError(500, "DeepSeek API key not found")
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+
+    async def chat_completion(self, messages: List[Dict], temperature: float = 0.7,
+                              max_tokens: int = 1000, **params) -> Dict:
+        """Send a chat completion request and return the decoded JSON body"""
+        data = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            **params
+        }
+        headers = self._headers()
+        client = self._get_client()
+        start = time.perf_counter()
+        try:
+            with UPSTREAM_IN_FLIGHT.track_inprogress(upstream=self.name):
+                response = await asyncio.wait_for(
+                    client.post("/chat/completions", headers=headers, json=data),
+                    timeout=self.total_timeout
+                )
+        except (httpx.HTTPError, asyncio.TimeoutError) as e:
+            UPSTREAM_REQUESTS.inc(upstream=self.name, status=_error_kind(e))
+            logger.error(f"DeepSeek API connection error: {e!r}")
+            raise LLMUnavailableError(
+                "DeepSeek API is currently unavailable. Our service is experiencing "
+                "temporary issues. Please try again later."
+            )
+        UPSTREAM_SECONDS.observe(time.perf_counter() - start, upstream=self.name)
+        UPSTREAM_REQUESTS.inc(upstream=self.name, status=response.status_code)
+
+        if response.status_code != 200:
+            raise LLMError(response.status_code, f"DeepSeek API error: {response.text}")
+
+        try:
+            response_data = response.json()
+        except ValueError as e:
+            raise LLMError(500, f"Failed to parse API response: {str(e)}")
+
+        if "choices" not in response_data or not response_data["choices"]:
+            raise LLMError(500, "Invalid response format from DeepSeek API")
+        return response_data
+
+    async def stream_chat_completion(self, messages: List[Dict], temperature: float = 0.7,
+                                     max_tokens: int = 1000, **params) -> AsyncIterator[Dict]:
+        """Send a streaming chat completion request and yield each decoded chunk.
+
+        The total timeout bounds the wait for the response headers; after that
+        each chunk only has to arrive within the read timeout.
+        """
+        data = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True,
+            **params
+        }
+        headers = self._headers()
+        client = self._get_client()
+        request = client.build_request("POST", "/chat/completions", headers=headers, json=data)
+        start = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(client.send(request, stream=True), timeout=self.total_timeout)
+        except (httpx.HTTPError, asyncio.TimeoutError) as e:
+            UPSTREAM_REQUESTS.inc(upstream=self.name, status=_error_kind(e))
+            logger.error(f"DeepSeek API connection error: {e!r}")
+            raise LLMUnavailableError(
+                "DeepSeek API is currently unavailable. Our service is experiencing "
+                "temporary issues. Please try again later."
+            )
+        UPSTREAM_SECONDS.observe(time.perf_counter() - start, upstream=self.name)
+        UPSTREAM_REQUESTS.inc(upstream=self.name, status=response.status_code)
+        UPSTREAM_IN_FLIGHT.inc(upstream=self.name)
+
+        try:
+            if response.status_code != 200:
+                body = await response.aread()
+                raise LLMError(response.status_code,
+                               f"DeepSeek API error: {body.decode('utf-8', 'replace')}")
+
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                try:
+                    yield json.loads(payload)
+                except ValueError as e:
+                    raise LLMError(500, f"Failed to parse API response: {str(e)}")
+        except httpx.HTTPError as e:
+            logger.error(f"DeepSeek API stream error: {e!r}")
+            raise LLMUnavailableError("DeepSeek API stream was interrupted. Please try again later.")
+        finally:
+            UPSTREAM_IN_FLIGHT.dec(upstream=self.name)
+            await response.aclose()
+
+    async def aclose(self):
+        """Close pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,337 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, List, Optional
+
+import deadline
+from deadline import DeadlineExceeded
+from llm_client import DeepSeekClient, LLMError, LLMUnavailableError
+from metrics import counter, gauge
+
+logger = logging.getLogger(__name__)
+
+GATEWAY_EVENTS = counter("helpdesk_llm_gateway_events_total",
+                         "LLM gateway hedges, retries, fallbacks and short-circuits", ["event"])
+
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+def is_retryable(error: LLMError) -> bool:
+    """Transport failures, timeouts, rate limiting and 5xx are worth another attempt"""
+    return isinstance(error, LLMUnavailableError) or error.status_code in RETRYABLE_STATUS
+
+
+class CircuitOpenError(LLMUnavailableError):
+    """The circuit breaker is open, so the upstream was not called"""
+
+    def __init__(self):
+        super().__init__("DeepSeek API is temporarily unavailable. Please try again later.")
+
+
+class CircuitBreaker:
+    """Closed -> open after ``failure_threshold`` consecutive failures; one probe after ``cooldown``"""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        now = time.monotonic()
+        if self.state == self.OPEN and now - self.opened_at >= self.cooldown:
+            self.state = self.HALF_OPEN
+            self._probing = False
+        # A probe that never reported back (e.g. a cancelled request) is replaced after a cooldown
+        if self.state == self.HALF_OPEN and (not self._probing or now - self._probe_started >= self.cooldown):
+            self._probing = True
+            self._probe_started = now
+            return True
+        return False
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info("DeepSeek circuit breaker closed")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"DeepSeek circuit breaker opened after {self.failures} failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class RetryBudget:
+    """Token bucket capping retries and hedges at a fraction of requests.
+
+    Every request deposits ``ratio`` tokens (up to ``capacity``) and every
+    retry or hedge spends one, so a struggling upstream sees at most about
+    ``1 + ratio`` times the normal load instead of a retry storm.
+    """
+
+    def __init__(self, ratio: float = 0.1, capacity: float = 10.0):
+        self.ratio = ratio
+        self.capacity = capacity
+        self.tokens = capacity
+
+    def deposit(self):
+        self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        GATEWAY_EVENTS.inc(event="budget_exhausted")
+        return False
+
+
+class LLMGateway:
+    """Resilient front for the DeepSeek client(s).
+
+    * Hedging: if the primary has not answered after its recent p95
+      latency (at least ``hedge_min_delay``), a second identical request is
+      sent and the first answer wins.
+    * Retries: retryable failures are retried up to ``max_retries`` times
+      with jittered backoff. Retries and hedges share a ``RetryBudget``.
+    * Circuit breaker: after repeated failures the primary is skipped for
+      ``breaker_cooldown`` seconds, then probed with a single request.
+    * Fallback: when the primary fails or is short-circuited, an optional
+      secondary client (another endpoint or model) is tried. If there is
+      none, the error propagates so callers can fall back themselves, e.g.
+      to a knowledge base answer.
+
+    Streams are retried or failed over only before their first chunk.
+    Attempts never outlive the request deadline; running out of it raises
+    ``DeadlineExceeded``, which does not count against the breaker.
+    """
+
+    def __init__(self, primary: DeepSeekClient, fallback: Optional[DeepSeekClient] = None,
+                 hedge: Optional[bool] = None, hedge_min_delay: Optional[float] = None,
+                 max_retries: Optional[int] = None, retry_budget: Optional[float] = None,
+                 attempt_timeout: Optional[float] = None, breaker_failures: Optional[int] = None,
+                 breaker_cooldown: Optional[float] = None):
+        self.primary = primary
+        self.fallback = fallback
+        self.hedge = hedge if hedge is not None else _env_bool("LLM_HEDGE", True)
+        self.hedge_min_delay = hedge_min_delay or _env_float("LLM_HEDGE_MIN_DELAY", 1.0)
+        self.max_retries = max_retries if max_retries is not None else _env_int("LLM_MAX_RETRIES", 1)
+        self.budget = RetryBudget(retry_budget if retry_budget is not None else _env_float("LLM_RETRY_BUDGET", 0.1))
+        self.attempt_timeout = attempt_timeout or _env_float("LLM_ATTEMPT_TIMEOUT", 30.0)
+        self.breaker = CircuitBreaker(breaker_failures or _env_int("LLM_BREAKER_FAILURES", 5),
+                                      breaker_cooldown or _env_float("LLM_BREAKER_COOLDOWN", 30.0))
+        self._latencies: Deque[float] = deque(maxlen=200)
+
+    @classmethod
+    def from_env(cls, primary: DeepSeekClient) -> "LLMGateway":
+        """Gateway with a secondary client when LLM_FALLBACK_BASE_URL or LLM_FALLBACK_MODEL is set"""
+        fallback = None
+        base_url = os.getenv("LLM_FALLBACK_BASE_URL")
+        model = os.getenv("LLM_FALLBACK_MODEL")
+        if base_url or model:
+            fallback = DeepSeekClient(api_key=os.getenv("LLM_FALLBACK_API_KEY") or primary.api_key,
+                                      base_url=base_url or primary.base_url,
+                                      model=model or primary.model, name="deepseek_fallback")
+        return cls(primary, fallback)
+
+    def hedge_delay(self) -> Optional[float]:
+        """p95 of recent primary latencies, once there are enough samples"""
+        if not self.hedge or len(self._latencies) < 20:
+            return None
+        ordered = sorted(self._latencies)
+        return max(self.hedge_min_delay, ordered[int(len(ordered) * 0.95) - 1])
+
+    def _timeout(self, stage: str) -> float:
+        """Attempt timeout, cut to the request deadline"""
+        timeout = deadline.cap(self.attempt_timeout)
+        if timeout <= 0:
+            raise DeadlineExceeded(stage)
+        return timeout
+
+    async def _attempt(self, client: DeepSeekClient, messages: List[Dict], params: Dict) -> Dict:
+        start = time.perf_counter()
+        timeout = self._timeout("llm")
+        try:
+            result = await asyncio.wait_for(client.chat_completion(messages, **params), timeout)
+        except asyncio.TimeoutError:
+            if timeout < self.attempt_timeout:
+                raise DeadlineExceeded("llm")
+            raise LLMUnavailableError("DeepSeek API did not answer in time. Please try again later.")
+        if client is self.primary:
+            self._latencies.append(time.perf_counter() - start)
+        return result
+
+    async def _hedged(self, messages: List[Dict], params: Dict) -> Dict:
+        tasks = [asyncio.ensure_future(self._attempt(self.primary, messages, params))]
+        try:
+            delay = self.hedge_delay()
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and self.budget.withdraw():
+                    GATEWAY_EVENTS.inc(event="hedge")
+                    tasks.append(asyncio.ensure_future(self._attempt(self.primary, messages, params)))
+            error: Optional[BaseException] = None
+            pending = list(tasks)
+            while pending:
+                done, still_pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                pending = list(still_pending)
+                for task in done:
+                    if task.exception() is None:
+                        if len(tasks) > 1 and task is tasks[1]:
+                            GATEWAY_EVENTS.inc(event="hedge_won")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                    # Retrieve the loser's outcome so it is not reported as unhandled
+                    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    async def _primary(self, messages: List[Dict], params: Dict) -> Dict:
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                GATEWAY_EVENTS.inc(event="short_circuit")
+                raise CircuitOpenError()
+            try:
+                result = await self._hedged(messages, params)
+            except LLMError as e:
+                if not is_retryable(e):
+                    raise
+                self.breaker.record_failure()
+                if attempt >= self.max_retries or not self.budget.withdraw():
+                    raise
+                attempt += 1
+                GATEWAY_EVENTS.inc(event="retry")
+                await asyncio.sleep(random.uniform(0, 0.1 * 2 ** attempt))
+                continue
+            self.breaker.record_success()
+            return result
+
+    async def chat_completion(self, messages: List[Dict], **params) -> Dict:
+        """Chat completion through hedging, retries, the circuit breaker and the fallback client"""
+        self.budget.deposit()
+        try:
+            return await self._primary(messages, params)
+        except LLMError as e:
+            if self.fallback is None or not is_retryable(e):
+                raise
+            GATEWAY_EVENTS.inc(event="fallback")
+            logger.warning(f"Falling back to {self.fallback.model} at {self.fallback.base_url}: {e.detail}")
+            return await self._attempt(self.fallback, messages, params)
+
+    async def _open_stream(self, client: DeepSeekClient, messages: List[Dict], params: Dict):
+        """Start a stream and wait for its first chunk; returns (stream, first chunk or None)"""
+        timeout = self._timeout("llm")
+        stream = client.stream_chat_completion(messages, **params)
+        try:
+            first = await asyncio.wait_for(stream.__anext__(), timeout)
+        except StopAsyncIteration:
+            return stream, None
+        except asyncio.TimeoutError:
+            await stream.aclose()
+            if timeout < self.attempt_timeout:
+                raise DeadlineExceeded("llm")
+            raise LLMUnavailableError("DeepSeek API did not answer in time. Please try again later.")
+        except BaseException:
+            await stream.aclose()
+            raise
+        return stream, first
+
+    async def stream_chat_completion(self, messages: List[Dict], **params) -> AsyncIterator[Dict]:
+        """Streaming chat completion; retries and fallback apply until the first chunk arrives"""
+        self.budget.deposit()
+        stream, first, client = None, None, self.primary
+        attempt = 0
+        while stream is None:
+            try:
+                if not self.breaker.allow():
+                    GATEWAY_EVENTS.inc(event="short_circuit")
+                    raise CircuitOpenError()
+                stream, first = await self._open_stream(self.primary, messages, params)
+            except LLMError as e:
+                if not is_retryable(e):
+                    raise
+                if not isinstance(e, CircuitOpenError):
+                    self.breaker.record_failure()
+                    if attempt < self.max_retries and self.budget.withdraw():
+                        attempt += 1
+                        GATEWAY_EVENTS.inc(event="retry")
+                        await asyncio.sleep(random.uniform(0, 0.1 * 2 ** attempt))
+                        continue
+                if self.fallback is None:
+                    raise
+                GATEWAY_EVENTS.inc(event="fallback")
+                logger.warning(f"Falling back to {self.fallback.model} at {self.fallback.base_url}: {e.detail}")
+                client = self.fallback
+                stream, first = await self._open_stream(self.fallback, messages, params)
+
+        try:
+            if first is not None:
+                yield first
+                async for chunk in stream:
+                    yield chunk
+            if client is self.primary:
+                self.breaker.record_success()
+        except LLMError as e:
+            if client is self.primary and is_retryable(e):
+                self.breaker.record_failure()
+            raise
+        finally:
+            await stream.aclose()
+
+    async def aclose(self):
+        await self.primary.aclose()
+        if self.fallback is not None:
+            await self.fallback.aclose()
+
+    def stats(self) -> Dict:
+        delay = self.hedge_delay()
+        return {
+            "breaker": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "retry_budget_tokens": round(self.budget.tokens, 2),
+            "hedge_delay_seconds": delay,
+            "fallback": self.fallback.base_url if self.fallback is not None else None
+        }
+
+
+BREAKER_STATES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+
+
+def register_metrics(gateway: LLMGateway):
+    gauge("helpdesk_llm_circuit_state", "DeepSeek circuit breaker state (0 closed, 1 half-open, 2 open)",
+          fn=lambda: BREAKER_STATES[gateway.breaker.state])
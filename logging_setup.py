@@ -0,0 +1,240 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from google.cloud import logging as cloud_logging
+from google.cloud.logging.handlers import setup_logging as attach_handler
+
+logger = logging.getLogger(__name__)
+
+# Id of the request being handled, attached to every record logged for it
+request_id: contextvars.ContextVar = contextvars.ContextVar("request_id", default=None)
+
+_listener: Optional["BatchingQueueListener"] = None
+_queue_handler: Optional["DroppingQueueHandler"] = None
+_setup_lock = threading.Lock()
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with ``json_fields`` merged in (local/stdout fallback)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "severity": record.levelname,
+            "time": self.formatTime(record),
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        entry.update(getattr(record, "json_fields", None) or {})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Adds the current request id to ``json_fields``"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        current = request_id.get()
+        if current is not None:
+            fields = dict(getattr(record, "json_fields", None) or {})
+            fields.setdefault("request_id", current)
+            record.json_fields = fields
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BatchingQueueListener:
+    """Drain a log queue on a background thread, handing records over in batches.
+
+    Up to ``batch_size`` records, or whatever arrived within
+    ``flush_interval`` seconds, are written together: stream handlers get
+    one write and one flush per batch, other handlers (e.g. the Cloud
+    Logging transport, which batches API calls itself) get each record and
+    a single flush.
+    """
+
+    def __init__(self, log_queue: queue.Queue, handlers: List[logging.Handler],
+                 batch_size: int = 100, flush_interval: float = 0.5):
+        self.queue = log_queue
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.batches = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def _drain(self, timeout: float) -> List[logging.LogRecord]:
+        batch: List[logging.LogRecord] = []
+        deadline = time.monotonic() + timeout
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[logging.LogRecord]):
+        self.batches += 1
+        for handler in self.handlers:
+            records = [record for record in batch if record.levelno >= handler.level]
+            if not records:
+                continue
+            try:
+                if isinstance(handler, logging.StreamHandler) and not isinstance(handler, logging.FileHandler):
+                    lines = [handler.format(record) for record in records if handler.filter(record)]
+                    if lines:
+                        with handler.lock:
+                            handler.stream.write(handler.terminator.join(lines) + handler.terminator)
+                            handler.flush()
+                else:
+                    for record in records:
+                        handler.handle(record)
+                    handler.flush()
+            except Exception:
+                handler.handleError(records[-1])
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._drain(self.flush_interval)
+            if batch:
+                self._write(batch)
+        # Flush whatever is still queued at shutdown
+        while True:
+            batch = self._drain(0)
+            if not batch:
+                break
+            self._write(batch)
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+def _destination_handler() -> logging.Handler:
+    """Cloud Logging handler for this environment, or JSON lines on stderr"""
+    if os.getenv("LOG_DESTINATION", "cloud") == "cloud":
+        try:
+            return cloud_logging.Client().get_default_handler()
+        except Exception as e:
+            logger.warning(f"Cloud Logging unavailable, logging to stderr: {str(e)}")
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def setup_logging():
+    """Route logging through a background queue to Cloud Logging; safe to call repeatedly"""
+    global _listener, _queue_handler
+    with _setup_lock:
+        if _queue_handler is not None:
+            return
+        level = getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO)
+        log_queue: queue.Queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+        _queue_handler = DroppingQueueHandler(log_queue)
+        _queue_handler.addFilter(RequestContextFilter())
+        _listener = BatchingQueueListener(
+            log_queue, [_destination_handler()],
+            batch_size=int(os.getenv("LOG_BATCH_SIZE", "100")),
+            flush_interval=_env_float("LOG_FLUSH_INTERVAL", 0.5)
+        )
+        _listener.start()
+        attach_handler(_queue_handler, log_level=level)
+        # httpx logs every upstream request at INFO; the chat summary already covers them
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def dropped_records() -> int:
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+def new_request_id(headers: Optional[Dict[str, str]] = None) -> str:
+    """Use the caller's X-Request-ID or Cloud Run trace id when present"""
+    headers = headers or {}
+    incoming = headers.get("x-request-id") or headers.get("x-cloud-trace-context", "").split("/")[0]
+    return incoming[:64] if incoming else uuid.uuid4().hex
+
+
+def sample_payload() -> bool:
+    """Whether this request's message and answer text should be logged"""
+    rate = _env_float("LOG_PAYLOAD_SAMPLE_RATE", 0.0)
+    return rate > 0 and random.random() < rate
+
+
+def truncate(text: Optional[str]) -> Optional[str]:
+    limit = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "2000"))
+    if text is None or len(text) <= limit:
+        return text
+    return text[:limit] + f"... [{len(text) - limit} more chars]"
+
+
+class RequestIdMiddleware:
+    """ASGI middleware binding a request id to the logging context and echoing it as X-Request-ID"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1")
+                   for key, value in scope.get("headers", [])}
+        current = new_request_id(headers)
+        token = request_id.set(current)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = dict(message, headers=list(message.get("headers", []))
+                               + [(b"x-request-id", current.encode("latin-1"))])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id.reset(token)
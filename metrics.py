@@ -0,0 +1,293 @@
+import bisect
+import contextlib
+import contextvars
+import functools
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(labelnames: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 fn: Optional[Callable[[], object]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _samples(self) -> Dict[LabelValues, float]:
+        if self.fn is None:
+            with self._lock:
+                return dict(self._values)
+        value = self.fn()
+        if isinstance(value, dict):
+            return {key if isinstance(key, tuple) else (str(key),): float(v) for key, v in value.items()}
+        return {(): float(value)}
+
+    def get(self, **labels) -> float:
+        return self._samples().get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self._samples().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    @contextlib.contextmanager
+    def track_inprogress(self, **labels) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # One counter per bucket, then +Inf count and sum
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return int(sum(series[:-1])) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series_items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in series_items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-1])}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = (), fn=None) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames, fn))
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = (), fn=None) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames, fn))
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# Metrics shared across modules
+STAGE_SECONDS = histogram("helpdesk_stage_seconds", "Duration of each chat pipeline stage", ["stage"])
+KB_OPERATION_SECONDS = histogram("helpdesk_kb_operation_seconds",
+                                 "Duration of GCPKnowledgeBase operations", ["method"])
+KB_OPERATION_ERRORS = counter("helpdesk_kb_operation_errors_total",
+                              "GCPKnowledgeBase operations that raised", ["method"])
+UPSTREAM_REQUESTS = counter("helpdesk_upstream_requests_total",
+                            "Upstream requests by outcome (HTTP status or error kind)", ["upstream", "status"])
+UPSTREAM_SECONDS = histogram("helpdesk_upstream_request_seconds",
+                             "Upstream request latency until headers", ["upstream"])
+UPSTREAM_IN_FLIGHT = gauge("helpdesk_upstream_in_flight", "Upstream requests in flight", ["upstream"])
+LLM_TOKENS = counter("helpdesk_llm_tokens_total", "Tokens reported in DeepSeek usage blocks", ["kind"])
+CHAT_ANSWERS = counter("helpdesk_chat_answers_total",
+                       "Chat answers by source (llm, cache or knowledge base fast path)", ["source"])
+HTTP_REQUEST_SECONDS = histogram("helpdesk_http_request_seconds", "HTTP request latency",
+                                 ["handler", "method", "status"])
+HTTP_IN_FLIGHT = gauge("helpdesk_http_requests_in_flight", "HTTP requests in flight")
+
+
+# Per-request stage timings, reported in the Server-Timing header
+_request_timings: contextvars.ContextVar = contextvars.ContextVar("request_timings", default=None)
+
+
+@contextlib.contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a pipeline stage into STAGE_SECONDS and the current request's Server-Timing"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((name, elapsed))
+
+
+def request_timings() -> Dict[str, float]:
+    """Stage durations in milliseconds recorded so far for the current request"""
+    timings = _request_timings.get() or []
+    return {name: round(elapsed * 1000, 1) for name, elapsed in timings}
+
+
+@contextlib.contextmanager
+def timed_phase(phases: Dict[str, float], name: str) -> Iterator[None]:
+    """Record the block's duration in milliseconds as ``phases[name]`` (e.g. startup phases)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def timed_kb_operation(method: str):
+    """Decorator recording latency and errors of an async knowledge base method"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            except Exception:
+                KB_OPERATION_ERRORS.inc(method=method)
+                raise
+            finally:
+                KB_OPERATION_SECONDS.observe(time.perf_counter() - start, method=method)
+        return wrapper
+    return decorator
+
+
+def record_usage(usage: Optional[Dict]):
+    """Count tokens from a DeepSeek ``usage`` block"""
+    if not usage:
+        return
+    for kind in ("prompt_tokens", "completion_tokens", "total_tokens",
+                 "prompt_cache_hit_tokens", "prompt_cache_miss_tokens"):
+        if usage.get(kind):
+            LLM_TOKENS.inc(usage[kind], kind=kind[:-len("_tokens")])
+
+
+def server_timing(timings: List[Tuple[str, float]]) -> str:
+    return ", ".join(f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in timings)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request metrics and adding a Server-Timing header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: List[Tuple[str, float]] = []
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        def handler_name() -> str:
+            endpoint = scope.get("endpoint")
+            if endpoint is not None:
+                return getattr(endpoint, "__name__", "unknown")
+            return "static" if scope["path"].startswith("/static") else "unmatched"
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if timings:
+                    headers = list(message.get("headers", []))
+                    total = ("total", time.perf_counter() - start)
+                    headers.append((b"server-timing", server_timing(timings + [total]).encode()))
+                    message = dict(message, headers=headers)
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, handler=handler_name(),
+                                         method=scope["method"], status=str(status["code"]))
+            _request_timings.reset(token)
@@ -0,0 +1,259 @@
+import json
+import logging
+import math
+import os
+import re
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional
+
+from metrics import histogram
+from search_index import tokenize
+
+_ESTIMATE_RE = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+_BLOCK_RE = re.compile(r"\n\s*\n")
+
+logger = logging.getLogger(__name__)
+
+INSTRUCTIONS = """You are an expert IT support engineer for our help desk.
+
+Answer the user's question using the knowledge base material provided, and your own expertise where it does not cover the question.
+- Prefer the knowledge base: follow its steps, names and links exactly rather than inventing alternatives.
+- Give numbered steps for procedures and keep each step short and actionable.
+- If the question is ambiguous, state the most likely interpretation and answer it.
+- If the issue may need hands-on help (hardware faults, account lockouts, suspected security incidents), say when to contact IT support.
+- Never ask for or repeat passwords or other secrets.
+- Answer in the language of the question."""
+
+PROMPT_CONTEXT_TOKENS = histogram("helpdesk_prompt_context_tokens", "Estimated knowledge base tokens per prompt",
+                                  buckets=(50, 100, 200, 400, 800, 1200, 1600, 2400, 3200, 6400))
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough BPE token count: one per word, number or symbol, more for long words"""
+    return sum(1 + len(piece) // 8 for piece in _ESTIMATE_RE.findall(text))
+
+
+class Passage:
+    def __init__(self, article_rank: int, position: int, text: str):
+        self.article_rank = article_rank
+        self.position = position
+        self.text = text
+        self.tokens = estimate_tokens(text)
+        self.terms = Counter(tokenize(text))
+        self.length = sum(self.terms.values())
+        self.score = 0.0
+
+
+def load_glossary(path: str) -> List[str]:
+    """'category: keywords' lines from the ``categories`` of a knowledge_base.json file"""
+    try:
+        with open(path, "r") as f:
+            categories = json.load(f).get("categories") or {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"No category glossary loaded from {path}: {str(e)}")
+        return []
+    if isinstance(categories, list):
+        return [str(category) for category in categories]
+    return [f"{name}: {', '.join(info.get('keywords', []))}" for name, info in sorted(categories.items())]
+
+
+def split_passages(content: str, max_tokens: int) -> List[str]:
+    """Split article text on blank lines, packing long blocks line by line up to ``max_tokens``"""
+    passages: List[str] = []
+    for block in _BLOCK_RE.split(content.strip()):
+        block = block.strip()
+        if not block:
+            continue
+        if estimate_tokens(block) <= max_tokens:
+            passages.append(block)
+            continue
+        current: List[str] = []
+        current_tokens = 0
+        for line in block.splitlines():
+            line_tokens = estimate_tokens(line)
+            if current and current_tokens + line_tokens > max_tokens:
+                passages.append("\n".join(current))
+                current, current_tokens = [], 0
+            current.append(line)
+            current_tokens += line_tokens
+        if current:
+            passages.append("\n".join(current))
+    # Headings on their own are useless context; attach them to the next passage
+    merged: List[str] = []
+    for passage in passages:
+        if merged and estimate_tokens(merged[-1]) < 12 and merged[-1].lstrip().startswith("#"):
+            merged[-1] = f"{merged[-1]}\n{passage}"
+        else:
+            merged.append(passage)
+    return merged
+
+
+class PromptBuilder:
+    """Assemble chat prompts: a stable, cacheable prefix and a budgeted, query-specific context.
+
+    The system message is byte-identical across requests: fixed
+    instructions, a glossary of the knowledge base categories and the full
+    text of pinned high-traffic articles. Upstream prefix caching can then
+    reuse it, and everything request-specific goes in the final user
+    message. It only changes when a pinned article (or a configured pinned
+    title) is added, changed or deleted.
+
+    Candidate articles are split into passages, which are ranked against
+    the query with BM25 (an article's title counts towards its opening
+    passage). Matching passages are added best first until
+    ``context_tokens`` is spent, then rendered grouped by article in retrieval order, with the
+    passages of each article in their original order. Short articles fit
+    whole; long guides contribute only their relevant sections.
+    """
+
+    def __init__(self, context_tokens: Optional[int] = None, passage_tokens: Optional[int] = None,
+                 k1: float = 1.2, b: float = 0.75, glossary_path: Optional[str] = None,
+                 pinned: Optional[List[str]] = None, pinned_tokens: Optional[int] = None):
+        self.context_tokens = context_tokens or int(os.getenv("PROMPT_CONTEXT_TOKENS", "1000"))
+        self.passage_tokens = passage_tokens or int(os.getenv("PROMPT_PASSAGE_TOKENS", "150"))
+        self.k1 = k1
+        self.b = b
+        self.glossary = load_glossary(glossary_path or os.getenv("PROMPT_GLOSSARY_FILE", "knowledge_base.json"))
+        if pinned is None:
+            pinned = [item.strip() for item in os.getenv(
+                "PROMPT_PINNED_ARTICLES",
+                "Password Reset Guide,VPN Connection Guide,Slow Computer Troubleshooting,Email Access Issues"
+            ).split(",") if item.strip()]
+        self.pinned = pinned
+        self.pinned_tokens = pinned_tokens or int(os.getenv("PROMPT_PINNED_TOKENS", "1500"))
+        self.pinned_articles: List[Dict] = []
+        self.prefix = self._build_prefix()
+
+    def _build_prefix(self) -> str:
+        parts = [INSTRUCTIONS]
+        if self.glossary:
+            parts.append("Knowledge base categories and their keywords:\n" +
+                         "\n".join(f"- {line}" for line in self.glossary))
+        if self.pinned_articles:
+            parts.append("Frequently used knowledge base articles:\n\n" + "".join(
+                f"Article: {article['title']}\nContent: {article['content']}\n\n"
+                for article in self.pinned_articles).rstrip())
+        return "\n\n".join(parts)
+
+    def set_pinned(self, articles: Iterable[Dict]):
+        """Resolve the configured pinned ids/titles against ``articles`` and rebuild the prefix"""
+        by_key: Dict[str, Dict] = {}
+        for article in articles:
+            by_key.setdefault(str(article.get("id")), article)
+            by_key.setdefault(str(article.get("title", "")).lower(), article)
+        resolved, remaining = [], self.pinned_tokens
+        for key in self.pinned:
+            article = by_key.get(key) or by_key.get(key.lower())
+            if article is None or any(article.get("id") == chosen.get("id") for chosen in resolved):
+                continue
+            cost = estimate_tokens(article.get("title", "")) + estimate_tokens(article.get("content", "")) + 4
+            if cost > remaining:
+                continue
+            resolved.append({key: article.get(key) for key in ("id", "title", "content")})
+            remaining -= cost
+        self.pinned_articles = resolved
+        self.prefix = self._build_prefix()
+        logger.info(f"Prompt prefix rebuilt with {len(resolved)} pinned articles "
+                    f"(~{estimate_tokens(self.prefix)} tokens)")
+
+    @property
+    def pinned_ids(self) -> List[str]:
+        return [article["id"] for article in self.pinned_articles]
+
+    def affects_pinned(self, upserts: Iterable[Dict], deletes: Iterable[str]) -> bool:
+        """Whether changed or deleted articles can change the pinned set or its text"""
+        pinned_ids = {str(article_id) for article_id in self.pinned_ids}
+        if any(str(article_id) in pinned_ids for article_id in deletes):
+            return True
+        keys = {key.lower() for key in self.pinned}
+        # A configured title that was missing (or an id not yet written) may just have appeared
+        return any(str(article.get("id")) in pinned_ids or str(article.get("id")).lower() in keys
+                   or str(article.get("title", "")).lower() in keys for article in upserts)
+
+    def on_index_change(self, upserts: List[Dict], deletes: List[str], reset: bool,
+                        articles: Callable[[], Iterable[Dict]]):
+        """``SearchIndex`` listener; ``articles`` returns every indexed article"""
+        try:
+            if reset:
+                self.set_pinned(upserts)
+            elif self.affects_pinned(upserts, deletes):
+                self.set_pinned(articles())
+        except Exception as e:
+            logger.error(f"Error rebuilding the prompt prefix: {str(e)}")
+
+    def build_messages(self, query: str, articles: List[Dict]) -> List[Dict]:
+        """System message with the stable prefix, then the query-specific context and question"""
+        pinned_ids = set(self.pinned_ids)
+        context = self.context(query, [article for article in articles if article.get("id") not in pinned_ids])
+        user_message = query
+        if context:
+            user_message = f"Relevant knowledge base articles:\n\n{context}Question: {query}"
+        return [
+            {"role": "system", "content": self.prefix},
+            {"role": "user", "content": user_message}
+        ]
+
+    def _score(self, query: str, articles: List[Dict], passages: List[Passage]):
+        query_terms = set(tokenize(query))
+        if not query_terms or not passages:
+            return
+        titles = [Counter(tokenize(article.get("title", ""))) for article in articles]
+        avg_len = sum(passage.length for passage in passages) / len(passages) or 1.0
+        document_frequency = Counter(term for passage in passages for term in set(passage.terms))
+        for passage in passages:
+            norm = self.k1 * (1 - self.b + self.b * passage.length / avg_len)
+            for term in query_terms:
+                tf = passage.terms.get(term, 0)
+                if passage.position == 0:
+                    tf += titles[passage.article_rank].get(term, 0)
+                if not tf:
+                    continue
+                df = document_frequency.get(term, 0)
+                idf = math.log(1 + (len(passages) - df + 0.5) / (df + 0.5))
+                passage.score += idf * tf * (self.k1 + 1) / (tf + norm)
+
+    def select(self, query: str, articles: List[Dict], budget: Optional[int] = None) -> Dict[int, List[Passage]]:
+        """Best passages per article rank, within ``budget`` (default ``context_tokens``) tokens"""
+        budget = budget or self.context_tokens
+        passages = [Passage(rank, position, text)
+                    for rank, article in enumerate(articles)
+                    for position, text in enumerate(split_passages(article.get("content", ""), self.passage_tokens))]
+        self._score(query, articles, passages)
+
+        # Article headers count against the budget too
+        headers = {rank: estimate_tokens(article.get("title", "")) + 4 for rank, article in enumerate(articles)}
+        ranked = sorted((p for p in passages if p.score > 0), key=lambda p: (-p.score, p.article_rank, p.position))
+        if not ranked:
+            # Nothing matched the query: fall back to the articles' leading passages
+            ranked = sorted(passages, key=lambda p: (p.article_rank, p.position))
+
+        selected: Dict[int, List[Passage]] = {}
+        remaining = budget
+        for passage in ranked:
+            cost = passage.tokens + (0 if passage.article_rank in selected else headers[passage.article_rank])
+            if cost > remaining:
+                continue
+            selected.setdefault(passage.article_rank, []).append(passage)
+            remaining -= cost
+        for chosen in selected.values():
+            chosen.sort(key=lambda p: p.position)
+        PROMPT_CONTEXT_TOKENS.observe(budget - remaining)
+        return selected
+
+    @staticmethod
+    def _join(chosen: List[Passage]) -> str:
+        parts = [chosen[0].text]
+        for previous, passage in zip(chosen, chosen[1:]):
+            parts.append(("\n\n" if passage.position == previous.position + 1 else "\n\n...\n\n") + passage.text)
+        return "".join(parts)
+
+    def context(self, query: str, articles: List[Dict]) -> str:
+        """Render the selected passages as 'Article/Content' blocks"""
+        selected = self.select(query, articles)
+        return "".join(f"Article: {articles[rank]['title']}\nContent: {self._join(selected[rank])}\n\n"
+                       for rank in sorted(selected))
+
+    def excerpt(self, query: str, article: Dict, budget: int) -> str:
+        """The passages of one article most relevant to ``query``, within ``budget`` tokens"""
+        selected = self.select(query, [article], budget)
+        return self._join(selected[0]) if selected else ""
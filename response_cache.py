@@ -0,0 +1,191 @@
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# Words in any script; a trailing + or # stays part of the word ("c++", "c#")
+_TOKEN_RE = re.compile(r"\w+[+#]*")
+
+
+def normalize_query(query: str) -> str:
+    """Casefold, strip punctuation and collapse whitespace; a query without words is only stripped"""
+    return " ".join(_TOKEN_RE.findall(query.casefold())) or query.strip()
+
+
+def query_vector(normalized: str, dims: int = 1 << 16) -> Dict[int, float]:
+    """Hashed unigram + bigram vector (L2-normalized) of a normalized query"""
+    tokens = normalized.split()
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    vector: Dict[int, float] = {}
+    for feature in features:
+        bucket = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "big") % dims
+        vector[bucket] = vector.get(bucket, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in vector.values()))
+    if norm:
+        for bucket in vector:
+            vector[bucket] /= norm
+    return vector
+
+
+def cosine(a: Dict[int, float], b: Dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(bucket, 0.0) for bucket, value in a.items())
+
+
+def context_signature(articles: List[Dict]) -> Tuple[Tuple[str, str], ...]:
+    """Identify the KB context by article ids and revisions"""
+    return tuple((str(article.get("id")), str(article.get("updated_at"))) for article in articles)
+
+
+class _Entry:
+    __slots__ = ("key", "value", "vector", "article_ids", "size", "expires_at")
+
+    def __init__(self, key, value, vector, article_ids, size, expires_at):
+        self.key = key
+        self.value = value
+        self.vector = vector
+        self.article_ids = article_ids
+        self.size = size
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """LRU/TTL cache of chat answers keyed on query, language and KB context.
+
+    Exact lookups use the normalized query; when ``similarity_threshold`` is
+    below 1.0 a miss falls back to the closest cached query with the same
+    language and KB context.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                 ttl: Optional[float] = None, similarity_threshold: Optional[float] = None,
+                 enabled: Optional[bool] = None):
+        self.max_entries = max_entries or int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+        self.max_bytes = max_bytes or int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+        self.ttl = ttl or float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+        self.similarity_threshold = (similarity_threshold if similarity_threshold is not None
+                                     else float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.9")))
+        self.enabled = (enabled if enabled is not None
+                        else os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes"))
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        self._by_context: Dict[tuple, set] = {}
+        self._by_article: Dict[str, set] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, query: str, language: str, articles: List[Dict]) -> Optional[Dict]:
+        """Return a cached answer for this query and KB context, if any"""
+        if not self.enabled:
+            return None
+        normalized = normalize_query(query)
+        if not normalized:
+            return None
+        context = (language, context_signature(articles))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((normalized,) + context)
+            if entry is not None and entry.expires_at <= now:
+                self._remove(entry)
+                entry = None
+
+            if entry is None and self.similarity_threshold < 1.0:
+                vector = query_vector(normalized)
+                best_score = self.similarity_threshold
+                for key in list(self._by_context.get(context, ())):
+                    candidate = self._entries[key]
+                    if candidate.expires_at <= now:
+                        self._remove(candidate)
+                        continue
+                    score = cosine(vector, candidate.vector)
+                    if score >= best_score:
+                        entry, best_score = candidate, score
+                if entry is not None:
+                    self.near_hits += 1
+
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(entry.key)
+            return entry.value
+
+    def put(self, query: str, language: str, articles: List[Dict], value: Dict):
+        """Cache an answer for this query and KB context"""
+        if not self.enabled:
+            return
+        normalized = normalize_query(query)
+        if not normalized:
+            return
+        context = (language, context_signature(articles))
+        key = (normalized,) + context
+        size = len(json.dumps(value, default=str).encode()) + len(normalized)
+        if size > self.max_bytes:
+            return
+        entry = _Entry(key, value, query_vector(normalized),
+                       [article_id for article_id, _ in context[1]], size,
+                       time.monotonic() + self.ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(self._entries[key])
+            self._entries[key] = entry
+            self._by_context.setdefault(context, set()).add(key)
+            for article_id in entry.article_ids:
+                self._by_article.setdefault(article_id, set()).add(key)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries.values())))
+                self.evictions += 1
+
+    def invalidate_article(self, article_id: str):
+        """Drop every cached answer that used the given article as context"""
+        with self._lock:
+            for key in list(self._by_article.get(str(article_id), ())):
+                self._remove(self._entries[key])
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_context.clear()
+            self._by_article.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+    def _remove(self, entry: _Entry):
+        self._entries.pop(entry.key, None)
+        context = entry.key[1:]
+        keys = self._by_context.get(context)
+        if keys is not None:
+            keys.discard(entry.key)
+            if not keys:
+                del self._by_context[context]
+        for article_id in entry.article_ids:
+            keys = self._by_article.get(article_id)
+            if keys is not None:
+                keys.discard(entry.key)
+                if not keys:
+                    del self._by_article[article_id]
+        self._bytes -= entry.size
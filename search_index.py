@@ -0,0 +1,230 @@
+import bisect
+import hashlib
+import heapq
+import json
+import math
+import re
+import threading
+from collections import Counter
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from how i if in into is it its me my
+no not of on or our so that the their then there these this to was we what when
+where which who why will with you your
+""".split())
+
+# Relative weight of a term occurrence in each field (BM25F-style)
+FIELD_WEIGHTS = {"title": 3.0, "tags": 2.0, "content": 1.0}
+
+# Article fields covered by content_hash(); bulk imports skip documents whose hash is unchanged
+CONTENT_FIELDS = ("title", "content", "category", "tags")
+
+# Called with (upserts, deletes, reset) after every index change, while the index lock is held
+ChangeListener = Callable[[List[Dict], List[str], bool], None]
+
+
+@lru_cache(maxsize=1 << 16)
+def stem(token: str) -> str:
+    """Very light suffix stripping so 'printers'/'printing' match 'printer'"""
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(token) > len(suffix) + 2 and token.endswith(suffix) and not token.endswith("ss"):
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, split on non-alphanumerics, drop stopwords and stem"""
+    return [stem(token) for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def weighted_terms(article: Dict) -> Dict[str, float]:
+    """Terms of an article's title, tags and content, weighted by FIELD_WEIGHTS"""
+    terms: Counter = Counter()
+    for token in tokenize(article.get("title") or ""):
+        terms[token] += FIELD_WEIGHTS["title"]
+    for tag in article.get("tags") or []:
+        for token in tokenize(tag):
+            terms[token] += FIELD_WEIGHTS["tags"]
+    for token in tokenize(article.get("content") or ""):
+        terms[token] += FIELD_WEIGHTS["content"]
+    return dict(terms)
+
+
+def content_hash(article: Dict) -> str:
+    """Stable hash of an article's content fields"""
+    content = {field: article.get(field) for field in CONTENT_FIELDS}
+    return hashlib.sha256(json.dumps(content, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:32]
+
+
+class SearchIndex:
+    """In-memory inverted index over articles with BM25 ranking.
+
+    Articles are indexed on title, tags and content with per-field weights.
+    All mutations and searches take a lock so the index can be updated from
+    background sync threads while requests are being served. Derived
+    indexes (e.g. article vectors) follow along through ``add_listener``.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._articles: Dict[str, Dict] = {}
+        self._doc_terms: Dict[str, Dict[str, float]] = {}
+        self._doc_len: Dict[str, float] = {}
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._total_len = 0.0
+        self._listeners: List[ChangeListener] = []
+        self.generation = 0
+        # Article ids in document id order as of _sorted_generation, for paging
+        self._sorted_ids: List[str] = []
+        self._sorted_generation = -1
+
+    def __len__(self) -> int:
+        return len(self._articles)
+
+    def __contains__(self, article_id: str) -> bool:
+        return article_id in self._articles
+
+    def add_listener(self, listener: ChangeListener):
+        """Register a callback applying every change (or, with ``reset``, the full contents) elsewhere"""
+        self._listeners.append(listener)
+
+    def _notify(self, upserts: List[Dict], deletes: List[str], reset: bool = False):
+        for listener in self._listeners:
+            listener(upserts, deletes, reset)
+
+    def _add(self, article: Dict):
+        article_id = str(article["id"])
+        if article_id in self._articles:
+            self._remove(article_id)
+        terms = weighted_terms(article)
+        length = sum(terms.values())
+        self._articles[article_id] = dict(article)
+        self._doc_terms[article_id] = terms
+        self._doc_len[article_id] = length
+        self._total_len += length
+        for term, weight in terms.items():
+            self._postings.setdefault(term, {})[article_id] = weight
+
+    def _remove(self, article_id: str) -> bool:
+        if article_id not in self._articles:
+            return False
+        del self._articles[article_id]
+        for term in self._doc_terms.pop(article_id):
+            postings = self._postings[term]
+            del postings[article_id]
+            if not postings:
+                del self._postings[term]
+        self._total_len -= self._doc_len.pop(article_id)
+        return True
+
+    def add(self, article: Dict):
+        """Add or replace an article"""
+        with self._lock:
+            self._add(article)
+            self.generation += 1
+            self._notify([self._articles[str(article["id"])]], [])
+
+    def remove(self, article_id: str) -> bool:
+        """Remove an article; returns False if it was not indexed"""
+        with self._lock:
+            removed = self._remove(str(article_id))
+            if removed:
+                self.generation += 1
+                self._notify([], [str(article_id)])
+            return removed
+
+    def apply(self, upserts: Iterable[Dict] = (), deletes: Iterable[str] = ()) -> int:
+        """Apply a batch of changes atomically; returns the new generation"""
+        with self._lock:
+            upserts = list(upserts)
+            deletes = [str(article_id) for article_id in deletes]
+            for article in upserts:
+                self._add(article)
+            for article_id in deletes:
+                self._remove(article_id)
+            self.generation += 1
+            self._notify([self._articles[str(article["id"])] for article in upserts
+                          if str(article["id"]) in self._articles], deletes)
+            return self.generation
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            return list(self._articles)
+
+    def load(self, articles: Iterable[Dict]):
+        """Replace the whole index contents"""
+        with self._lock:
+            self._articles.clear()
+            self._doc_terms.clear()
+            self._doc_len.clear()
+            self._postings.clear()
+            self._total_len = 0.0
+            for article in articles:
+                self._add(article)
+            self.generation += 1
+            self._notify(list(self._articles.values()), [], reset=True)
+
+    def get(self, article_id: str) -> Optional[Dict]:
+        with self._lock:
+            article = self._articles.get(str(article_id))
+            return dict(article) if article is not None else None
+
+    def terms(self, article_id: str) -> Dict[str, float]:
+        """The weighted terms an article was indexed with (not a copy; empty if not indexed)"""
+        with self._lock:
+            return self._doc_terms.get(str(article_id), {})
+
+    def page(self, limit: int, after: Optional[str] = None) -> Tuple[List[Dict], bool]:
+        """Up to ``limit`` articles in id order (as Firestore orders ``__name__``) after ``after``,
+        and whether more follow"""
+        with self._lock:
+            if self._sorted_generation != self.generation:
+                self._sorted_ids = sorted(self._articles)
+                self._sorted_generation = self.generation
+            start = bisect.bisect_right(self._sorted_ids, after) if after else 0
+            ids = self._sorted_ids[start:start + limit + 1]
+            return [dict(self._articles[article_id]) for article_id in ids[:limit]], len(ids) > limit
+
+    def all_articles(self) -> List[Dict]:
+        with self._lock:
+            return [dict(article) for article in self._articles.values()]
+
+    def search(self, query: str, limit: Optional[int] = 10) -> List[Tuple[Dict, float]]:
+        """Return up to ``limit`` (article, score) pairs, best first.
+
+        An empty query matches every article with a score of 0.
+        """
+        terms = tokenize(query)
+        with self._lock:
+            if not terms:
+                articles = list(self._articles.values())
+                if limit is not None:
+                    articles = articles[:limit]
+                return [(dict(article), 0.0) for article in articles]
+
+            n_docs = len(self._articles)
+            if not n_docs:
+                return []
+            avg_len = self._total_len / n_docs
+            scores: Dict[str, float] = {}
+            for term in set(terms):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+                for article_id, tf in postings.items():
+                    norm = self.k1 * (1.0 - self.b + self.b * self._doc_len[article_id] / avg_len)
+                    scores[article_id] = scores.get(article_id, 0.0) + idf * tf * (self.k1 + 1.0) / (tf + norm)
+
+            if limit is None:
+                ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+            else:
+                ranked = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            return [(dict(self._articles[article_id]), score) for article_id, score in ranked]
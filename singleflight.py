@@ -0,0 +1,49 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one in-flight call.
+
+    The first caller for a key starts the work; callers arriving while it is
+    still running await the same task and receive its result or exception.
+    The shared task is shielded, so a disconnecting caller does not cancel
+    the work for everyone else.
+    """
+
+    def __init__(self, name: str = "singleflight"):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.collapsed = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is not None:
+            self.collapsed += 1
+        else:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception as retrieved even if every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def stats(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "collapsed": self.collapsed,
+            "in_flight": self.in_flight
+        }
@@ -0,0 +1,87 @@
+"""Shared fixtures: the service runs against the in-memory Google Cloud fakes of ``benchmarks/fakes.py``.
+
+The environment is fixed before anything imports ``agent``, which reads its
+configuration at import time. DeepSeek points at a closed port; tests that
+need a completion patch ``agent.llm_gateway``.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# The app serves frontend/ and reads knowledge_base.json relative to the working directory
+os.chdir(ROOT)
+
+os.environ.update({
+    "GCP_PROJECT_ID": "test",
+    "API_KEY": "test-key",
+    "DEEPSEEK_API_KEY": "test",
+    "DEEPSEEK_BASE_URL": "http://127.0.0.1:9",
+    "LOG_DESTINATION": "stderr",
+    "LOG_LEVEL": "WARNING",
+    "LOG_FLUSH_INTERVAL": "0.01",
+    "TRANSLATION_CACHE_BACKEND": "memory",
+    "INDEX_SYNC_MODE": "off",
+    "VECTOR_INDEX_DIR": ""
+})
+
+from benchmarks import fakes  # noqa: E402
+
+fakes.install()
+
+AUTH = {"Authorization": "Bearer test-key"}
+
+
+@pytest.fixture(autouse=True)
+def store():
+    """A fresh fake Firestore/Storage for every test"""
+    fakes.reset_store()
+    yield fakes
+    fakes.reset_store()
+    fakes.LATENCY.update(firestore=0.0, translate=0.0, storage=0.0)
+
+
+@pytest.fixture
+def seed_articles():
+    """The knowledge_base.json articles and solutions, with their article-N/solution-N ids"""
+    return fakes.load_seed_articles()
+
+
+@pytest.fixture
+def kb():
+    from gcp_knowledge_base import GCPKnowledgeBase
+
+    kb = GCPKnowledgeBase("test")
+    yield kb
+    if kb.vectors is not None:
+        kb.vectors.shutdown()
+    kb.io.shutdown()
+
+
+@pytest.fixture
+def agent_module(seed_articles):
+    """``agent`` with its caches emptied and the seed articles in Firestore"""
+    import agent
+
+    fakes.seed_articles(seed_articles)
+    agent.kb.index_loaded = False
+    agent.response_cache.clear()
+    return agent
+
+
+@pytest.fixture
+def client(agent_module):
+    """A TestClient over ``agent.app`` with startup (index load) done"""
+    from fastapi.testclient import TestClient
+
+    with TestClient(agent_module.app) as client:
+        yield client
+
+
+def pytest_sessionfinish(session, exitstatus):
+    # Flush the log writer thread while the stderr pytest captured is still open
+    from logging_setup import shutdown_logging
+
+    shutdown_logging()
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+from conftest import AUTH
+
+
+@pytest.fixture
+def admission():
+    """One slot and one queue place, waited for briefly"""
+    return AdmissionController("test", limit=1, min_limit=1, max_limit=1, queue_size=1, queue_timeout=0.05,
+                               adaptive=False)
+
+
+def test_full_queue_is_rejected_with_429():
+    admission = AdmissionController("test", limit=1, min_limit=1, max_limit=1, queue_size=0, adaptive=False)
+
+    async def run():
+        held = await admission.acquire()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire()
+        held.release()
+        return rejected.value
+
+    rejected = asyncio.run(run())
+    assert rejected.status_code == 429
+    assert rejected.retry_after >= 1
+    assert admission.rejected_queue_full == 1
+
+
+def test_queue_timeout_is_rejected_with_503(admission):
+
+    async def run():
+        held = await admission.acquire()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire()
+        held.release()
+        return rejected.value
+
+    assert asyncio.run(run()).status_code == 503
+    assert admission.rejected_timeout == 1
+    assert admission.queued == 0 and admission.in_flight == 0
+
+
+def test_waiter_gets_the_released_slot():
+    admission = AdmissionController("test", limit=1, min_limit=1, max_limit=1, queue_size=1, queue_timeout=1.0,
+                                    adaptive=False)
+
+    async def run():
+        held = await admission.acquire()
+        waiter = asyncio.ensure_future(admission.acquire())
+        await asyncio.sleep(0)
+        assert admission.queued == 1
+        held.release()
+        (await waiter).release()
+
+    asyncio.run(run())
+    assert admission.admitted == 2
+    assert admission.in_flight == 0
+
+
+def test_release_is_idempotent(admission):
+
+    async def run():
+        held = await admission.acquire()
+        held.release()
+        held.release()
+
+    asyncio.run(run())
+    assert admission.in_flight == 0
+
+
+@pytest.mark.parametrize("queue_size, status", [(0, 429), (1, 503)])
+def test_chat_sheds_with_retry_after(client, agent_module, monkeypatch, queue_size, status):
+    saturated = AdmissionController("llm", limit=1, min_limit=1, max_limit=1, queue_size=queue_size,
+                                    queue_timeout=0.05, adaptive=False)
+    saturated.in_flight = 1
+    monkeypatch.setattr(agent_module, "llm_admission", saturated)
+
+    # Nothing in the knowledge base answers this, so it needs the LLM stage
+    response = client.post("/chat", json={"message": "hello there"}, headers=AUTH)
+    assert response.status_code == status
+    assert int(response.headers["Retry-After"]) >= 1
@@ -0,0 +1,18 @@
+from conftest import AUTH
+
+
+def test_health(client):
+    response = client.get("/health")
+    assert response.status_code == 200
+    assert response.json() == {"status": "healthy", "project_id": "test"}
+
+
+def test_api_key_required(client):
+    assert client.get("/kb/categories").status_code == 403
+    assert client.get("/kb/categories", headers={"Authorization": "Bearer wrong"}).status_code == 403
+    assert client.get("/kb/categories", headers=AUTH).status_code == 200
+
+
+def test_startup_loads_index(client, agent_module, seed_articles):
+    assert agent_module.kb.index_loaded
+    assert len(agent_module.kb.index) == len(seed_articles)
@@ -0,0 +1,93 @@
+import asyncio
+import threading
+
+import pytest
+
+import deadline
+from admission import AdmissionController
+from conftest import AUTH
+
+
+@pytest.fixture
+def llm(agent_module, monkeypatch):
+    """DeepSeek answering every prompt, and the calls it got"""
+    calls = []
+
+    async def chat_completion(messages, **kwargs):
+        calls.append(messages)
+        return {"choices": [{"message": {"content": "Try turning it off and on again."}}],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 8}}
+
+    monkeypatch.setattr(agent_module.llm_gateway, "chat_completion", chat_completion)
+    return calls
+
+
+@pytest.fixture
+def saturated(agent_module, monkeypatch):
+    """An LLM admission controller that sheds everything until its one slot is freed"""
+    admission = AdmissionController("llm", limit=1, min_limit=1, max_limit=1, queue_size=0, adaptive=False)
+    admission.in_flight = 1
+    monkeypatch.setattr(agent_module, "llm_admission", admission)
+    return admission
+
+
+MESSAGES = {"messages": [{"id": "T-1", "message": "hello there"}, {"id": "T-2", "message": " hello there "},
+                         {"id": "T-3", "message": "good morning"}]}
+
+
+def test_batch_answers_identical_questions_once(client, llm):
+    response = client.post("/chat/batch", json=MESSAGES, headers=AUTH)
+    assert response.status_code == 200
+    results = sorted(response.json()["results"], key=lambda result: result["index"])
+    assert [result["id"] for result in results] == ["T-1", "T-2", "T-3"]
+    assert all(result["status"] == 200 for result in results)
+    assert len(llm) == 2
+
+
+def test_batch_answers_different_non_latin_questions_separately(client, agent_module, monkeypatch):
+    async def chat_completion(messages, **kwargs):
+        return {"choices": [{"message": {"content": f"Answer to {messages[-1]['content']}"}}],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 8}}
+
+    monkeypatch.setattr(agent_module.llm_gateway, "chat_completion", chat_completion)
+    tickets = ["Принтер не печатает", "Не работает VPN", "Монитор мигает"]
+    body = {"messages": [{"id": f"T-{n}", "message": message, "language": "ru"} for n, message in enumerate(tickets)]}
+
+    response = client.post("/chat/batch", json=body, headers=AUTH)
+    results = sorted(response.json()["results"], key=lambda result: result["index"])
+    assert all(result["status"] == 200 for result in results)
+    for result, ticket in zip(results, tickets):
+        assert ticket in result["response"]
+
+
+def test_shed_items_are_retried_until_admitted(client, agent_module, llm, saturated, monkeypatch):
+    monkeypatch.setattr(agent_module, "CHAT_BATCH_ADMISSION_WAIT", 30.0)
+    threading.Timer(0.3, setattr, (saturated, "in_flight", 0)).start()
+
+    response = client.post("/chat/batch", json=MESSAGES, headers=AUTH)
+    assert [result["status"] for result in response.json()["results"]] == [200, 200, 200]
+    assert agent_module.CHAT_BATCH_RETRIES.get() >= 1
+
+
+def test_items_still_shed_after_the_wait_report_their_status(client, agent_module, llm, saturated, monkeypatch):
+    monkeypatch.setattr(agent_module, "CHAT_BATCH_ADMISSION_WAIT", 0.0)
+
+    response = client.post("/chat/batch", json=MESSAGES, headers=AUTH)
+    assert response.status_code == 200
+    assert [result["status"] for result in response.json()["results"]] == [429, 429, 429]
+    assert not llm
+
+
+@pytest.mark.parametrize("path, timeout", [("/chat", 2.0), ("/chat/batch", 3600.0), ("/chat/batch/stream", 3600.0),
+                                           ("/kb/import", 3600.0), ("/kb/export", 3600.0)])
+def test_bulk_paths_get_their_own_deadline_cap(monkeypatch, path, timeout):
+    monkeypatch.setenv("REQUEST_TIMEOUT_MAX", "2")
+    seen = []
+
+    async def app(scope, receive, send):
+        seen.append(deadline.remaining())
+
+    middleware = deadline.DeadlineMiddleware(app, bulk_paths=("/chat/batch", "/kb/import", "/kb/export"))
+    scope = {"type": "http", "path": path, "headers": [(b"x-request-timeout", b"30")]}
+    asyncio.run(middleware(scope, None, None))
+    assert timeout - 1 < seen[0] <= timeout
@@ -0,0 +1,105 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from benchmarks import fakes
+from google.cloud import firestore
+from index_sync import IndexSync
+
+
+def write(doc_id: str, **fields):
+    """Write an article as another instance would, straight to Firestore"""
+    article = {"id": doc_id, "title": "Printer Offline", "content": "Restart the print spooler.",
+               "category": "Printer", "tags": ["printer"], "updated_at": datetime.now() + timedelta(seconds=1)}
+    article.update(fields)
+    firestore.Client().collection("articles").document(doc_id).set(article)
+
+
+def test_listener_start_reads_each_article_once(kb, seed_articles):
+    fakes.seed_articles(seed_articles)
+    sync = IndexSync(kb, mode="listener", poll_interval=60, overlap=120)
+
+    async def start():
+        await kb.load_index()
+        await sync.start()
+        await sync.stop()
+
+    asyncio.run(start())
+    # The full load, and again only the articles stamped within the overlap before the watermark
+    watermark = max(article["updated_at"] for article in seed_articles)
+    overlap = [article for article in seed_articles if (watermark - article["updated_at"]).total_seconds() <= 120]
+    assert len(overlap) < len(seed_articles)
+    assert fakes.COUNTERS["reads"] == len(seed_articles) + len(overlap)
+    assert len(kb.index) == len(seed_articles)
+
+
+def test_listener_applies_changes_and_reconcile_removes_deletes(kb, seed_articles):
+    fakes.seed_articles(seed_articles)
+    sync = IndexSync(kb, mode="listener", poll_interval=60)
+
+    async def run():
+        await sync.start()
+        write("printer-1")
+        assert kb.index.get("printer-1")["title"] == "Printer Offline"
+        write("printer-1", title="Printer Jammed")
+        assert kb.index.get("printer-1")["title"] == "Printer Jammed"
+        firestore.Client().collection("articles").document("printer-1").delete()
+        assert "printer-1" not in kb.index
+
+        # Deleting an article stamped before the overlap window is outside the listened query
+        firestore.Client().collection("articles").document("solution-1").delete()
+        assert "solution-1" in kb.index
+        sync.apply_changes([], await sync._deleted_ids())
+        assert "solution-1" not in kb.index
+        await sync.stop()
+
+    asyncio.run(run())
+
+
+def test_reconcile_skips_the_id_scan_when_counts_agree(kb, seed_articles):
+    fakes.seed_articles(seed_articles)
+
+    async def run():
+        await kb.load_index()
+        reads = fakes.COUNTERS["reads"]
+        assert await IndexSync(kb, mode="off")._deleted_ids() == []
+        return fakes.COUNTERS["reads"] - reads
+
+    assert asyncio.run(run()) == 1
+
+
+def test_poll_picks_up_changes_after_the_watermark(kb, seed_articles):
+    fakes.seed_articles(seed_articles)
+    sync = IndexSync(kb, mode="poll", poll_interval=60)
+
+    async def run():
+        await sync.start()
+        write("printer-1")
+        firestore.Client().collection("articles").document("article-2").delete()
+        await sync._poll_once(reconcile=True)
+        await sync.stop()
+
+    asyncio.run(run())
+    assert "printer-1" in kb.index
+    assert "article-2" not in kb.index
+    assert sync.changes_applied == 2
+
+
+def test_poll_picks_up_writes_committed_out_of_order(kb, seed_articles):
+    fakes.seed_articles(seed_articles)
+    sync = IndexSync(kb, mode="poll", poll_interval=60, overlap=30)
+
+    async def run():
+        await sync.start()
+        stamped = datetime.now()
+        write("printer-2", updated_at=stamped + timedelta(seconds=2))
+        await sync._poll_once(reconcile=False)
+        # Stamped before the write above, committed after the poll that advanced the watermark
+        write("printer-1", updated_at=stamped + timedelta(seconds=1))
+        applied = sync.changes_applied
+        await sync._poll_once(reconcile=False)
+        await sync.stop()
+        return sync.changes_applied - applied
+
+    # Only the late write is applied again; printer-2 is already indexed in that revision
+    assert asyncio.run(run()) == 1
+    assert "printer-1" in kb.index and "printer-2" in kb.index
@@ -0,0 +1,63 @@
+import pytest
+
+from kb_answer import KBAnswerPolicy
+
+PASSWORD = {"id": "article-1", "title": "Password Reset Guide", "tags": ["password", "reset"],
+            "content": "Visit the password reset portal and follow the link."}
+VPN = {"id": "article-2", "title": "VPN Connection Guide", "tags": ["vpn"], "content": "Install the VPN client."}
+
+
+@pytest.fixture
+def policy():
+    """Answers a hit scoring at least 4.0 that leads the next one by 30% and covers every query term"""
+    return KBAnswerPolicy(mode="auto", min_score=4.0, min_margin=0.3, min_coverage=1.0, fallback=True)
+
+
+def test_clear_match_answers(policy):
+    assert policy.choose("reset my password", [(PASSWORD, 6.4), (VPN, 1.0)]) is PASSWORD
+
+
+def test_single_hit_answers(policy):
+    assert policy.choose("reset password", [(PASSWORD, 6.4)]) is PASSWORD
+
+
+@pytest.mark.parametrize("scored", [
+    [],
+    [(PASSWORD, 3.9)],                  # below min_score
+    [(PASSWORD, 6.4), (PASSWORD, 6.4)],  # tie: margin 0
+    [(PASSWORD, 6.4), (VPN, 5.0)],       # margin 0.22
+])
+def test_weak_or_ambiguous_matches_go_to_the_llm(policy, scored):
+    assert policy.choose("reset my password", scored) is None
+
+
+def test_missing_query_terms_go_to_the_llm(policy):
+    assert policy.choose("reset my printer password", [(PASSWORD, 6.4)]) is None
+
+
+def test_zero_scored_hits_go_to_the_llm():
+    # Vector-only hits in hybrid search carry a BM25 score of 0
+    policy = KBAnswerPolicy(mode="auto", min_score=1e-9, min_margin=0.3, min_coverage=1.0)
+    assert policy.choose("reset password", [(PASSWORD, 0.0), (VPN, 0.0)]) is None
+
+
+@pytest.mark.parametrize("min_score", [0.0, -1.0])
+def test_non_positive_min_score_is_rejected(min_score):
+    with pytest.raises(ValueError):
+        KBAnswerPolicy(mode="auto", min_score=min_score)
+
+
+def test_non_positive_min_score_from_the_environment_is_rejected(monkeypatch):
+    monkeypatch.setenv("KB_ANSWER_MIN_SCORE", "0")
+    with pytest.raises(ValueError):
+        KBAnswerPolicy()
+
+
+def test_off_mode_never_answers():
+    assert KBAnswerPolicy(mode="off", min_score=4.0).choose("reset my password", [(PASSWORD, 6.4)]) is None
+
+
+def test_fallback_uses_the_top_hit_whatever_its_score(policy):
+    assert policy.fallback_article([(VPN, 0.0), (PASSWORD, 6.4)]) is VPN
+    assert policy.fallback_article([]) is None
+    assert KBAnswerPolicy(min_score=4.0, fallback=False).fallback_article([(PASSWORD, 6.4)]) is None
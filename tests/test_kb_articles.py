@@ -0,0 +1,128 @@
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+
+from benchmarks import fakes
+from conftest import AUTH
+from index_sync import IndexSync
+
+
+def walk(client, **params):
+    """Every page of /kb/articles, following next_cursor"""
+    pages, cursor = [], None
+    while True:
+        query = dict(params, cursor=cursor) if cursor else params
+        response = client.get("/kb/articles", params=query, headers=AUTH)
+        assert response.status_code == 200
+        body = response.json()
+        pages.append(body["articles"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_pages_cover_every_article_once_in_id_order(client, seed_articles):
+    pages = walk(client, limit=5)
+    ids = [article["id"] for page in pages for article in page]
+    assert ids == sorted(article["id"] for article in seed_articles)
+    assert [len(page) for page in pages] == [5, 5, 5, 5, 5, 3]
+
+
+def test_fields_are_projected(client):
+    articles = walk(client, limit=50, fields="title,category")[0]
+    assert {tuple(sorted(article)) for article in articles} == {("category", "id", "title")}
+
+
+def test_unknown_fields_and_oversized_pages_are_rejected(client):
+    assert client.get("/kb/articles", params={"fields": "title,secret"}, headers=AUTH).status_code == 400
+    assert client.get("/kb/articles", params={"limit": 10000}, headers=AUTH).status_code == 422
+
+
+def test_ndjson_streams_every_article(client, seed_articles):
+    response = client.get("/kb/articles", params={"format": "ndjson", "limit": 7, "fields": "title"},
+                          headers=AUTH)
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["id"] for line in lines] == sorted(article["id"] for article in seed_articles)
+
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_list_articles_pages_agree_between_firestore_and_the_index(kb, seed_articles, indexed):
+    fakes.seed_articles(seed_articles)
+
+    async def walk_kb():
+        await kb.load_index()
+        ids, after = [], None
+        while True:
+            articles, after = await kb.list_articles(limit=6, after=after, fields=["id", "title"], indexed=indexed)
+            ids.extend(article["id"] for article in articles)
+            if after is None:
+                return ids
+
+    assert asyncio.run(walk_kb()) == sorted(article["id"] for article in seed_articles)
+
+
+@pytest.fixture
+def synced(agent_module, monkeypatch):
+    """Index sync reported as following Firestore, so pages come from the index"""
+    monkeypatch.setattr(IndexSync, "following", property(lambda self: True))
+
+
+def test_etag_revalidates_with_304(client, synced):
+    gzip = dict(AUTH, **{"Accept-Encoding": "gzip"})
+    identity = dict(AUTH, **{"Accept-Encoding": "identity"})
+    response = client.get("/kb/articles", params={"limit": 10}, headers=gzip)
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["cache-control"].startswith("private, max-age=")
+    etag = response.headers["etag"]
+
+    # Strong validators differ per content coding
+    plain = client.get("/kb/articles", params={"limit": 10}, headers=identity)
+    assert "content-encoding" not in plain.headers
+    assert etag == plain.headers["etag"][:-1] + '-gzip"'
+
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}'):
+        revalidated = client.get("/kb/articles", params={"limit": 10},
+                                 headers=dict(gzip, **{"If-None-Match": if_none_match}))
+        assert revalidated.status_code == 304
+        assert revalidated.content == b""
+        assert revalidated.headers["etag"] == etag
+
+    # A validator of another coding still matches; the 304 names the variant this client gets
+    revalidated = client.get("/kb/articles", params={"limit": 10}, headers=dict(identity, **{"If-None-Match": etag}))
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == plain.headers["etag"]
+
+    other_page = client.get("/kb/articles", params={"limit": 10, "fields": "title"},
+                            headers=dict(gzip, **{"If-None-Match": etag}))
+    assert other_page.status_code == 200
+
+
+def test_pages_follow_the_synced_index(client, agent_module, synced):
+    def first_page():
+        response = client.get("/kb/articles", params={"limit": 100, "fields": "title"}, headers=AUTH)
+        return response.headers["etag"], [article["id"] for article in response.json()["articles"]]
+
+    etag, ids = first_page()
+    article = {"id": "aaa-new", "title": "Badge Reader Guide", "content": "Tap the badge.",
+               "category": "Hardware", "tags": [], "updated_at": datetime.now()}
+    # Written by another instance: not served (or cached) before index sync applies it
+    fakes.seed_articles([article])
+    assert first_page() == (etag, ids)
+
+    agent_module.index_sync.apply_changes([article], [])
+    new_etag, new_ids = first_page()
+    assert new_etag != etag
+    assert new_ids == ["aaa-new"] + ids
+
+
+def test_pages_come_from_firestore_until_sync_follows(client, agent_module, monkeypatch):
+    assert not agent_module.index_sync.following
+    monkeypatch.setattr(agent_module.kb_http_cache, "ttl", 0)
+    fakes.seed_articles([{"id": "aaa-new", "title": "Badge Reader Guide", "content": "Tap the badge."}])
+    response = client.get("/kb/articles", params={"limit": 1}, headers=AUTH)
+    assert response.json()["articles"][0]["id"] == "aaa-new"
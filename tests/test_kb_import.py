@@ -0,0 +1,101 @@
+import asyncio
+import io
+import json
+import threading
+
+from benchmarks import fakes
+from conftest import AUTH
+from gcp_knowledge_base import initialize_gcp_knowledge_base
+from kb_import import KBImporter, import_from, read_records
+
+KB_RECORDS = 28
+
+
+def run_import(kb, text, fmt="json"):
+    return asyncio.run(KBImporter(kb).run(read_records(io.StringIO(text), fmt)))
+
+
+def stored_titles():
+    return sorted(doc["title"] for doc in fakes._STORE.get("articles", {}).values())
+
+
+def test_reimport_writes_nothing(kb):
+    first = asyncio.run(import_from(kb, "knowledge_base.json"))
+    assert (first["read"], first["written"], first["unchanged"]) == (KB_RECORDS, KB_RECORDS, 0)
+
+    again = asyncio.run(import_from(kb, "knowledge_base.json"))
+    assert (again["read"], again["written"], again["unchanged"], again["duplicate"]) == (KB_RECORDS, 0, KB_RECORDS, 0)
+    assert len(stored_titles()) == KB_RECORDS
+
+
+def test_import_after_bootstrap_updates_the_seed_articles(kb):
+    asyncio.run(initialize_gcp_knowledge_base(kb))
+    assert {"article-1", "article-2", "article-3", "article-4"} <= set(fakes._STORE["articles"])
+
+    stats = asyncio.run(import_from(kb, "knowledge_base.json"))
+    assert (stats["written"], stats["unchanged"], stats["duplicate"]) == (KB_RECORDS - 4, 4, 0)
+    assert stored_titles().count("Password Reset Guide") == 1
+
+
+def unhashed(article):
+    """An article as stored before articles carried their content hash"""
+    return {field: value for field, value in article.items() if field != "content_hash"}
+
+
+def test_articles_stored_without_a_hash_are_unchanged(kb, seed_articles):
+    fakes.seed_articles([unhashed(article) for article in seed_articles])
+    stats = asyncio.run(import_from(kb, "knowledge_base.json"))
+    assert (stats["written"], stats["unchanged"], stats["duplicate"]) == (0, KB_RECORDS, 0)
+
+
+def test_content_already_stored_under_another_id_is_skipped(kb, seed_articles):
+    # The seed articles as an older bootstrap stored them: under generated ids, without a content hash
+    fakes.seed_articles([dict(unhashed(article), id=f"generated-{n}") for n, article in enumerate(seed_articles[:4])])
+
+    async def import_and_search():
+        await kb.load_index()
+        stats = await import_from(kb, "knowledge_base.json")
+        kb.vectors.wait()
+        return stats, await kb.search_articles_scored("How do I reset my password?", limit=5)
+
+    stats, results = asyncio.run(import_and_search())
+    assert (stats["written"], stats["duplicate"]) == (KB_RECORDS - 4, 4)
+    assert stored_titles().count("Password Reset Guide") == 1
+    titles = [article["title"] for article, _ in results]
+    assert titles[0] == "Password Reset Guide"
+    assert titles.count("Password Reset Guide") == 1
+
+
+def test_duplicates_within_one_import_are_written_once(kb):
+    record = {"title": "Badge Reader Guide", "content": "Tap the badge.", "category": "Hardware"}
+    text = json.dumps([dict(record, id="badge-1"), dict(record, id="badge-2"), record])
+    stats = run_import(kb, text)
+    assert (stats["read"], stats["written"], stats["duplicate"]) == (3, 1, 2)
+    assert list(fakes._STORE["articles"]) == ["badge-1"]
+
+
+def test_invalid_records_are_counted(kb):
+    text = '{"title": "Printer", "content": "Turn it off and on."}\n{"title": "No content"}\nnot json\n'
+    stats = run_import(kb, text, "ndjson")
+    assert (stats["read"], stats["written"], stats["invalid"]) == (3, 1, 2)
+    assert len(stats["errors"]) == 2
+
+
+def test_records_are_parsed_off_the_event_loop(kb):
+    threads = set()
+
+    def records():
+        for n in range(5):
+            threads.add(threading.current_thread())
+            yield {"id": f"doc-{n}", "title": f"Title {n}", "content": "Body"}
+
+    stats = asyncio.run(KBImporter(kb, batch_size=2).run(records()))
+    assert stats["written"] == 5
+    assert threading.main_thread() not in threads
+
+
+def test_import_endpoint_reports_duplicates(client):
+    with open("knowledge_base.json", "rb") as f:
+        response = client.post("/kb/import", content=f.read(), headers=AUTH)
+    assert response.status_code == 200
+    assert (response.json()["written"], response.json()["unchanged"]) == (0, KB_RECORDS)
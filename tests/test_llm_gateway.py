@@ -0,0 +1,180 @@
+import asyncio
+import time
+
+import pytest
+
+from benchmarks.fake_deepseek import FakeDeepSeek, FakeDeepSeekConfig
+from llm_client import DeepSeekClient, LLMError
+from llm_gateway import GATEWAY_EVENTS, CircuitBreaker, CircuitOpenError, LLMGateway
+
+MESSAGES = [{"role": "user", "content": "My printer is offline"}]
+
+
+def start_fake() -> FakeDeepSeek:
+    fake = FakeDeepSeek(FakeDeepSeekConfig(latency=0.0, token_rate=0.0, completion_tokens=5, error_status=503,
+                                           slow_latency=2.0, seed=7))
+    fake.port = fake.start_in_thread()
+    return fake
+
+
+@pytest.fixture
+def upstream():
+    """The primary DeepSeek stand-in; tests inject failures and latency through its config"""
+    fake = start_fake()
+    yield fake
+    fake.stop_thread()
+
+
+@pytest.fixture
+def secondary():
+    fake = start_fake()
+    yield fake
+    fake.stop_thread()
+
+
+def client(fake: FakeDeepSeek, name: str = "deepseek") -> DeepSeekClient:
+    return DeepSeekClient(api_key="test", base_url=f"http://127.0.0.1:{fake.port}", model="fake", http2=False,
+                          name=name)
+
+
+def run(gateway_factory, scenario):
+    """Run ``scenario(gateway)`` on a fresh loop, closing the gateway's clients afterwards"""
+    async def main():
+        gateway = gateway_factory()
+        try:
+            return await scenario(gateway)
+        finally:
+            await gateway.aclose()
+
+    return asyncio.run(main())
+
+
+def test_breaker_opens_probes_half_open_and_closes(upstream):
+    upstream.config.error_rate = 1.0
+
+    async def scenario(gateway):
+        for _ in range(2):
+            with pytest.raises(LLMError):
+                await gateway.chat_completion(MESSAGES)
+        assert gateway.breaker.state == CircuitBreaker.OPEN
+
+        # Open: short-circuited without calling the upstream
+        requests = upstream.requests
+        with pytest.raises(CircuitOpenError):
+            await gateway.chat_completion(MESSAGES)
+        assert upstream.requests == requests
+
+        # After the cooldown a single probe goes through; a failed probe opens the breaker again
+        await asyncio.sleep(0.25)
+        with pytest.raises(LLMError) as failed:
+            await gateway.chat_completion(MESSAGES)
+        assert not isinstance(failed.value, CircuitOpenError)
+        assert gateway.breaker.state == CircuitBreaker.OPEN
+
+        # Half-open: concurrent requests are short-circuited while the probe is out
+        await asyncio.sleep(0.25)
+        upstream.config.error_rate = 0.0
+        upstream.config.latency = 0.1
+        probe = asyncio.ensure_future(gateway.chat_completion(MESSAGES))
+        await asyncio.sleep(0.02)
+        assert gateway.breaker.state == CircuitBreaker.HALF_OPEN
+        with pytest.raises(CircuitOpenError):
+            await gateway.chat_completion(MESSAGES)
+        assert (await probe)["choices"]
+        assert gateway.breaker.state == CircuitBreaker.CLOSED
+        assert gateway.breaker.failures == 0
+
+    run(lambda: LLMGateway(client(upstream), hedge=False, max_retries=0, breaker_failures=2,
+                           breaker_cooldown=0.2), scenario)
+
+
+def test_retries_stop_when_the_budget_is_exhausted(upstream):
+    upstream.config.error_rate = 1.0
+    exhausted = GATEWAY_EVENTS.get(event="budget_exhausted")
+
+    async def scenario(gateway):
+        gateway.budget.tokens = 1.0
+        with pytest.raises(LLMError):
+            await gateway.chat_completion(MESSAGES)
+        # The one token (plus the request's deposit) pays for a single retry of the three allowed
+        return gateway.budget.tokens
+
+    tokens = run(lambda: LLMGateway(client(upstream), hedge=False, max_retries=3, retry_budget=0.1,
+                                    breaker_failures=100), scenario)
+    assert upstream.requests == 2
+    assert tokens == pytest.approx(0.1)
+    assert GATEWAY_EVENTS.get(event="budget_exhausted") == exhausted + 1
+
+
+def test_retry_recovers_from_a_transient_failure(upstream):
+    upstream.config.error_rate = 1.0
+
+    async def scenario(gateway):
+        attempt = asyncio.ensure_future(gateway.chat_completion(MESSAGES))
+        while upstream.errors == 0:
+            await asyncio.sleep(0.005)
+        upstream.config.error_rate = 0.0
+        return await attempt
+
+    result = run(lambda: LLMGateway(client(upstream), hedge=False, max_retries=1, breaker_failures=100), scenario)
+    assert result["choices"][0]["message"]["content"]
+    assert upstream.requests == 2
+
+
+def test_slow_primary_is_hedged(upstream):
+    hedges_won = GATEWAY_EVENTS.get(event="hedge_won")
+
+    async def scenario(gateway):
+        gateway._latencies.extend([0.01] * 20)
+        upstream.config.slow_rate = 1.0
+        start = time.perf_counter()
+        attempt = asyncio.ensure_future(gateway.chat_completion(MESSAGES))
+        while upstream.requests == 0:
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(0.02)
+        # Only the first request is slow
+        upstream.config.slow_rate = 0.0
+        result = await attempt
+        return result, time.perf_counter() - start
+
+    result, seconds = run(lambda: LLMGateway(client(upstream), hedge=True, hedge_min_delay=0.1), scenario)
+    assert result["choices"]
+    assert seconds < upstream.config.slow_latency
+    assert upstream.requests == 2
+    assert GATEWAY_EVENTS.get(event="hedge_won") == hedges_won + 1
+
+
+def test_failing_primary_falls_back(upstream, secondary):
+    upstream.config.error_rate = 1.0
+
+    async def scenario(gateway):
+        result = await gateway.chat_completion(MESSAGES)
+        # With the breaker open, the primary is skipped and the secondary answers directly
+        assert gateway.breaker.state == CircuitBreaker.OPEN
+        requests = upstream.requests
+        assert (await gateway.chat_completion(MESSAGES))["choices"]
+        assert upstream.requests == requests
+        chunks = [chunk async for chunk in gateway.stream_chat_completion(MESSAGES)]
+        return result, chunks
+
+    result, chunks = run(lambda: LLMGateway(client(upstream), client(secondary, "deepseek_fallback"), hedge=False,
+                                            max_retries=0, breaker_failures=1, breaker_cooldown=60), scenario)
+    assert result["choices"][0]["message"]["content"]
+    assert any(chunk.get("choices") for chunk in chunks)
+    assert secondary.requests == 3
+
+
+def test_without_a_fallback_the_error_propagates(upstream):
+    upstream.config.error_rate = 1.0
+    upstream.config.error_status = 400
+
+    async def scenario(gateway):
+        with pytest.raises(LLMError) as failed:
+            await gateway.chat_completion(MESSAGES)
+        assert gateway.breaker.state == CircuitBreaker.CLOSED and gateway.breaker.failures == 0
+        return failed.value
+
+    error = run(lambda: LLMGateway(client(upstream), hedge=False, max_retries=2, breaker_failures=1), scenario)
+    # Client errors are neither retried nor counted against the breaker
+    assert error.status_code == 400
+    assert upstream.requests == 1
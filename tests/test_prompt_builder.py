@@ -0,0 +1,58 @@
+from prompt_builder import PromptBuilder
+from search_index import SearchIndex
+
+VPN = {"id": "vpn", "title": "VPN Connection Guide", "content": "Install the VPN client and connect.",
+       "category": "VPN", "tags": ["vpn"]}
+PRINTER = {"id": "printer", "title": "Printer Setup", "content": "Add the printer from Settings.",
+           "category": "Printer", "tags": ["printer"]}
+
+
+def follow(builder: PromptBuilder, index: SearchIndex):
+    index.add_listener(lambda upserts, deletes, reset: builder.on_index_change(
+        upserts, deletes, reset, index.all_articles))
+
+
+def test_pinned_articles_go_in_the_prefix():
+    builder = PromptBuilder(pinned=["VPN Connection Guide"], glossary_path="")
+    index = SearchIndex()
+    follow(builder, index)
+    index.load([VPN, PRINTER])
+    assert builder.pinned_ids == ["vpn"]
+    assert "Install the VPN client" in builder.prefix
+    assert "Add the printer" not in builder.prefix
+
+
+def test_pinned_title_added_later_is_picked_up():
+    builder = PromptBuilder(pinned=["VPN Connection Guide", "printer setup"], glossary_path="")
+    index = SearchIndex()
+    follow(builder, index)
+    index.load([VPN])
+    assert builder.pinned_ids == ["vpn"]
+
+    index.add(PRINTER)
+    assert builder.pinned_ids == ["vpn", "printer"]
+    assert "Add the printer" in builder.prefix
+
+
+def test_pinned_article_changes_and_deletes_rebuild_the_prefix():
+    builder = PromptBuilder(pinned=["VPN Connection Guide"], glossary_path="")
+    index = SearchIndex()
+    follow(builder, index)
+    index.load([VPN, PRINTER])
+
+    index.apply([dict(VPN, content="Use the new VPN portal.")])
+    assert "new VPN portal" in builder.prefix
+    index.remove("vpn")
+    assert builder.pinned_ids == []
+    assert "VPN portal" not in builder.prefix
+
+
+def test_unrelated_changes_keep_the_prefix():
+    builder = PromptBuilder(pinned=["VPN Connection Guide"], glossary_path="")
+    index = SearchIndex()
+    follow(builder, index)
+    index.load([VPN])
+    prefix = builder.prefix
+    assert not builder.affects_pinned([PRINTER], ["other"])
+    index.add(PRINTER)
+    assert builder.prefix is prefix
@@ -0,0 +1,43 @@
+import pytest
+
+from response_cache import ResponseCache, normalize_query
+
+ARTICLES = [{"id": "article-1", "updated_at": "2025-01-27"}]
+
+
+@pytest.fixture
+def cache():
+    return ResponseCache(max_entries=100, max_bytes=1 << 20, ttl=60, similarity_threshold=0.9, enabled=True)
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("  How do I reset my PASSWORD?? ", "how do i reset my password"),
+    ("Как сбросить пароль?", "как сбросить пароль"),
+    ("打印机 不工作", "打印机 不工作"),
+    ("Straße", "strasse"),
+    ("C++ vs C#", "c++ vs c#"),
+    ("?!", "?!"),
+    ("   ", "")
+])
+def test_normalize_query(query, expected):
+    assert normalize_query(query) == expected
+
+
+def test_non_latin_queries_do_not_share_an_entry(cache):
+    cache.put("Как сбросить пароль?", "ru", ARTICLES, {"response": "password"})
+    assert cache.get("Принтер не печатает", "ru", ARTICLES) is None
+    assert cache.get("как сбросить пароль", "ru", ARTICLES) == {"response": "password"}
+
+
+def test_punctuation_only_queries_match_exactly(cache):
+    cache.put("C++", "en", ARTICLES, {"response": "c++"})
+    assert cache.get("C#", "en", ARTICLES) is None
+    cache.put("???", "en", ARTICLES, {"response": "question marks"})
+    assert cache.get("!!!", "en", ARTICLES) is None
+    assert cache.get("???", "en", ARTICLES) == {"response": "question marks"}
+
+
+def test_empty_queries_are_never_cached(cache):
+    cache.put("   ", "en", ARTICLES, {"response": "empty"})
+    assert cache.get("", "en", ARTICLES) is None
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,45 @@
+import asyncio
+
+
+def test_only_the_same_question_shares_a_search(agent_module, monkeypatch):
+    searched = []
+
+    async def search_articles_scored(query, language="en", limit=None, category=None):
+        searched.append(query)
+        await asyncio.sleep(0.05)
+        return [({"id": query, "title": query}, 1.0)]
+
+    monkeypatch.setattr(agent_module.kb, "search_articles_scored", search_articles_scored)
+
+    async def search_all():
+        return await asyncio.gather(*[agent_module.search_knowledge_base(message, "en") for message in (
+            "C++ compiler crashes", "C# compiler crashes", "  C++ compiler crashes ",
+            "Принтер не печатает", "Как сбросить пароль?")])
+
+    results = asyncio.run(search_all())
+    assert sorted(searched) == sorted(["C++ compiler crashes", "C# compiler crashes",
+                                       "Принтер не печатает", "Как сбросить пароль?"])
+    assert [result[0][0]["id"] for result in results] == [
+        "C++ compiler crashes", "C# compiler crashes", "C++ compiler crashes",
+        "Принтер не печатает", "Как сбросить пароль?"]
+
+
+def test_only_the_same_question_shares_an_answer(agent_module, monkeypatch):
+    answered = []
+
+    async def answer_chat(message, language):
+        answered.append(message)
+        await asyncio.sleep(0.05)
+        return {"response": message, "knowledge_base_articles": []}
+
+    monkeypatch.setattr(agent_module, "answer_chat", answer_chat)
+
+    async def chat_all():
+        return await asyncio.gather(*[
+            agent_module.chat_with_agent(agent_module.ChatMessage(message=message, language="ru"), api_key="test-key")
+            for message in ("Принтер не печатает", "Как сбросить пароль?", "Принтер не печатает")])
+
+    responses = asyncio.run(chat_all())
+    assert sorted(answered) == ["Как сбросить пароль?", "Принтер не печатает"]
+    assert [response["response"] for response in responses] == [
+        "Принтер не печатает", "Как сбросить пароль?", "Принтер не печатает"]
@@ -0,0 +1,171 @@
+import threading
+
+import numpy as np
+import pytest
+
+import vector_index
+from vector_index import VectorIndex
+
+
+def make_articles(count, prefix="doc", words="printer toner paper jam tray"):
+    return [{"id": f"{prefix}-{n}", "title": f"{prefix} guide {n}", "content": f"{words} step {n}",
+             "category": "General", "tags": []} for n in range(count)]
+
+
+class Corpus:
+    """Articles by id, as a ``SearchIndex`` would hand them out"""
+
+    def __init__(self, articles):
+        self.by_id = {article["id"]: article for article in articles}
+
+    def articles(self):
+        return list(self.by_id.values())
+
+    def change(self, vectors, upserts=(), deletes=()):
+        for article in upserts:
+            self.by_id[article["id"]] = article
+        for article_id in deletes:
+            self.by_id.pop(article_id, None)
+        vectors.on_index_change(list(upserts), list(deletes), False)
+
+
+@pytest.fixture
+def seeded(seed_articles):
+    corpus = Corpus(seed_articles)
+    vectors = VectorIndex(dim=512, components=0, directory="", articles=corpus.articles)
+    vectors.load(corpus.articles())
+    yield corpus, vectors
+    vectors.shutdown()
+
+
+def test_search_finds_paraphrases(seeded):
+    _, vectors = seeded
+    assert vectors.ready and len(vectors) == 28
+    assert vectors.search("my laptop is crawling", 3)[0][0] == "article-3"
+
+
+def test_add_and_remove(seeded):
+    corpus, vectors = seeded
+    badge = {"id": "badge", "title": "Badge Reader Guide", "content": "Tap the badge on the reader.",
+             "category": "Hardware", "tags": ["badge"]}
+    corpus.change(vectors, upserts=[badge])
+    assert vectors.search("badge reader", 1)[0][0] == "badge"
+    assert vectors.search("badge reader", 5, category="Hardware")[0][0] == "badge"
+
+    corpus.change(vectors, deletes=["badge", "article-1"])
+    assert len(vectors) == 27
+    found = [article_id for article_id, _ in vectors.search("badge reader password reset", 28)]
+    assert "badge" not in found and "article-1" not in found
+
+
+def test_full_load_is_built_off_the_calling_thread(seed_articles, monkeypatch):
+    release = threading.Event()
+    fit = vector_index._Model.fit
+    threads = []
+
+    def slow_fit(*args, **kwargs):
+        threads.append(threading.current_thread())
+        release.wait(5)
+        return fit(*args, **kwargs)
+
+    monkeypatch.setattr(vector_index._Model, "fit", slow_fit)
+    corpus = Corpus(seed_articles)
+    vectors = VectorIndex(dim=512, components=0, directory="", articles=corpus.articles)
+    try:
+        vectors.on_index_change(corpus.articles(), [], True)
+        # Nothing is served until the build is done; changes meanwhile are replayed onto it
+        assert not vectors.ready
+        assert vectors.search("password reset") == []
+        corpus.change(vectors, upserts=make_articles(1, "late"), deletes=["article-1"])
+
+        release.set()
+        vectors.wait(5)
+        assert threads and threading.current_thread() not in threads
+        assert vectors.ready and len(vectors) == 28
+        found = [article_id for article_id, _ in vectors.search("printer toner guide", 28)]
+        assert "late-0" in found and "article-1" not in found
+    finally:
+        release.set()
+        vectors.shutdown()
+
+
+def test_reload_restores_saved_vectors(seed_articles, tmp_path):
+    first = VectorIndex(dim=512, components=0, directory=str(tmp_path))
+    first.load(seed_articles)
+    expected = first.search("vpn client", 5)
+
+    restored = VectorIndex(dim=512, components=0, directory=str(tmp_path))
+    restored.load(seed_articles)
+    assert restored.stats()["memory_mapped"]
+    assert restored.search("vpn client", 5) == expected
+
+    # A few changed articles are embedded with the saved model
+    changed = [dict(article, content=article["content"] + " updated") if n < 2 else article
+               for n, article in enumerate(seed_articles)]
+    partial = VectorIndex(dim=512, components=0, directory=str(tmp_path))
+    partial.load([dict(article, content_hash=None) for article in changed])
+    assert not partial.mapped and partial.stats()["fit_articles"] == 28 and len(partial) == 28
+
+
+def test_reload_refits_when_the_saved_ids_are_far_off(seed_articles, tmp_path):
+    VectorIndex(dim=512, components=0, directory=str(tmp_path)).load(seed_articles[:10])
+
+    vectors = VectorIndex(dim=512, components=0, directory=str(tmp_path))
+    vectors.load(seed_articles)
+    assert vectors.stats()["fit_articles"] == 28
+
+
+def test_growth_triggers_a_background_refit():
+    corpus = Corpus(make_articles(20))
+    vectors = VectorIndex(dim=512, components=0, directory="", articles=corpus.articles, refit_growth=2.0)
+    try:
+        vectors.load(corpus.articles())
+        corpus.change(vectors, upserts=make_articles(20, "more"))
+        assert vectors.refits == 0
+        corpus.change(vectors, upserts=make_articles(5, "extra"))
+        vectors.wait(5)
+        assert vectors.refits == 1
+        assert vectors.stats()["fit_articles"] == 45 and len(vectors) == 45
+    finally:
+        vectors.shutdown()
+
+
+def test_new_vocabulary_triggers_a_background_refit():
+    corpus = Corpus(make_articles(40))
+    vectors = VectorIndex(dim=512, components=0, directory="", articles=corpus.articles, refit_drift=0.3)
+    try:
+        vectors.load(corpus.articles())
+        # Changes in known words only
+        corpus.change(vectors, upserts=make_articles(20))
+        assert vectors.refits == 0
+
+        new_words = "kubernetes helm ingress pod cluster node deployment secret"
+        corpus.change(vectors, upserts=make_articles(20, "doc", words=new_words))
+        vectors.wait(5)
+        assert vectors.refits == 1 and len(vectors) == 40
+    finally:
+        vectors.shutdown()
+
+
+def test_lsa_fit_embeds_articles_as_later_upserts_would():
+    articles = [{"id": f"doc-{n}", "title": f"Guide {n % 37}", "content": f"{words} step {n % 11}",
+                 "category": "General", "tags": [words.split()[n % 3]]}
+                for n, words in enumerate(["printer toner paper jam tray", "vpn client tunnel connect",
+                                           "password reset portal link", "laptop slow memory disk"] * 150)]
+    vectors = VectorIndex(dim=256, components=16, directory="")
+    try:
+        vectors.load(articles)
+        assert vectors.stats()["lsa"]
+        embedded = np.stack([vectors._model.embed(vectors._features(article)) for article in articles])
+        np.testing.assert_allclose(vectors._matrix[:len(articles)], embedded, atol=1e-5)
+    finally:
+        vectors.shutdown()
+
+
+def test_load_after_shutdown_starts_a_new_builder(seed_articles):
+    vectors = VectorIndex(dim=512, components=0, directory="")
+    vectors.load(seed_articles)
+    vectors.shutdown()
+    vectors.load(seed_articles[:5])
+    vectors.shutdown()
+    assert vectors.ready and len(vectors) == 5
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from metrics import UPSTREAM_IN_FLIGHT, UPSTREAM_REQUESTS, UPSTREAM_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class TranslationBatcher:
+    """Coalesce individual translation requests into batched API calls.
+
+    Strings requested for the same language pair within ``window`` seconds
+    (from one request or many concurrent ones) are de-duplicated and sent
+    as list calls to the translate_v2 client, split so no call exceeds
+    ``max_batch_size`` strings or ``max_batch_chars`` characters. The
+    blocking client runs on ``io`` (a ``GCPIO``), or the default executor,
+    so the event loop is never held. ``translate_client`` may be a
+    zero-argument factory, called on the first API call.
+    """
+
+    def __init__(self, translate_client, window: Optional[float] = None,
+                 max_batch_size: Optional[int] = None, max_batch_chars: Optional[int] = None,
+                 io=None):
+        self.translate_client = translate_client
+        self.window = window if window is not None else float(os.getenv("TRANSLATE_BATCH_WINDOW", "0.005"))
+        self.max_batch_size = max_batch_size or int(os.getenv("TRANSLATE_BATCH_SIZE", "128"))
+        self.max_batch_chars = max_batch_chars or int(os.getenv("TRANSLATE_BATCH_CHARS", "30000"))
+        self.io = io
+        self._pending: Dict[Tuple[str, str], Dict[str, asyncio.Future]] = {}
+        self.api_calls = 0
+        self.strings_translated = 0
+
+    async def translate(self, text: str, target_language: str, source_language: str) -> str:
+        return (await self.translate_many([text], target_language, source_language))[0]
+
+    async def translate_many(self, texts: List[str], target_language: str, source_language: str) -> List[str]:
+        """Translate several strings, sharing API calls with concurrent callers"""
+        loop = asyncio.get_event_loop()
+        key = (source_language, target_language)
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = {}
+            loop.call_later(self.window, self._flush, key)
+        futures = []
+        for text in texts:
+            future = pending.get(text)
+            if future is None:
+                future = pending[text] = loop.create_future()
+            futures.append(future)
+        # Shielded: the futures are shared, so one caller timing out must not cancel them for the rest
+        return list(await asyncio.gather(*[asyncio.shield(future) for future in futures]))
+
+    def _flush(self, key: Tuple[str, str]):
+        pending = self._pending.pop(key, None)
+        if not pending:
+            return
+        batch: List[str] = []
+        chars = 0
+        for text in pending:
+            if batch and (len(batch) >= self.max_batch_size or chars + len(text) > self.max_batch_chars):
+                asyncio.ensure_future(self._run_batch(key, batch, pending))
+                batch, chars = [], 0
+            batch.append(text)
+            chars += len(text)
+        if batch:
+            asyncio.ensure_future(self._run_batch(key, batch, pending))
+
+    def _call_api(self, texts: List[str], source_language: str, target_language: str) -> List[str]:
+        client = self.translate_client() if callable(self.translate_client) else self.translate_client
+        results = client.translate(
+            texts,
+            target_language=target_language,
+            source_language=source_language
+        )
+        return [result['translatedText'] for result in results]
+
+    async def _run_batch(self, key: Tuple[str, str], texts: List[str], futures: Dict[str, asyncio.Future]):
+        source_language, target_language = key
+        self.api_calls += 1
+        start = time.perf_counter()
+        try:
+            with UPSTREAM_IN_FLIGHT.track_inprogress(upstream="translate"):
+                if self.io is not None:
+                    translated = await self.io.run(self._call_api, texts, source_language, target_language)
+                else:
+                    translated = await asyncio.get_event_loop().run_in_executor(
+                        None, self._call_api, texts, source_language, target_language)
+        except Exception as e:
+            UPSTREAM_REQUESTS.inc(upstream="translate", status="error")
+            logger.error(f"Batch translation of {len(texts)} strings failed: {str(e)}")
+            for text in texts:
+                if not futures[text].done():
+                    futures[text].set_exception(e)
+            return
+        UPSTREAM_SECONDS.observe(time.perf_counter() - start, upstream="translate")
+        UPSTREAM_REQUESTS.inc(upstream="translate", status="ok")
+        self.strings_translated += len(texts)
+        for text, result in zip(texts, translated):
+            if not futures[text].done():
+                futures[text].set_result(result)
+
+    def stats(self) -> Dict:
+        return {
+            "api_calls": self.api_calls,
+            "strings_translated": self.strings_translated
+        }
@@ -0,0 +1,133 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def translation_key(text: str, source_language: str, target_language: str) -> str:
+    """Content-addressed key: sha256 of the source text plus the language pair"""
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"{source_language}/{target_language}/{digest}"
+
+
+class TranslationCache:
+    """Two-tier cache of Cloud Translation results.
+
+    Lookups hit an in-memory LRU first and then an optional persistent tier:
+    a local directory (``backend="disk"``) or a GCS bucket (``backend="gcs"``)
+    holding one small object per translation. Because keys hash the source
+    text, an edited article is simply a new key and stale entries are never
+    served. Persistent reads run on ``io`` (a ``GCPIO``) when given, and
+    persistent writes happen in the background.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, backend: Optional[str] = None,
+                 directory: Optional[str] = None, bucket_name: Optional[str] = None,
+                 storage_client=None, prefix: str = "translations", io=None):
+        self.max_entries = max_entries or int(os.getenv("TRANSLATION_CACHE_MAX_ENTRIES", "10000"))
+        bucket_name = bucket_name or os.getenv("TRANSLATION_CACHE_BUCKET") or os.getenv("STORAGE_BUCKET")
+        default_backend = "gcs" if bucket_name and storage_client is not None else "memory"
+        self.backend = backend or os.getenv("TRANSLATION_CACHE_BACKEND", default_backend)
+        self.directory = directory or os.getenv("TRANSLATION_CACHE_DIR", ".translation_cache")
+        self.bucket_name = bucket_name
+        self.storage_client = storage_client
+        self.prefix = prefix
+        self.io = io
+        self._bucket = None
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, translated: str):
+        with self._lock:
+            self._memory[key] = translated
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _get_bucket(self):
+        if self._bucket is None:
+            # storage_client may be a factory so the client is only created when needed
+            client = self.storage_client() if callable(self.storage_client) else self.storage_client
+            self._bucket = client.bucket(self.bucket_name)
+        return self._bucket
+
+    def _read_persistent(self, key: str) -> Optional[str]:
+        try:
+            if self.backend == "disk":
+                path = os.path.join(self.directory, key)
+                if os.path.exists(path):
+                    with open(path, "r", encoding="utf-8") as f:
+                        return f.read()
+            elif self.backend == "gcs":
+                blob = self._get_bucket().blob(f"{self.prefix}/{key}")
+                if blob.exists():
+                    return blob.download_as_text()
+        except Exception as e:
+            logger.warning(f"Translation cache read failed: {str(e)}")
+        return None
+
+    def _write_persistent(self, key: str, translated: str):
+        try:
+            if self.backend == "disk":
+                path = os.path.join(self.directory, key)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(translated)
+                os.replace(tmp_path, path)
+            elif self.backend == "gcs":
+                blob = self._get_bucket().blob(f"{self.prefix}/{key}")
+                blob.upload_from_string(translated, content_type="text/plain; charset=utf-8")
+        except Exception as e:
+            logger.warning(f"Translation cache write failed: {str(e)}")
+
+    async def _run(self, fn, *args):
+        if self.io is not None:
+            return await self.io.run(fn, *args)
+        return fn(*args)
+
+    async def get(self, text: str, source_language: str, target_language: str) -> Optional[str]:
+        key = translation_key(text, source_language, target_language)
+        with self._lock:
+            translated = self._memory.get(key)
+            if translated is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return translated
+
+        translated = None
+        if self.backend != "memory":
+            translated = await self._run(self._read_persistent, key)
+        if translated is not None:
+            self._remember(key, translated)
+            self.hits += 1
+            self.persistent_hits += 1
+            return translated
+
+        self.misses += 1
+        return None
+
+    async def put(self, text: str, source_language: str, target_language: str, translated: str):
+        key = translation_key(text, source_language, target_language)
+        self._remember(key, translated)
+        if self.backend != "memory":
+            asyncio.ensure_future(self._run(self._write_persistent, key, translated))
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "entries": len(self._memory),
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,568 @@
+"""Dense article vectors for semantic retrieval, computed locally with NumPy.
+
+An article's features are its stemmed terms (weighted per field like the
+BM25 index), concept features from a small help desk thesaurus (so
+"laptop" meets "computer" and "crawling" meets "slow") and character
+trigrams of its title and tag terms (typos, word variants). Their TF-IDF
+weights are hashed into ``dim`` signed dimensions; once the corpus is large
+enough the vectors are also projected onto its top ``components`` latent
+directions (LSA), which brings together terms that co-occur in articles.
+
+Vectors are L2-normalized rows of one contiguous float32 matrix, so a
+search is a matrix product and a partial sort. With ``VECTOR_INDEX_DIR``
+set, the matrix and the fitted model are saved after every build and
+memory-mapped on the next start; only articles whose content hash changed
+are embedded again, unless so many changed that the model is refitted.
+"""
+import itertools
+import json
+import logging
+import math
+import os
+import threading
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from search_index import content_hash, stem, tokenize, weighted_terms
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+RRF_K = 60
+# Multipliers of the sublinear term frequency per feature kind (before IDF)
+CONCEPT_WEIGHT = 1.5
+TRIGRAM_WEIGHT = 0.1
+# LSA is only fitted with at least this many articles per latent component
+LSA_MIN_DOCS_PER_COMPONENT = 4
+# Articles whose features are kept (and fit LSA) during a full load, and rows embedded at once
+FIT_SAMPLE = 20000
+FIT_CHUNK = 4096
+# Changes (and share of the fitted articles changed) before the terms of changed articles are judged
+REFIT_MIN_CHANGES = 16
+REFIT_MIN_CHANGED_SHARE = 0.1
+
+# Words that mean the same thing to a help desk; each group becomes one shared feature
+CONCEPTS = {
+    "computer": "computer laptop notebook pc desktop workstation machine macbook",
+    "slow": "slow sluggish crawl lag laggy freeze frozen hang unresponsive performance",
+    "failure": "error crash fail failure broken bug",
+    "password": "password passcode passphrase credential login logon signin",
+    "network": "network internet wifi wireless connection connectivity ethernet online offline",
+    "printer": "printer print scanner scan",
+    "email": "email mail outlook inbox mailbox",
+    "access": "access locked lockout permission denied unauthorized",
+    "storage": "disk storage drive space ssd hdd full",
+    "vpn": "vpn remote tunnel",
+    "install": "install setup download update upgrade",
+    "memory": "memory ram",
+}
+CONCEPT_OF = {stem(word): concept for concept, words in CONCEPTS.items() for word in words.split()}
+
+
+@lru_cache(maxsize=1 << 18)
+def _hashes(feature: str) -> Tuple[int, int]:
+    """Two independent 32-bit hashes of a feature (IDF bucket, signed dimension)"""
+    data = feature.encode("utf-8")
+    return zlib.crc32(data), zlib.crc32(data, 0x5BD1E995)
+
+
+def _features(terms: Dict[str, float], trigram_terms: Iterable[str]) -> Dict[str, float]:
+    """Feature weights before IDF: sublinear term frequencies, scaled per feature kind"""
+    # Terms are [a-z0-9]+, so they never clash with the prefixed concept and trigram features
+    features = {term: math.log1p(weight) for term, weight in terms.items()}
+    concepts: Dict[str, float] = {}
+    for term, weight in terms.items():
+        concept = CONCEPT_OF.get(term)
+        if concept is not None:
+            concepts[concept] = concepts.get(concept, 0.0) + weight
+    for concept, weight in concepts.items():
+        features["c:" + concept] = CONCEPT_WEIGHT * math.log1p(weight)
+    for term in set(trigram_terms):
+        padded = f"<{term}>"
+        for i in range(len(padded) - 2):
+            features["g:" + padded[i:i + 3]] = TRIGRAM_WEIGHT
+    return features
+
+
+def article_features(article: Dict, terms: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """Features of an article; ``terms`` are its weighted terms when already known"""
+    title_terms = tokenize(article.get("title") or "")
+    tag_terms = [term for tag in article.get("tags") or [] for term in tokenize(tag)]
+    return _features(terms or weighted_terms(article), title_terms + tag_terms)
+
+
+def query_features(query: str) -> Dict[str, float]:
+    terms = tokenize(query)
+    return _features(Counter(terms), terms)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+
+class _Model:
+    """Feature hashing, IDF weights and the optional LSA projection"""
+
+    def __init__(self, dim: int, n_features: int, idf: Optional[np.ndarray] = None,
+                 projection: Optional[np.ndarray] = None):
+        self.dim = dim
+        self.n_features = n_features
+        self.idf = idf
+        self.projection = projection
+
+    @property
+    def dims(self) -> int:
+        return self.projection.shape[1] if self.projection is not None else self.dim
+
+    @staticmethod
+    def _arrays(features: Dict[str, float]) -> Tuple[np.ndarray, np.ndarray]:
+        """(n, 2) feature hashes and the features' weights"""
+        hashes = np.fromiter(itertools.chain.from_iterable(map(_hashes, features)), dtype=np.int64,
+                             count=2 * len(features)).reshape(-1, 2)
+        return hashes, np.fromiter(features.values(), dtype=np.float32, count=len(features))
+
+    def hashed(self, features: Dict[str, float]) -> np.ndarray:
+        return self._hashed(*self._arrays(features))
+
+    def _hashed(self, hashes: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        if not len(hashes):
+            return vector
+        if self.idf is not None:
+            # Not in place: fit() hashes the weights it kept from its first pass again
+            weights = weights * self.idf[hashes[:, 0] % self.n_features]
+        signs = np.where((hashes[:, 1] // self.dim) & 1, -1.0, 1.0).astype(np.float32)
+        np.add.at(vector, hashes[:, 1] % self.dim, weights * signs)
+        return vector
+
+    def project(self, hashed: np.ndarray) -> np.ndarray:
+        if self.projection is not None:
+            hashed = hashed @ self.projection
+        return _normalize(hashed).astype(np.float32)
+
+    def embed(self, features: Dict[str, float]) -> np.ndarray:
+        return self.project(self.hashed(features))
+
+    @classmethod
+    def fit(cls, documents: Sequence, features: Callable[[object], Dict[str, float]], dim: int,
+            n_features: int, components: int, sample: int = FIT_SAMPLE) -> Tuple["_Model", np.ndarray]:
+        """A model fitted to ``documents``, and their vectors.
+
+        The first pass counts document frequencies and keeps the features of
+        up to ``sample`` evenly spread documents, which also fit the LSA
+        projection; the second embeds every document a chunk at a time
+        (recomputing features only for documents outside the sample).
+        """
+        step = max(1, -(-len(documents) // sample))
+        kept: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        df = np.zeros(n_features, dtype=np.float32)
+        for i, document in enumerate(documents):
+            hashes, weights = cls._arrays(features(document))
+            df[np.unique(hashes[:, 0] % n_features)] += 1
+            if i % step == 0:
+                kept[i] = (hashes, weights)
+        model = cls(dim, n_features, (np.log((1.0 + len(documents)) / (1.0 + df)) + 1.0).astype(np.float32))
+
+        if components and len(documents) >= components * LSA_MIN_DOCS_PER_COMPONENT:
+            covariance = np.zeros((dim, dim), dtype=np.float32)
+            rows = list(kept.values())
+            for chunk in range(0, len(rows), FIT_CHUNK):
+                hashed = _normalize(np.stack([model._hashed(*row) for row in rows[chunk:chunk + FIT_CHUNK]]))
+                covariance += hashed.T @ hashed
+            eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+            model.projection = eigenvectors[:, np.argsort(eigenvalues)[::-1][:components]].astype(np.float32)
+
+        matrix = np.zeros((len(documents), model.dims), dtype=np.float32)
+        for chunk in range(0, len(documents), FIT_CHUNK):
+            hashed = np.stack([model._hashed(*(kept.get(i) or cls._arrays(features(documents[i]))))
+                               for i in range(chunk, min(chunk + FIT_CHUNK, len(documents)))])
+            matrix[chunk:chunk + len(hashed)] = model.project(_normalize(hashed))
+        return model, matrix
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """Ids ranked by the sum of 1 / (k + rank) over the rankings they appear in"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class VectorIndex:
+    """Article vectors in a float32 matrix with cosine top-k search.
+
+    Follows a ``SearchIndex`` through ``on_index_change``: a full load fits
+    the model (or restores it from ``directory``) and embeds every article
+    on a background thread, later changes embed or drop single rows with the
+    fitted model. Searches find nothing until the first build is done, so
+    callers serve keyword results meanwhile. Once the corpus has grown by
+    ``refit_growth`` times, or more than ``refit_drift`` of the terms of
+    changed articles were unseen at fit time, the model is refitted in the
+    background from ``articles()`` while the current vectors keep serving.
+    ``terms`` (e.g. ``SearchIndex.terms``) saves tokenizing articles a
+    second time.
+    """
+
+    def __init__(self, dim: Optional[int] = None, components: Optional[int] = None,
+                 n_features: int = 1 << 18, directory: Optional[str] = None,
+                 min_similarity: Optional[float] = None,
+                 terms: Optional[Callable[[str], Dict[str, float]]] = None,
+                 articles: Optional[Callable[[], List[Dict]]] = None,
+                 refit_growth: Optional[float] = None, refit_drift: Optional[float] = None):
+        self.dim = dim or int(os.getenv("VECTOR_DIM", "1024"))
+        self.components = (components if components is not None
+                           else int(os.getenv("VECTOR_LSA_COMPONENTS", "128")))
+        self.n_features = n_features
+        self.directory = directory if directory is not None else os.getenv("VECTOR_INDEX_DIR") or None
+        self.min_similarity = (min_similarity if min_similarity is not None
+                               else float(os.getenv("VECTOR_MIN_SIMILARITY", "0.2")))
+        self.refit_growth = refit_growth or float(os.getenv("VECTOR_REFIT_GROWTH", "2.0"))
+        self.refit_drift = refit_drift or float(os.getenv("VECTOR_REFIT_DRIFT", "0.3"))
+        self.terms = terms
+        self.articles = articles
+        # Taken after the search index lock by listeners, so never held while calling into the index
+        self._lock = threading.Lock()
+        # Until the first full load, vectors are hashed term frequencies without IDF
+        self._model = _Model(self.dim, self.n_features)
+        self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+        self._count = 0
+        self._ids: List[str] = []
+        self._hashes: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._categories = np.zeros(0, dtype=np.int32)
+        self._category_codes: Dict[str, int] = {}
+        # Articles the model was fitted to, and changes / their terms unseen at fit time since
+        self._fit_count = 0
+        self._unseen_idf: Optional[np.float32] = None
+        self._changed = 0
+        self._terms_seen = 0
+        self._terms_unseen = 0
+        # Background builds: the latest one wins; changes arriving meanwhile are replayed onto it
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._build: Optional[Future] = None
+        self._build_id = 0
+        self._pending: Optional[List[Tuple[List[Tuple[Dict, Dict[str, float], str]], List[str]]]] = None
+        self.ready = False
+        self.refits = 0
+        self.mapped = False
+        self.load_seconds = 0.0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def on_index_change(self, upserts: List[Dict], deletes: List[str], reset: bool):
+        """``SearchIndex`` listener"""
+        try:
+            if reset:
+                self.rebuild(upserts)
+                return
+            changes = [(article, self._features(article), article.get("content_hash") or content_hash(article))
+                       for article in upserts]
+            with self._lock:
+                if self._pending is not None:
+                    self._pending.append((changes, deletes))
+                if self.ready:
+                    self._apply(changes, deletes)
+                refit = self._pending is None and self._needs_refit()
+            if refit:
+                logger.info(f"Refitting article vectors: {self._count} articles, {self._fit_count} at fit time, "
+                            f"{self._terms_unseen} of {self._terms_seen} changed terms new")
+                self.rebuild()
+        except Exception as e:
+            logger.error(f"Error updating article vectors: {str(e)}")
+
+    def _features(self, article: Dict) -> Dict[str, float]:
+        return article_features(article, self.terms(str(article["id"])) if self.terms else None)
+
+    def _category_code(self, category: Optional[str]) -> int:
+        return self._category_codes.setdefault(category or "", len(self._category_codes))
+
+    def _reset(self, model: _Model, matrix: np.ndarray, ids: List[str], hashes: List[str],
+               categories: List[str], fit_count: int):
+        self._model = model
+        self._matrix = matrix
+        self._count = len(ids)
+        self._ids = list(ids)
+        self._hashes = list(hashes)
+        self._rows = {article_id: row for row, article_id in enumerate(ids)}
+        self._category_codes = {}
+        self._categories = np.array([self._category_code(category) for category in categories], dtype=np.int32)
+        self._fit_count = fit_count
+        # Buckets without documents at fit time have the largest IDF
+        self._unseen_idf = model.idf.max() if model.idf is not None and len(model.idf) else None
+        self._changed = self._terms_seen = self._terms_unseen = 0
+
+    def _apply(self, changes: List[Tuple[Dict, Dict[str, float], str]], deletes: List[str]):
+        for article_id in deletes:
+            self._remove(article_id)
+        for article, features, article_hash in changes:
+            self._track(features)
+            self._upsert(article, self._model.embed(features), article_hash)
+
+    def _track(self, features: Dict[str, float]):
+        """Count a changed article and how many of its terms the model's IDF has never seen"""
+        self._changed += 1
+        if self._unseen_idf is None:
+            return
+        # Terms are the unprefixed features
+        buckets = np.fromiter((_hashes(feature)[0] for feature in features if ":" not in feature),
+                              dtype=np.int64) % self.n_features
+        self._terms_seen += len(buckets)
+        self._terms_unseen += int(np.count_nonzero(self._model.idf[buckets] >= self._unseen_idf))
+
+    def _needs_refit(self) -> bool:
+        if self.articles is None or self._unseen_idf is None:
+            return False
+        if self._count > max(self._fit_count, REFIT_MIN_CHANGES) * self.refit_growth:
+            return True
+        return (self._changed >= max(REFIT_MIN_CHANGES, REFIT_MIN_CHANGED_SHARE * self._fit_count)
+                and self._terms_unseen > self.refit_drift * self._terms_seen)
+
+    def _upsert(self, article: Dict, vector: np.ndarray, article_hash: str):
+        article_id = str(article["id"])
+        row = self._rows.get(article_id)
+        if row is None:
+            if self._count == len(self._matrix):
+                # Grow geometrically; this also moves a memory-mapped matrix into memory
+                matrix = np.zeros((max(64, 2 * self._count), self._model.dims), dtype=np.float32)
+                matrix[:self._count] = self._matrix[:self._count]
+                categories = np.zeros(len(matrix), dtype=np.int32)
+                categories[:self._count] = self._categories[:self._count]
+                self._matrix, self._categories = matrix, categories
+                self.mapped = False
+            row = self._count
+            self._count += 1
+            self._ids.append(article_id)
+            self._hashes.append(article_hash)
+            self._rows[article_id] = row
+        self._matrix[row] = vector
+        self._hashes[row] = article_hash
+        self._categories[row] = self._category_code(article.get("category"))
+
+    def _remove(self, article_id: str):
+        row = self._rows.pop(article_id, None)
+        if row is None:
+            return
+        last = self._count - 1
+        if row != last:
+            # Move the last row into the hole to keep the matrix contiguous
+            self._matrix[row] = self._matrix[last]
+            self._categories[row] = self._categories[last]
+            self._ids[row] = self._ids[last]
+            self._hashes[row] = self._hashes[last]
+            self._rows[self._ids[row]] = row
+        self._ids.pop()
+        self._hashes.pop()
+        self._count = last
+
+    def rebuild(self, articles: Optional[Iterable[Dict]] = None) -> Future:
+        """Build the vectors of ``articles`` (a full load) or refit those of ``articles()`` on a background thread.
+
+        A full load stops searches until it is done, as the current vectors
+        belong to other contents; a refit keeps serving them.
+        """
+        if articles is not None:
+            articles = list(articles)
+        with self._lock:
+            self._build_id += 1
+            build_id = self._build_id
+            self._pending = []
+            if articles is not None:
+                self.ready = False
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vector-index")
+            self._build = self._executor.submit(self._run_build, build_id, articles)
+            return self._build
+
+    def load(self, articles: Iterable[Dict]):
+        """Replace the contents and wait until the vectors are built"""
+        self.rebuild(articles).result()
+
+    def wait(self, timeout: Optional[float] = None):
+        """Wait for the latest background build, if any"""
+        build = self._build
+        if build is not None:
+            build.result(timeout)
+
+    def shutdown(self):
+        """Stop background builds; a later load starts a new builder"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run_build(self, build_id: int, articles: Optional[List[Dict]]):
+        if build_id != self._build_id:
+            return
+        start = time.perf_counter()
+        refit = articles is None
+        try:
+            if refit:
+                articles = self.articles()
+            model, matrix, fit_count, mapped, categories = self._vectors(articles, refit)
+            ids = [str(article["id"]) for article in articles]
+            hashes = [article.get("content_hash") or content_hash(article) for article in articles]
+            with self._lock:
+                if build_id != self._build_id:
+                    return
+                self._reset(model, matrix, ids, hashes, categories, fit_count)
+                self.mapped = mapped
+                for changes, deletes in self._pending:
+                    self._apply(changes, deletes)
+                self._pending = None
+                self.ready = True
+                if refit:
+                    self.refits += 1
+            if self.directory and not mapped:
+                self._save()
+        except Exception as e:
+            logger.error(f"Error building article vectors: {str(e)}")
+            with self._lock:
+                if build_id == self._build_id:
+                    self._pending = None
+            raise
+        self.load_seconds = time.perf_counter() - start
+        logger.info(f"{'Refitted' if refit else 'Loaded'} {len(ids)} article vectors ({model.dims} dims) "
+                    f"in {self.load_seconds:.2f}s")
+
+    def _vectors(self, articles: List[Dict], refit: bool) -> Tuple[_Model, np.ndarray, int, bool, List[str]]:
+        """(model, matrix, articles fitted to, memory-mapped, categories), reusing saved vectors
+        of unchanged articles unless refitting or the saved ones are too far off"""
+        ids = [str(article["id"]) for article in articles]
+        hashes = [article.get("content_hash") or content_hash(article) for article in articles]
+        categories = [article.get("category") or "" for article in articles]
+
+        restored = self._restore() if self.directory and not refit else None
+        if restored is not None:
+            model, saved, saved_ids, saved_hashes, saved_categories, fit_count = restored
+            if saved_ids == ids and saved_hashes == hashes:
+                return model, saved, fit_count, True, saved_categories
+            saved_rows = {article_id: row for row, article_id in enumerate(saved_ids)}
+            reused = [saved_rows.get(article_id) for article_id in ids]
+            reused = [row if row is not None and saved_hashes[row] == article_hash else None
+                      for row, article_hash in zip(reused, hashes)]
+            kept = sum(row is not None for row in reused)
+            # New, changed and removed articles, against the larger of the two sets
+            differing = len(ids) - kept + len(saved_ids) - kept
+            if (len(ids) > max(fit_count, REFIT_MIN_CHANGES) * self.refit_growth
+                    or differing > self.refit_drift * max(len(ids), len(saved_ids))):
+                logger.info(f"Saved article vectors differ in {differing} articles, refitting")
+            else:
+                matrix = np.zeros((len(articles), model.dims), dtype=np.float32)
+                for row, (article, saved_row) in enumerate(zip(articles, reused)):
+                    matrix[row] = saved[saved_row] if saved_row is not None else model.embed(self._features(article))
+                logger.info(f"Restored article vectors, embedded {len(ids) - kept} new or changed articles")
+                return model, matrix, fit_count, False, categories
+
+        model, matrix = _Model.fit(articles, self._features, self.dim, self.n_features, self.components)
+        return model, matrix, len(articles), False, categories
+
+    def _paths(self) -> Tuple[str, str, str]:
+        return (os.path.join(self.directory, "vectors.npy"), os.path.join(self.directory, "model.npz"),
+                os.path.join(self.directory, "rows.json"))
+
+    def _save(self):
+        """Write the matrix, model and row metadata (rows last, as it validates the others)"""
+        matrix_path, model_path, rows_path = self._paths()
+        try:
+            with self._lock:
+                matrix = self._matrix[:self._count].copy()
+                arrays = {"idf": self._model.idf}
+                if self._model.projection is not None:
+                    arrays["projection"] = self._model.projection
+                rows = {"version": FORMAT_VERSION, "dim": self.dim, "n_features": self.n_features,
+                        "components": self.components, "fit_count": self._fit_count, "ids": list(self._ids),
+                        "hashes": list(self._hashes), "categories": self._category_names()}
+            os.makedirs(self.directory, exist_ok=True)
+            for path, write in ((matrix_path, lambda f: np.save(f, matrix)),
+                                (model_path, lambda f: np.savez(f, **arrays)),
+                                (rows_path, lambda f: f.write(json.dumps(rows).encode("utf-8")))):
+                with open(path + ".tmp", "wb") as f:
+                    write(f)
+                os.replace(path + ".tmp", path)
+        except Exception as e:
+            logger.warning(f"Could not save article vectors to {self.directory}: {str(e)}")
+
+    def _category_names(self) -> List[str]:
+        names = {code: name for name, code in self._category_codes.items()}
+        return [names[code] for code in self._categories[:self._count]]
+
+    def _restore(self):
+        """(model, memory-mapped matrix, ids, hashes, categories, articles fitted to) saved with the same
+        settings, or None"""
+        matrix_path, model_path, rows_path = self._paths()
+        try:
+            with open(rows_path, "r", encoding="utf-8") as f:
+                rows = json.load(f)
+            if (rows.get("version"), rows.get("dim"), rows.get("n_features"), rows.get("components")) != \
+                    (FORMAT_VERSION, self.dim, self.n_features, self.components):
+                logger.info("Saved article vectors use other settings, refitting")
+                return None
+            with np.load(model_path) as arrays:
+                model = _Model(self.dim, self.n_features, arrays["idf"],
+                               arrays["projection"] if "projection" in arrays else None)
+            # Copy-on-write: in-place updates stay private to this process
+            matrix = np.load(matrix_path, mmap_mode="c")
+            if matrix.shape != (len(rows["ids"]), model.dims):
+                logger.warning("Saved article vectors do not match their metadata, refitting")
+                return None
+            return (model, matrix, rows["ids"], rows["hashes"], rows["categories"],
+                    rows.get("fit_count", len(rows["ids"])))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Could not restore article vectors from {self.directory}: {str(e)}")
+            return None
+
+    def search_batch(self, vectors: np.ndarray, k: int = 10,
+                     category: Optional[str] = None) -> List[List[Tuple[str, float]]]:
+        """Cosine top-``k`` (id, similarity) pairs for each row of ``vectors``, best first"""
+        with self._lock:
+            if not self.ready:
+                return [[] for _ in range(len(vectors))]
+            matrix = self._matrix[:self._count]
+            rows = None
+            if category is not None:
+                code = self._category_codes.get(category)
+                rows = (np.flatnonzero(self._categories[:self._count] == code) if code is not None
+                        else np.zeros(0, dtype=np.int64))
+                matrix = matrix[rows]
+            if not len(matrix) or vectors.shape[-1] != matrix.shape[1]:
+                return [[] for _ in range(len(vectors))]
+            scores = vectors @ matrix.T
+            k = min(k, scores.shape[1])
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            results = []
+            for query_scores, candidates in zip(scores, top):
+                ordered = candidates[np.argsort(-query_scores[candidates])]
+                ids = [self._ids[rows[i] if rows is not None else i] for i in ordered]
+                results.append(list(zip(ids, query_scores[ordered].tolist())))
+            return results
+
+    def search(self, query: str, k: int = 10, category: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Articles at least ``min_similarity`` close to the query, best first"""
+        vector = self._model.embed(query_features(query))
+        if not vector.any():
+            return []
+        return [(article_id, score) for article_id, score in self.search_batch(vector[None, :], k, category)[0]
+                if score >= self.min_similarity]
+
+    def stats(self) -> Dict:
+        return {
+            "articles": self._count,
+            "dims": self._model.dims,
+            "lsa": self._model.projection is not None,
+            "ready": self.ready,
+            "fit_articles": self._fit_count,
+            "refits": self.refits,
+            "memory_mapped": self.mapped,
+            "load_seconds": round(self.load_seconds, 3)
+        }